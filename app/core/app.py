@@ -3,19 +3,33 @@ Main FastAPI application with improved webhook handling for DigitalOcean deploym
 """
 
 import asyncio
+import importlib
 import logging
 import hmac
 import hashlib
-from fastapi import FastAPI, Request, HTTPException, Header
+import sys
+import time
+from fastapi import FastAPI, Request, Response, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 import uvicorn
 
 from config import Config
-from app.handlers.bot_handlers import bot_handlers
-from app.services.alarm_manager import AlarmManager
-import app.services.alarm_manager as alarm_module
+from app.core.startup_profiler import startup_profiler
+from app.core.metrics import metrics, CONTENT_TYPE, HANDLER_SECONDS, WEBHOOK_IN_FLIGHT
+from app.core.tracing import tracer
+from app.core.update_dedup import update_deduplicator
+
+# Imported by the background warm-up, not at import time: pulling in the handlers loads
+# sympy, numpy, reportlab and the service modules, which would delay binding the port
+HANDLERS_MODULE = "app.handlers.bot_handlers"
+# Connections for Bot API calls - PTB's own default when it builds the request itself
+TELEGRAM_CONNECTION_POOL_SIZE = 256
+# Services created in the background after startup: module -> global LazyService name
+WARM_UP_SERVICES = {
+    "database": ("app.models.database", "db_manager"),
+    "ocr": ("app.services.ocr_service", "ocr_service"),
+    "pdf_generator": ("app.services.pdf_generator", "pdf_generator"),
+}
 
 # Configure logging
 logging.basicConfig(
@@ -37,6 +51,13 @@ class MathBotApp:
         )
         self.telegram_app = None
         self.alarm_manager_instance = None
+        self.alarm_leadership = None
+
+        # Readiness, filled in by the background warm-up (see warm_up)
+        self.ready_event = asyncio.Event()
+        self.startup_error = None
+        self.services = {name: {"status": "pending"} for name in ["telegram_bot", *WARM_UP_SERVICES]}
+        self._warm_up_task = None
         self._setup_middleware()
         self._setup_routes()
     
@@ -58,20 +79,41 @@ class MathBotApp:
         # Health check endpoints
         self.app.get("/")(self.root)
         self.app.get("/health")(self.health_check)
+        self.app.get("/ready")(self.readiness_check)
         
         # Webhook endpoints
         self.app.post("/webhook")(self.webhook)
         self.app.get("/set_webhook")(self.set_webhook)
         self.app.get("/webhook_info")(self.get_webhook_info)
         
-        # Statistics endpoint
+        # Statistics endpoints
         self.app.get("/stats")(self.get_bot_stats)
+        self.app.get("/metrics")(self.get_metrics)
+
+        # Slow update traces (see app/core/tracing.py)
+        if Config.TRACE_DEBUG_ENDPOINT:
+            self.app.get("/debug/traces")(self.get_slow_traces)
+            self.app.get("/debug/traces/{trace_id}")(self.get_trace)
     
     async def setup_telegram_bot(self):
         """Initialize and setup the Telegram bot"""
+        from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+        from app.core.telegram_request import InstrumentedRequest
+        from app.handlers.bot_handlers import bot_handlers
+        from app.services.alarm_manager import AlarmManager
+        import app.services.alarm_manager as alarm_module
+        from app.services.alarm_leadership import AlarmLeadership
+
         try:
             # Create Telegram application
-            self.telegram_app = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).build()
+            self.telegram_app = (
+                Application.builder()
+                .token(Config.TELEGRAM_BOT_TOKEN)
+                .base_url(f"{Config.TELEGRAM_API_BASE_URL}/bot")
+                .base_file_url(f"{Config.TELEGRAM_API_BASE_URL}/file/bot")
+                .request(InstrumentedRequest(connection_pool_size=TELEGRAM_CONNECTION_POOL_SIZE))
+                .build()
+            )
 
             # Get and display bot information
             try:
@@ -118,8 +160,14 @@ class MathBotApp:
             # Start alarm scheduler
             self.alarm_manager_instance.start_scheduler()
 
-            # Schedule existing alarms
-            self.alarm_manager_instance.schedule_all_user_alarms()
+            if Config.ALARM_LEADER_ELECTION:
+                # Several workers/replicas: only the holders of a shard lease schedule its alarms
+                self.alarm_leadership = AlarmLeadership(self.alarm_manager_instance)
+                await self.alarm_leadership.start()
+            else:
+                # Schedule existing alarms (reads every user from MongoDB - keep it off the event loop)
+                await asyncio.to_thread(self.alarm_manager_instance.schedule_all_user_alarms)
+                await asyncio.to_thread(self.alarm_manager_instance.restore_pending_alarms)
 
             # Set webhook in production mode
             if Config.is_production() and Config.WEBHOOK_URL:
@@ -146,6 +194,10 @@ class MathBotApp:
     async def shutdown_telegram_bot(self):
         """Shutdown the Telegram bot"""
         try:
+            if self.alarm_leadership:
+                # Release the leases so another instance takes the alarms over without waiting for expiry
+                await self.alarm_leadership.stop()
+
             if self.alarm_manager_instance:
                 self.alarm_manager_instance.stop_scheduler()
                 logger.info("Alarm scheduler stopped")
@@ -159,17 +211,81 @@ class MathBotApp:
             logger.error(f"Error shutting down Telegram bot: {e}")
 
     async def startup_event(self):
-        """FastAPI startup event"""
+        """FastAPI startup event - returns at once, services warm up in the background"""
         logger.info("Starting MathBot application...")
-        await self.setup_telegram_bot()
-        logger.info("MathBot application started successfully")
+        startup_profiler.mark("server_started")
+        self._warm_up_task = asyncio.create_task(self.warm_up())
+        logger.info("MathBot application started, warming up services in the background")
+
+    async def warm_up(self):
+        """
+        Import the handlers and create the services off the event loop, then start the bot
+
+        The app is ready once the Telegram bot is set up. OCR and PDF generation are not
+        needed for that and keep warming up afterwards (they would otherwise be created
+        on first use).
+        """
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(
+                asyncio.to_thread(importlib.import_module, HANDLERS_MODULE),
+                self._warm_up_service("database")
+            )
+            await self._timed("telegram_bot", self.setup_telegram_bot())
+        except Exception as e:
+            self.startup_error = str(e)
+            startup_profiler.mark("startup_failed")
+            logger.error(f"❌ Warm-up failed: {e}")
+            return
+
+        self.ready_event.set()
+        startup_profiler.mark("ready")
+        logger.info(f"✅ MathBot ready after {time.perf_counter() - started:.2f}s")
+
+        await asyncio.gather(
+            *(self._warm_up_service(name) for name in WARM_UP_SERVICES if name != "database"),
+            return_exceptions=True
+        )
+
+    async def _warm_up_service(self, name: str):
+        module_name, attribute = WARM_UP_SERVICES[name]
+
+        def create():
+            return getattr(importlib.import_module(module_name), attribute).instance()
+
+        await self._timed(name, asyncio.to_thread(create))
+
+    async def _timed(self, name: str, awaitable):
+        """Await one warm-up stage, recording its status and duration in self.services"""
+        self.services[name] = {"status": "starting"}
+        started = time.perf_counter()
+        try:
+            await awaitable
+        except Exception as e:
+            self.services[name] = {"status": "failed", "error": str(e)}
+            logger.error(f"❌ {name} failed to start: {e}")
+            raise
+        self.services[name] = {"status": "ready", "seconds": round(time.perf_counter() - started, 3)}
 
     async def shutdown_event(self):
         """FastAPI shutdown event"""
         logger.info("Shutting down MathBot application...")
+        if self._warm_up_task and not self._warm_up_task.done():
+            self._warm_up_task.cancel()
         await self.shutdown_telegram_bot()
+        self._shutdown_services()
         logger.info("MathBot application shutdown complete")
 
+    def _shutdown_services(self):
+        """Stop the worker pools of warmed-up services (OCR threads and Tesseract processes)"""
+        module_name, attribute = WARM_UP_SERVICES["ocr"]
+        ocr_service = getattr(sys.modules.get(module_name), attribute, None)  # never import it just to stop it
+        if ocr_service is not None and ocr_service.initialized:
+            try:
+                ocr_service.shutdown()
+            except Exception as e:
+                logger.error(f"Error shutting down OCR service: {e}")
+
     async def root(self):
         """Root endpoint for health check"""
         return {
@@ -180,21 +296,29 @@ class MathBotApp:
         }
 
     async def health_check(self):
-        """Health check endpoint"""
+        """Liveness endpoint - answers while services are still warming up (see /ready)"""
+        if self.startup_error:
+            raise HTTPException(status_code=503, detail=f"Startup failed: {self.startup_error}")
+
+        if not self.ready_event.is_set():
+            return {
+                "status": "starting",
+                "ready": False,
+                "environment": Config.ENVIRONMENT
+            }
+
         try:
-            # Check if telegram app is running
-            if not self.telegram_app:
-                raise HTTPException(status_code=503, detail="Telegram bot not initialized")
-            
             # Check if alarm manager is running
             if not self.alarm_manager_instance or not self.alarm_manager_instance.scheduler.running:
                 raise HTTPException(status_code=503, detail="Alarm scheduler not running")
             
             return {
                 "status": "healthy",
+                "ready": True,
                 "telegram_bot": "running",
                 "alarm_scheduler": "running",
                 "scheduled_jobs": len(self.alarm_manager_instance.get_scheduled_jobs()) if self.alarm_manager_instance else 0,
+                "alarm_leadership": self.alarm_leadership.status() if self.alarm_leadership else None,
                 "environment": Config.ENVIRONMENT
             }
             
@@ -202,6 +326,18 @@ class MathBotApp:
             logger.error(f"Health check failed: {e}")
             raise HTTPException(status_code=503, detail=str(e))
 
+    async def readiness_check(self):
+        """Readiness endpoint - 200 once the bot can process updates, with per-service warm-up state"""
+        body = {
+            "ready": self.ready_event.is_set(),
+            "services": self.services
+        }
+        if self.startup_error:
+            body["error"] = self.startup_error
+        if not body["ready"]:
+            raise HTTPException(status_code=503, detail=body)
+        return body
+
     def _verify_webhook_signature(self, body: bytes, signature: str) -> bool:
         """Verify webhook signature for security"""
         if not Config.WEBHOOK_SECRET:
@@ -217,9 +353,14 @@ class MathBotApp:
 
     async def webhook(self, request: Request, x_telegram_bot_api_secret_token: str = Header(None)):
         """Webhook endpoint for Telegram updates with enhanced security"""
+        update_id = None
         try:
-            if not self.telegram_app:
-                raise HTTPException(status_code=503, detail="Telegram bot not initialized")
+            # Updates arriving during warm-up wait for it; Telegram retries the ones that time out
+            if not self.ready_event.is_set():
+                try:
+                    await asyncio.wait_for(self.ready_event.wait(), Config.WEBHOOK_READY_TIMEOUT)
+                except asyncio.TimeoutError:
+                    raise HTTPException(status_code=503, detail="Telegram bot not initialized")
             
             # Get the update data
             body = await request.body()
@@ -235,13 +376,24 @@ class MathBotApp:
             except Exception as e:
                 logger.error(f"Failed to parse JSON: {e}")
                 raise HTTPException(status_code=400, detail="Invalid JSON")
+
+            # Telegram retries updates we were too slow to answer - process each update_id once
+            if Config.UPDATE_DEDUP_ENABLED and isinstance(update_data, dict) and "update_id" in update_data:
+                if not await update_deduplicator.claim(update_data["update_id"]):
+                    logger.info(f"Dropped duplicate update: {update_data['update_id']}")
+                    return {"status": "duplicate"}
+                update_id = update_data["update_id"]
             
-            # Create Update object
+            # Create Update object (telegram is loaded by the warm-up, so this import is free)
+            from telegram import Update
             update = Update.de_json(update_data, self.telegram_app.bot)
             
             if update:
                 # Process the update
-                await self.telegram_app.process_update(update)
+                user_id = update.effective_user.id if update.effective_user else None
+                with WEBHOOK_IN_FLIGHT.track_inprogress(), HANDLER_SECONDS.time(route="webhook"), \
+                        tracer.trace("update", update_id=update.update_id, user_id=user_id):
+                    await self.telegram_app.process_update(update)
                 logger.debug(f"Processed update: {update.update_id}")
             
             return {"status": "ok"}
@@ -250,6 +402,8 @@ class MathBotApp:
             raise
         except Exception as e:
             logger.error(f"Error processing webhook: {e}")
+            # Let Telegram's retry through
+            await update_deduplicator.release(update_id)
             raise HTTPException(status_code=500, detail="Internal server error")
 
     async def set_webhook(self):
@@ -304,6 +458,27 @@ class MathBotApp:
             logger.error(f"Error getting webhook info: {e}")
             raise HTTPException(status_code=500, detail=str(e))
 
+    async def get_metrics(self):
+        """Prometheus metrics: latency histograms, queue depths, cache hit rates, executor use"""
+        return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+    async def get_slow_traces(self, limit: int = 20):
+        """Most recent traces slower than TRACE_SLOW_THRESHOLD_MS"""
+        return {
+            "threshold_ms": Config.TRACE_SLOW_THRESHOLD_MS,
+            "stats": tracer.stats,
+            "traces": tracer.get_slow_traces(limit)
+        }
+
+    async def get_trace(self, trace_id: str, format: str = "json"):
+        """One slow trace; format=chrome returns Chrome trace events (chrome://tracing, Perfetto)"""
+        trace = tracer.find(trace_id)
+        if trace is None:
+            raise HTTPException(status_code=404, detail="Trace not found (only slow traces are kept)")
+        if format == "chrome":
+            return {"traceEvents": trace.to_chrome_events(), "displayTimeUnit": "ms"}
+        return trace.to_dict()
+
     async def get_bot_stats(self):
         """Get bot statistics"""
         try:
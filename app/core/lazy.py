@@ -0,0 +1,44 @@
+"""
+Lazily created service instances
+Module-level services (db_manager, ocr_service, ...) used to be created at import
+time, so importing the bot connected to MongoDB and set up Vision before the web
+server could bind its port. A LazyService stands in for the instance: it is
+created on first attribute access (or explicitly during the background warm-up)
+and every existing `from ... import db_manager` keeps working unchanged.
+"""
+
+import threading
+import time
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class LazyService(Generic[T]):
+    def __init__(self, factory: Callable[[], T], name: str):
+        self._factory = factory
+        self._name = name
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+        self.init_seconds: Optional[float] = None
+
+    def instance(self) -> T:
+        """The service, created on first call (thread-safe)"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    started = time.perf_counter()
+                    self._instance = self._factory()
+                    self.init_seconds = time.perf_counter() - started
+        return self._instance
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, name: str):
+        return getattr(self.instance(), name)
+
+    def __repr__(self) -> str:
+        state = "initialized" if self.initialized else "not initialized"
+        return f"<LazyService {self._name} ({state})>"
@@ -0,0 +1,327 @@
+"""
+Prometheus-style metrics, served at /metrics
+Latency histograms for bot handler routes, math phases and external calls are
+observed where the work happens. Queue depths, cache hit rates and executor
+utilization are read at scrape time from the services' own counters through
+registered collectors, so nothing is computed between scrapes.
+
+Only the standard library is used (no prometheus_client dependency); the output
+follows the text exposition format 0.0.4.
+"""
+
+import inspect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # the response adds charset=utf-8
+
+# Seconds - from a cached parse to a slow Vision batch or function analysis
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# A collector returns metric families: (name, type, help, [(labels, value), ...])
+Sample = Tuple[Dict[str, str], float]
+Family = Tuple[str, str, str, List[Sample]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    @abstractmethod
+    def _render_samples(self) -> List[str]:
+        """Sample lines of the metric, without the HELP/TYPE header"""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """Count the block as in progress while it runs"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels) -> "_Timer":
+        """Observe the duration of a with / async with block (also when it raises)"""
+        return _Timer(self, labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in items:
+            labels = self._labels(key)
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(float(bound))})} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series[-1]}")
+        return lines
+
+
+class _Timer:
+    """Context manager for Histogram.time, usable with 'with' and in 'async with' chains"""
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info):
+        return self.__exit__(*exc_info)
+
+
+def observe_latency(histogram: Histogram, errors: Optional[Counter] = None, **labels):
+    """Decorator: observe a function's duration (sync or async) and count its exceptions"""
+    def decorator(function: Callable):
+        if inspect.iscoroutinefunction(function):
+            @wraps(function)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc(**labels)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - started, **labels)
+        else:
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc(**labels)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - started, **labels)
+        return wrapper
+    return decorator
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+        # Executor utilization (see track_executor)
+        self.executor_workers = self.gauge("mathbot_executor_workers", "Workers of an executor", ["executor"])
+        self.executor_pending = self.gauge(
+            "mathbot_executor_pending_tasks", "Tasks submitted to an executor and not finished (running or queued)",
+            ["executor"]
+        )
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing  # module re-imported (tests, reload) - keep one series
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]):
+        """Add a callback read at scrape time (queue depths, cache stats, ...)"""
+        self._collectors.append(collector)
+
+    def track_executor(self, name: str, executor, max_workers: int):
+        """
+        Export busy/total workers of a concurrent.futures executor
+
+        Wraps the executor's submit (also used by loop.run_in_executor) to count
+        submitted work that has not finished yet.
+        """
+        pending = self.executor_pending
+        self.executor_workers.set(max_workers, executor=name)
+        pending.set(0, executor=name)
+        submit = executor.submit
+
+        def tracked_submit(function, *args, **kwargs):
+            pending.inc(executor=name)
+            try:
+                future = submit(function, *args, **kwargs)
+            except BaseException:
+                pending.dec(executor=name)
+                raise
+            future.add_done_callback(lambda _: pending.dec(executor=name))
+            return future
+
+        executor.submit = tracked_submit
+        return executor
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collector in list(self._collectors):
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"⚠️ Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+# Global metrics registry instance
+metrics = MetricsRegistry()
+
+# Latency of each bot handler route (solve, analyze, photo, ai, alarm, ...)
+HANDLER_SECONDS = metrics.histogram("mathbot_handler_seconds", "Time spent handling a bot route", ["route"])
+HANDLER_ERRORS = metrics.counter("mathbot_handler_errors_total", "Bot routes that raised", ["route"])
+
+# Latency of math phases (parse, solve, limit, derivative, analysis, plot, pdf)
+MATH_PHASE_SECONDS = metrics.histogram("mathbot_math_phase_seconds", "Time spent in a math phase", ["phase"])
+ANALYSIS_STEP_SECONDS = metrics.histogram("mathbot_analysis_step_seconds", "Running time of a function analysis step", ["step"])
+
+# Latency of calls leaving the process (mongo, gemini, deepseek, vision, telegram)
+EXTERNAL_CALL_SECONDS = metrics.histogram(
+    "mathbot_external_call_seconds", "Duration of a call to an external service", ["service", "operation"]
+)
+EXTERNAL_CALL_ERRORS = metrics.counter(
+    "mathbot_external_call_errors_total", "Failed calls to an external service", ["service", "operation"]
+)
+
+# Webhook updates being processed right now
+WEBHOOK_IN_FLIGHT = metrics.gauge("mathbot_webhook_updates_in_flight", "Webhook updates currently being processed")
+WEBHOOK_IN_FLIGHT.set(0)
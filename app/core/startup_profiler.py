@@ -0,0 +1,312 @@
+"""
+Startup profiling (--profile-startup)
+Records where boot time goes: import time per module (self and cumulative, like
+`python -X importtime`, plus a per-package rollup), the time spent in the main
+service initializers and the time until the app answers its first ready request.
+Writes a sorted text report and a JSON artifact so cold starts can be compared
+release over release.
+
+Only the standard library is imported here - the profiler is started before
+anything else so that it sees every import.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from typing import Dict, List, Optional
+
+PROFILE_FLAG = "--profile-startup"
+OUTPUT_FLAG = "--profile-output"
+DEFAULT_OUTPUT = "startup_profile.json"
+
+# Initializers timed in profile mode: module -> qualified names inside it.
+# They are wrapped as soon as their module finishes importing.
+PROFILED_SERVICES = {
+    "app.models.database": ["DatabaseManager.__init__"],
+    "app.services.ocr_service": ["OCRService.__init__"],
+    "app.services.ocr_backends": ["GoogleVisionBackend._setup_client", "TesseractBackend.__init__"],
+    "app.services.pdf_generator": ["PDFGenerator.__init__"],
+    "app.services.alarm_manager": ["AlarmManager.schedule_all_user_alarms"],
+    "app.core.app": ["MathBotApp.setup_telegram_bot", "MathBotApp.warm_up"],
+}
+
+# Rows shown in the text report
+REPORT_TOP_MODULES = 25
+REPORT_TOP_PACKAGES = 15
+
+
+def profile_requested(argv: List[str] = None) -> bool:
+    return PROFILE_FLAG in (sys.argv if argv is None else argv)
+
+
+def profile_output_path(argv: List[str] = None) -> str:
+    """Value of --profile-output PATH, else startup_profile.json"""
+    argv = sys.argv if argv is None else argv
+    if OUTPUT_FLAG in argv:
+        index = argv.index(OUTPUT_FLAG)
+        if index + 1 < len(argv):
+            return argv[index + 1]
+    return DEFAULT_OUTPUT
+
+
+class _ImportTimer:
+    """Meta path finder that times exec_module of every module loaded from a file"""
+
+    def __init__(self, profiler: "StartupProfiler"):
+        self.profiler = profiler
+        self._local = threading.local()
+
+    def find_spec(self, fullname, path, target=None):
+        if getattr(self._local, "searching", False):
+            return None
+        self._local.searching = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    self._wrap_loader(spec)
+                    return spec
+            return None
+        finally:
+            self._local.searching = False
+
+    def _wrap_loader(self, spec):
+        loader = spec.loader
+        # Builtin and frozen modules are loaded by the importer class itself - cheap, skip them
+        if loader is None or isinstance(loader, type) or not hasattr(loader, "exec_module"):
+            return
+        original = loader.exec_module
+        profiler = self.profiler
+        name = spec.name
+
+        def exec_module(module):
+            profiler._enter_import(name)
+            try:
+                original(module)
+            finally:
+                profiler._exit_import(name)
+                try:
+                    del loader.exec_module
+                except AttributeError:
+                    pass
+            profiler._instrument_module(module)
+
+        try:
+            loader.exec_module = exec_module
+        except (AttributeError, TypeError):
+            pass
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.imports: Dict[str, Dict] = {}
+        self.services: List[Dict] = []
+        self.milestones: Dict[str, float] = {}
+        self._finder: Optional[_ImportTimer] = None
+        self._stacks = threading.local()
+
+    @property
+    def active(self) -> bool:
+        return self.started_at is not None
+
+    def start(self):
+        """Start recording - call before the application is imported"""
+        if self.active:
+            return
+        self.started_at = time.perf_counter()
+        self._finder = _ImportTimer(self)
+        sys.meta_path.insert(0, self._finder)
+        # Modules imported before the profiler started are instrumented right away
+        for module_name in PROFILED_SERVICES:
+            if module_name in sys.modules:
+                self._instrument_module(sys.modules[module_name])
+
+    def stop(self):
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+        self._finder = None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at if self.active else 0.0
+
+    def mark(self, milestone: str):
+        """Record the time since start of a startup milestone (first occurrence wins)"""
+        if self.active:
+            self.milestones.setdefault(milestone, self.elapsed())
+
+    def _stack(self) -> list:
+        if not hasattr(self._stacks, "frames"):
+            self._stacks.frames = []
+        return self._stacks.frames
+
+    def _enter_import(self, name: str):
+        # [name, start, time spent in nested imports]
+        self._stack().append([name, time.perf_counter(), 0.0])
+
+    def _exit_import(self, name: str):
+        stack = self._stack()
+        _, started, children = stack.pop()
+        cumulative = time.perf_counter() - started
+        if stack:
+            stack[-1][2] += cumulative
+        self.imports[name] = {
+            "self": cumulative - children,
+            "cumulative": cumulative,
+            "parent": stack[-1][0] if stack else None,
+        }
+
+    def _instrument_module(self, module):
+        for qualname in PROFILED_SERVICES.get(module.__name__, []):
+            owner = module
+            *path, attribute = qualname.split(".")
+            try:
+                for part in path:
+                    owner = getattr(owner, part)
+                original = getattr(owner, attribute)
+            except AttributeError:
+                continue
+            if getattr(original, "__profiled__", False):
+                continue
+            setattr(owner, attribute, self._timed(original, qualname))
+
+    def _timed(self, function, label: str):
+        import inspect  # loaded by the profiled modules anyway
+
+        profiler = self
+
+        def record(started: float):
+            profiler.services.append({
+                "name": label,
+                "started": round(started - profiler.started_at, 6),
+                "seconds": round(time.perf_counter() - started, 6),
+            })
+
+        if inspect.iscoroutinefunction(function):
+            @wraps(function)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    record(started)
+        else:
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    record(started)
+        wrapper.__profiled__ = True
+        return wrapper
+
+    def wait_until_ready(self, url: str, timeout: float, interval: float = 0.05) -> bool:
+        """
+        Poll url (the /ready endpoint) until it answers 200, then mark 'first_ready_request'
+
+        Returns:
+            False if the app was not ready within timeout seconds or reported a failed startup
+        """
+        import urllib.error
+        import urllib.request
+
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        self.mark("first_ready_request")
+                        return True
+            except urllib.error.HTTPError as e:
+                self.mark("first_request")  # answered, but not ready yet
+                try:
+                    detail = json.loads(e.read()).get("detail")
+                except ValueError:
+                    detail = None
+                if isinstance(detail, dict) and detail.get("error"):
+                    return False  # warm-up failed, it will not become ready
+            except (urllib.error.URLError, OSError):
+                pass  # port not bound yet
+            time.sleep(interval)
+        return False
+
+    def to_dict(self) -> Dict:
+        packages: Dict[str, Dict] = {}
+        for name, timing in self.imports.items():
+            package = packages.setdefault(name.split(".")[0], {"self": 0.0, "modules": 0})
+            package["self"] += timing["self"]
+            package["modules"] += 1
+
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "argv": sys.argv,
+            "total_seconds": round(self.elapsed(), 6),
+            "milestones": {name: round(value, 6) for name, value in sorted(self.milestones.items(), key=lambda item: item[1])},
+            "services": sorted(self.services, key=lambda service: -service["seconds"]),
+            "packages": {
+                name: {"self": round(value["self"], 6), "modules": value["modules"]}
+                for name, value in sorted(packages.items(), key=lambda item: -item[1]["self"])
+            },
+            "imports": {
+                name: {
+                    "self": round(timing["self"], 6),
+                    "cumulative": round(timing["cumulative"], 6),
+                    "parent": timing["parent"],
+                }
+                for name, timing in sorted(self.imports.items(), key=lambda item: -item[1]["self"])
+            },
+        }
+
+    def format_report(self, profile: Dict = None) -> str:
+        profile = profile or self.to_dict()
+        lines = [
+            f"Startup profile - {profile['timestamp']} (Python {profile['python']})",
+            f"Recorded {profile['total_seconds']:.3f}s, {len(profile['imports'])} modules imported",
+            "",
+            "Milestones (seconds since start):",
+        ]
+        for name, seconds in profile["milestones"].items():
+            lines.append(f"  {seconds:9.3f}  {name}")
+        if "first_ready_request" not in profile["milestones"]:
+            lines.append("        -  first_ready_request (not ready before the profile was written)")
+
+        lines += ["", "Service initialization (slowest first):"]
+        for service in profile["services"]:
+            lines.append(f"  {service['seconds'] * 1000:9.1f} ms  {service['name']}  (at {service['started']:.3f}s)")
+        if not profile["services"]:
+            lines.append("  (none ran)")
+
+        lines += ["", f"Imports by top-level package, self time (top {REPORT_TOP_PACKAGES}):"]
+        for name, package in list(profile["packages"].items())[:REPORT_TOP_PACKAGES]:
+            lines.append(f"  {package['self'] * 1000:9.1f} ms  {name} ({package['modules']} modules)")
+
+        lines += ["", f"Slowest modules, self time (top {REPORT_TOP_MODULES}):",
+                  f"  {'self':>9}     {'cumulative':>10}     module"]
+        for name, timing in list(profile["imports"].items())[:REPORT_TOP_MODULES]:
+            lines.append(f"  {timing['self'] * 1000:9.1f} ms  {timing['cumulative'] * 1000:10.1f} ms  {name}")
+        return "\n".join(lines)
+
+    def write_report(self, output_path: str = DEFAULT_OUTPUT) -> str:
+        """Write the JSON artifact to output_path and the text report next to it; returns the report"""
+        profile = self.to_dict()
+        report = self.format_report(profile)
+
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(output_path, "w") as f:
+            json.dump(profile, f, indent=2)
+        with open(os.path.splitext(output_path)[0] + ".txt", "w") as f:
+            f.write(report + "\n")
+        return report
+
+# Global startup profiler instance (inactive unless start() is called)
+startup_profiler = StartupProfiler()
@@ -0,0 +1,34 @@
+"""
+Telegram Bot API request with latency metrics
+Every Bot API call (sendMessage, sendDocument, editMessageText, ...) goes through
+BaseRequest.do_request; timing it here covers the handlers, the alarm bot and
+PTB's own calls without touching each call site.
+"""
+
+import time
+
+from telegram.request import HTTPXRequest
+
+from app.core.metrics import EXTERNAL_CALL_SECONDS, EXTERNAL_CALL_ERRORS
+from app.core.tracing import tracer
+
+
+class InstrumentedRequest(HTTPXRequest):
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        if "/file/bot" in url:
+            operation = "downloadFile"  # one label for all file downloads, not one per path
+        else:
+            operation = url.rsplit("/", 1)[-1]  # .../bot<token>/sendMessage -> sendMessage
+        started = time.perf_counter()
+        with tracer.span(f"telegram.{operation}") as span:
+            try:
+                code, payload = await super().do_request(url, method, *args, **kwargs)
+            except Exception:
+                EXTERNAL_CALL_ERRORS.inc(service="telegram", operation=operation)
+                raise
+            finally:
+                EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - started, service="telegram", operation=operation)
+            span.set(status=code)
+        if code >= 400:
+            EXTERNAL_CALL_ERRORS.inc(service="telegram", operation=operation)
+        return code, payload
@@ -0,0 +1,301 @@
+"""
+Lightweight in-process tracing of an update's lifecycle
+MathBotApp.webhook opens a trace per Telegram update; classification, database
+commands, SymPy steps, rendering, uploads and AI calls add nested spans to it.
+The current span travels in a context variable, so it follows awaits, tasks
+created from the handler and asyncio.to_thread calls.
+
+Finished traces slower than TRACE_SLOW_THRESHOLD_MS are kept in a ring buffer
+(served at /debug/traces) and, when TRACE_EXPORT_PATH is set, appended to that
+file as JSON lines. Chrome trace event format (chrome://tracing, Perfetto) is
+available for single traces.
+"""
+
+import inspect
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+
+# Spans beyond this many are dropped (and counted) so one runaway update stays bounded
+MAX_SPANS_PER_TRACE = 500
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "start", "end", "error")
+
+    def __init__(self, trace: "Trace", span_id: int, parent_id: Optional[int], name: str, attributes: Dict):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        """Attach attributes (result sizes, routes, ...) to the span"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict:
+        origin = self.trace.start
+        end = self.end if self.end is not None else time.perf_counter()
+        span = {
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+        }
+        if self.attributes:
+            span["attributes"] = self.attributes
+        if self.error:
+            span["error"] = self.error
+        return span
+
+
+class Trace:
+    def __init__(self, tracer: "Tracer", name: str):
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self.closed = False
+        self._open = 0
+        self._lock = threading.Lock()
+
+    @property
+    def duration(self) -> float:
+        ends = [span.end for span in self.spans if span.end is not None]
+        return (max(ends) if ends else time.perf_counter()) - self.start
+
+    def _add(self, name: str, parent_id: Optional[int], attributes: Dict) -> Optional[Span]:
+        with self._lock:
+            if self.closed or len(self.spans) >= MAX_SPANS_PER_TRACE:
+                self.dropped_spans += 1
+                return None
+            span = Span(self, len(self.spans) + 1, parent_id, name, attributes)
+            self.spans.append(span)
+            self._open += 1
+        return span
+
+    def _finish(self, span: Span) -> bool:
+        """Close a span; True once the trace's last open span closed"""
+        with self._lock:
+            span.end = time.perf_counter()
+            self._open -= 1
+            if self._open == 0 and not self.closed:
+                self.closed = True
+                return True
+        return False
+
+    def to_dict(self) -> Dict:
+        trace = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "spans": [span.to_dict() for span in self.spans],
+        }
+        if self.spans and self.spans[0].attributes:
+            trace["attributes"] = self.spans[0].attributes
+        if self.dropped_spans:
+            trace["dropped_spans"] = self.dropped_spans
+        return trace
+
+    def to_chrome_events(self) -> List[Dict]:
+        """Complete ('X') events of the Chrome trace event format, one thread row per trace"""
+        return [
+            {
+                "name": span["name"],
+                "ph": "X",
+                "ts": round(self.started_at * 1e6 + span["start_ms"] * 1000),
+                "dur": round(span["duration_ms"] * 1000),
+                "pid": 1,
+                "tid": self.trace_id,
+                "args": {**span.get("attributes", {}), **({"error": span["error"]} if "error" in span else {})},
+            }
+            for span in self.to_dict()["spans"]
+        ]
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _SpanScope:
+    """Makes an open span current for a with / async with block and closes it on exit"""
+
+    __slots__ = ("tracer", "span", "_token")
+
+    def __init__(self, tracer: "Tracer", span: Span):
+        self.tracer = tracer
+        self.span = span
+        self._token = None
+
+    def __enter__(self) -> Span:
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.tracer._finish(self.span)
+        return False
+
+    async def __aenter__(self) -> Span:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        return self.__exit__(exc_type, exc, traceback)
+
+
+class _NoSpan:
+    """Stand-in when no trace is active - costs one context variable lookup"""
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    def __init__(self, enabled: bool = None, slow_threshold_ms: float = None,
+                 buffer_size: int = None, export_path: str = None):
+        self.enabled = Config.TRACING_ENABLED if enabled is None else enabled
+        self.slow_threshold = (Config.TRACE_SLOW_THRESHOLD_MS if slow_threshold_ms is None else slow_threshold_ms) / 1000
+        self.export_path = Config.TRACE_EXPORT_PATH if export_path is None else export_path
+        self.slow_traces = deque(maxlen=buffer_size or Config.TRACE_BUFFER_SIZE)
+        self.stats = {"traces": 0, "slow": 0, "exported": 0, "export_errors": 0}
+        self._export_lock = threading.Lock()
+
+    def trace(self, name: str, **attributes):
+        """
+        Start a trace whose root span covers the with block
+
+        The trace finishes when its last span closes - possibly after the block,
+        when background work holds a span (see span()).
+        """
+        if not self.enabled:
+            return _NO_SPAN
+        trace = Trace(self, name)
+        return _SpanScope(self, trace._add(name, None, attributes))
+
+    def span(self, name: str, **attributes):
+        """
+        A child span of the current span (no-op outside a trace)
+
+        The span starts when span() is called and ends when its block exits, so it
+        can be created in a handler and entered by a background task it hands off to.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            return _NO_SPAN
+        span = parent.trace._add(name, parent.span_id, attributes)
+        return _NO_SPAN if span is None else _SpanScope(self, span)
+
+    def handoff(self, name: str, coroutine):
+        """
+        Wrap a coroutine that is scheduled as background work (create_task)
+
+        Its span starts now, so the update's trace stays open until the background
+        work finishes, and spans made by the coroutine nest under it.
+        """
+        scope = self.span(name)
+
+        async def run():
+            async with scope:
+                return await coroutine
+        return run()
+
+    def record(self, name: str, duration: float, **attributes):
+        """Add an already finished span that took `duration` seconds (e.g. from a driver callback)"""
+        parent = _current_span.get()
+        if parent is None:
+            return
+        span = parent.trace._add(name, parent.span_id, attributes)
+        if span is not None:
+            span.start = time.perf_counter() - duration
+            self._finish(span)
+
+    def current_trace_id(self) -> Optional[str]:
+        span = _current_span.get()
+        return span.trace.trace_id if span is not None else None
+
+    def _finish(self, span: Span):
+        if span.trace._finish(span):
+            self._complete(span.trace)
+
+    def _complete(self, trace: Trace):
+        self.stats["traces"] += 1
+        if trace.duration < self.slow_threshold:
+            return
+        self.stats["slow"] += 1
+        self.slow_traces.append(trace)
+        if self.export_path:
+            self._export(trace)
+
+    def _export(self, trace: Trace):
+        """Append the trace as one JSON line"""
+        try:
+            line = json.dumps(trace.to_dict(), default=str)
+            with self._export_lock, open(self.export_path, "a") as f:
+                f.write(line + "\n")
+            self.stats["exported"] += 1
+        except Exception as e:
+            self.stats["export_errors"] += 1
+            print(f"⚠️ Trace export failed: {e}")
+
+    def get_slow_traces(self, limit: int = None) -> List[Dict]:
+        """Most recent slow traces first"""
+        traces = list(self.slow_traces)[::-1]
+        return [trace.to_dict() for trace in traces[:limit]]
+
+    def find(self, trace_id: str) -> Optional[Trace]:
+        for trace in self.slow_traces:
+            if trace.trace_id == trace_id:
+                return trace
+        return None
+
+# Global tracer instance
+tracer = Tracer()
+
+
+def traced(name: str):
+    """Decorator: run the function (sync or async) in a span of the current trace"""
+    def decorator(function: Callable):
+        if inspect.iscoroutinefunction(function):
+            @wraps(function)
+            async def wrapper(*args, **kwargs):
+                async with tracer.span(name):
+                    return await function(*args, **kwargs)
+        else:
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return function(*args, **kwargs)
+        return wrapper
+    return decorator
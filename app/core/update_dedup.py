@@ -0,0 +1,110 @@
+"""
+Webhook update deduplication
+Telegram redelivers an update when the webhook doesn't answer in time, so a slow
+handler would process the same update_id twice (two AI calls, two PDFs, a streak
+counted twice). Every update_id is claimed before processing; repeats within the
+window are answered 200 and dropped.
+
+The in-memory seen-set is bounded by size and age and catches retries that reach
+the same process. With the shared backend the claim also goes through the state
+store (create-only write, see app/services/state_store.py), so a retry that lands
+on another worker or replica is caught as well.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import Config
+from app.core.metrics import metrics
+
+DUPLICATE_UPDATES = metrics.counter(
+    "mathbot_webhook_duplicate_updates_total", "Redelivered webhook updates dropped before processing", ["backend"]
+)
+
+
+class UpdateDeduplicator:
+    """Time-windowed, size-bounded set of claimed update IDs"""
+
+    def __init__(self, window: float = None, max_size: int = None, shared: bool = None):
+        self.window = window or Config.UPDATE_DEDUP_WINDOW
+        self.max_size = max_size or Config.UPDATE_DEDUP_MAX_SIZE
+        self.shared = Config.UPDATE_DEDUP_SHARED if shared is None else shared
+        self._seen = OrderedDict()  # update_id -> monotonic claim time, oldest first
+        self._lock = threading.Lock()
+        self._namespace = None
+
+    @property
+    def namespace(self):
+        """Shared claims, one state store entry per update_id"""
+        if self._namespace is None:
+            from app.services.state_store import state_store
+
+            self._namespace = state_store.namespace('update', ttl=self.window)
+        return self._namespace
+
+    def _evict(self, now: float):
+        while self._seen and (len(self._seen) > self.max_size or next(iter(self._seen.values())) <= now - self.window):
+            self._seen.popitem(last=False)
+
+    def claim_local(self, update_id: int) -> bool:
+        """True if this process hasn't seen update_id within the window"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            if update_id in self._seen:
+                return False
+            self._seen[update_id] = now
+            if len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+            return True
+
+    def claim_shared(self, update_id: int) -> bool:
+        """True unless another process claimed update_id (blocking; fails open if the store is unreachable)"""
+        from app.services.state_store import VersionConflict
+
+        try:
+            self.namespace.put(update_id, True, expected_version=0)
+            return True
+        except VersionConflict:
+            return False
+        except Exception as e:
+            print(f"⚠️ Shared update deduplication unavailable: {e}")
+            return True
+
+    async def claim(self, update_id: int) -> bool:
+        """True if the update should be processed - False for a duplicate (counted in the metrics)"""
+        if not self.claim_local(update_id):
+            DUPLICATE_UPDATES.inc(backend="memory")
+            return False
+        if self.shared and not await asyncio.to_thread(self.claim_shared, update_id):
+            DUPLICATE_UPDATES.inc(backend="shared")
+            return False
+        return True
+
+    async def release(self, update_id: Optional[int]):
+        """Forget a claim whose processing failed, so Telegram's retry is processed"""
+        if update_id is None:
+            return
+        with self._lock:
+            self._seen.pop(update_id, None)
+        if self.shared:
+            try:
+                await asyncio.to_thread(self.namespace.delete, update_id)
+            except Exception as e:
+                print(f"⚠️ Could not release update {update_id}: {e}")
+
+    def size(self) -> int:
+        return len(self._seen)
+
+
+def _collect_dedup_metrics():
+    """Size of the in-memory seen-set for /metrics"""
+    return [("mathbot_webhook_seen_updates", "gauge", "Update IDs held by the in-memory deduplication window",
+             [({}, update_deduplicator.size())])]
+
+# Global update deduplicator instance
+update_deduplicator = UpdateDeduplicator()
+metrics.register_collector(_collect_dedup_metrics)
@@ -1,20 +1,39 @@
-import re
+import asyncio
+import logging
 import os
+import re
+import time
 from datetime import datetime
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
 
 from config import Config
+from app.core.metrics import observe_latency, HANDLER_SECONDS, HANDLER_ERRORS
+from app.core.tracing import tracer
 from app.models.database import db_manager
 from app.services.math_solver import math_solver
 from app.services.pdf_generator import pdf_generator
 from app.services.ai_assistant import ai_assistant
 from app.services.ocr_service import ocr_service
+from app.services.message_router import message_router
+from app.services.state_store import state_store, VersionConflict
 import app.services.alarm_manager as alarm_module
 
 # Import function_analyzer
 from app.services.function_analyzer import function_analyzer
 
+# "1. ", "2) ", "a) " in front of pasted homework problems
+PROBLEM_NUMBERING = re.compile(r'^(?:\d+[.)]|[a-zA-Z]\))\s+')
+PROBLEM_CONTENT = re.compile(r'[\d=]')
+
+# Telegram rejects longer messages (counted in UTF-16 code units); progress and batch replies stay below it
+TELEGRAM_MESSAGE_LIMIT = 4096
+PROGRESS_FUNCTION_CHARS = 200
+PROGRESS_STEP_CHARS = 500
+
+logger = logging.getLogger(__name__)
+
 class BotHandlers:
     def __init__(self):
         # Define custom keyboard - Fixed layout without duplicates
@@ -30,9 +49,23 @@ class BotHandlers:
             one_time_keyboard=False
         )
 
+        # Menu button text -> handler
+        self.menu_actions = {
+            '🧮 Solve Math': self.prompt_math_expression,
+            '📈 Solve Function': self.prompt_function_analysis,
+            '⏰ Set Alarm': self.prompt_set_alarm,
+            '📊 My Stats': self.show_user_stats,
+            '📋 List Alarms': self.list_user_alarms,
+            '🤖 AI Chat': self.prompt_ai_chat,
+            '⚙️ Settings': self.show_settings,
+            '🔄 Reset Chat': self.reset_chat_context,
+        }
+
         # User conversation states for alarm creation
-        self.user_states = {}  # {user_id: {'state': 'waiting_for_name', 'data': {...}}}
+        # {user_id: {'state': 'waiting_for_alarm_name', 'data': {...}}}, shared by all replicas (see state_store)
+        self.user_states = state_store.namespace('user_state', ttl=Config.USER_STATE_TTL)
     
+    @observe_latency(HANDLER_SECONDS, HANDLER_ERRORS, route="start")
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
         user = update.effective_user
@@ -86,38 +119,37 @@ class BotHandlers:
         db_manager.update_last_activity(user_id)
 
         # Check if user is in a conversation state (alarm creation)
-        if user_id in self.user_states:
-            await self.handle_conversation_state(update, context, text)
+        user_state = self.user_states.get_entry(user_id)
+        if user_state:
+            await self.handle_conversation_state(update, context, text, user_state)
             return
 
-        if text == '🧮 Solve Math':
-            await self.prompt_math_expression(update, context)
-        elif text == '📈 Solve Function':
-            await self.prompt_function_analysis(update, context)
-        elif text == '⏰ Set Alarm':
-            await self.prompt_set_alarm(update, context)
-        elif text == '📊 My Stats':
-            await self.show_user_stats(update, context)
-        elif text == '📋 List Alarms':
-            await self.list_user_alarms(update, context)
-        elif text == '🤖 AI Chat':
-            await self.prompt_ai_chat(update, context)
-        elif text == '⚙️ Settings':
-            await self.show_settings(update, context)
-        elif text == '🔄 Reset Chat':
-            await self.reset_chat_context(update, context)
+        menu_action = self.menu_actions.get(text)
+        if menu_action:
+            await menu_action(update, context)
+            return
+
+        # Several math problems pasted at once are solved together with one reply
+        problems = self.split_math_problems(text)
+        if len(problems) > 1:
+            await self.solve_math_batch(update, context, problems)
+            return
+
+        # One classification pass decides the route (function > alarm > math > AI)
+        with tracer.span("classify") as span:
+            route = message_router.classify(text).route
+            span.set(route=route)
+        if route == 'function':
+            await self.analyze_function(update, context, text)
+        elif route == 'alarm':
+            await self.add_alarm(update, context, text)
+        elif route == 'math':
+            await self.solve_math_expression(update, context, text)
         else:
-            # Check if it's a function first (higher priority than math expressions)
-            if self.is_function_expression(text):
-                await self.analyze_function(update, context, text)
-            elif self.is_alarm_time(text):
-                await self.add_alarm(update, context, text)
-            elif self.is_math_expression(text):
-                await self.solve_math_expression(update, context, text)
-            else:
-                # Handle with AI assistant for natural conversation
-                await self.handle_ai_conversation(update, context, text)
+            # Handle with AI assistant for natural conversation
+            await self.handle_ai_conversation(update, context, text)
 
+    @observe_latency(HANDLER_SECONDS, HANDLER_ERRORS, route="photo")
     async def handle_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle photo messages and extract text using OCR"""
         user_id = update.effective_user.id
@@ -130,7 +162,7 @@ class BotHandlers:
             await update.message.reply_text(
                 "📷 **Photo Received!**\n\n"
                 "❌ **OCR service is not available.**\n\n"
-                "To enable text extraction from photos, the administrator needs to configure Google Cloud Vision API.\n\n"
+                "To enable text extraction from photos, the administrator needs to configure an OCR engine (Google Cloud Vision or Tesseract).\n\n"
                 "You can still use the bot for:\n"
                 "🧮 Math expressions (type them)\n"
                 "📈 Function analysis\n"
@@ -148,12 +180,10 @@ class BotHandlers:
                 parse_mode='Markdown'
             )
 
-            # Get the largest photo size
-            photo = update.message.photo[-1]
-
-            # Download and process the photo
-            photo_file = await context.bot.get_file(photo.file_id)
-            success, extracted_text, error_message = await ocr_service.process_telegram_photo(photo_file)
+            # Download (or reuse a cached result for) the photo and extract its text
+            success, extracted_text, error_message = await ocr_service.process_photo_message(
+                context.bot, update.message.photo
+            )
 
             if not success:
                 await processing_msg.edit_text(
@@ -223,17 +253,19 @@ class BotHandlers:
                 reply_markup=self.reply_markup
             )
 
-    async def handle_conversation_state(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    async def handle_conversation_state(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                        entry=None):
         """Handle conversation states for alarm creation"""
         user_id = update.effective_user.id
-        user_state = self.user_states.get(user_id)
+        entry = entry or self.user_states.get_entry(user_id)
 
-        if not user_state:
+        if not entry:
             return
+        user_state = entry.value
 
         # Check for cancellation
         if text.lower() in ['cancel', 'stop', 'exit', '/cancel']:
-            del self.user_states[user_id]
+            self.user_states.delete(user_id)
             await update.message.reply_text(
                 "❌ **Alarm creation cancelled.**\n\n"
                 "You can start again anytime using '⏰ Set Alarm'.",
@@ -264,11 +296,14 @@ class BotHandlers:
                 )
                 return
 
-            # Update state to waiting for time
-            self.user_states[user_id] = {
-                'state': 'waiting_for_alarm_time',
-                'data': {'alarm_name': alarm_name}
-            }
+            # Update state to waiting for time (unless another message of this user got there first)
+            try:
+                self.user_states.put(user_id, {
+                    'state': 'waiting_for_alarm_time',
+                    'data': {'alarm_name': alarm_name}
+                }, expected_version=entry.version)
+            except VersionConflict:
+                return
 
             await update.message.reply_text(
                 f"✅ **Alarm Name Set Successfully!**\n\n"
@@ -291,8 +326,9 @@ class BotHandlers:
             alarm_time = text.strip()
             alarm_name = user_state['data']['alarm_name']
 
-            # Clear user state first
-            del self.user_states[user_id]
+            # Claim and clear the user state first - a concurrent message for the same step stops here
+            if self.user_states.take(user_id, expected_version=entry.version) is None:
+                return
 
             # Validate time format
             if not self.is_alarm_time(alarm_time):
@@ -313,6 +349,7 @@ class BotHandlers:
             # Complete alarm creation
             await self.complete_alarm_creation(update, context, alarm_name, alarm_time)
 
+    @observe_latency(HANDLER_SECONDS, HANDLER_ERRORS, route="ai")
     async def handle_ai_conversation(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
         """Handle conversation with AI assistant - improved error handling"""
         user_id = update.effective_user.id
@@ -399,116 +436,16 @@ class BotHandlers:
         )
 
     def is_math_expression(self, text: str) -> bool:
-        """Check if text looks like a math expression or equation - improved detection"""
-        # Skip very short text or pure words/questions
-        if len(text.strip()) < 2:
-            return False
-        
-        # Check for equations first (contains = sign)
-        if '=' in text:
-            # Simple check: if it has = and looks like math, it's probably an equation
-            parts = text.split('=')
-            if len(parts) == 2:
-                # Both sides should have math-like content
-                left, right = parts[0].strip(), parts[1].strip()
-                if (any(c.isdigit() or c in 'xyz+-*/^()' for c in left) and 
-                    any(c.isdigit() or c in 'xyz+-*/^()' for c in right)):
-                    return True
-        
-        # Skip if it's clearly a question or conversation
-        question_words = ['what', 'how', 'why', 'when', 'where', 'who', 'can', 'could', 'would', 'should', 'help', 'tell', 'explain']
-        if any(word in text.lower() for word in question_words):
-            return False
-        
-        # Skip if it contains too many words (likely conversation)
-        words = text.split()
-        if len(words) > 10:
-            return False
-        
-        # Strong math indicators
-        strong_math_patterns = [
-            r'\d+\s*[\+\-\*/\^]\s*\d+',  # Numbers with operators: 2+3, 5*6
-            r'(sin|cos|tan|log|ln|sqrt|exp|abs)\s*\(',  # Functions with parentheses
-            r'\d+!',  # Factorials: 5!
-            r'\d+\^\d+',  # Powers: 2^3
-            r'pi\s*[\+\-\*/]|e\s*[\+\-\*/]',  # Constants with operators
-            r'[a-z]\s*[\+\-\*/\^]\s*\d+',  # Variable with number: x+5, 2x
-            r'\d+\s*\*?\s*[a-z]',  # Number with variable: 2x, 3*y
-        ]
-        
-        # If it has strong math indicators, it's likely math
-        if any(re.search(pattern, text.lower()) for pattern in strong_math_patterns):
-            return True
-        
-        # Weaker indicators - need multiple to confirm
-        weak_math_patterns = [
-            r'[\+\-\*/\^]',  # Basic operators
-            r'\d+\.\d+',  # Decimals
-            r'\(\d+\)',  # Numbers in parentheses
-            r'(pi|e)\b',  # Math constants
-            r'[a-z]',  # Variables
-        ]
-        
-        weak_matches = sum(1 for pattern in weak_math_patterns if re.search(pattern, text.lower()))
-        
-        # If multiple weak indicators and not too many words, probably math
-        if weak_matches >= 2 and len(words) <= 5:
-            return True
-        
-        return False
+        """Check if text looks like a math expression or equation"""
+        return message_router.is_math_expression(text)
     
     def is_function_expression(self, text: str) -> bool:
         """Check if text looks like a function definition"""
-        # Strong function indicators (explicit function notation)
-        strong_function_patterns = [
-            r'f\(x\)\s*=',  # f(x) = ...
-            r'y\s*=',       # y = ...
-            r'g\(x\)\s*=',  # g(x) = ...
-            r'h\(x\)\s*=',  # h(x) = ...
-        ]
-
-        # Check for explicit function notation first
-        if any(re.search(pattern, text.lower()) for pattern in strong_function_patterns):
-            return True
-
-        # Check for polynomial-like expressions with x
-        # These are likely functions if they contain x with powers or operations
-        if 'x' in text.lower():
-            polynomial_patterns = [
-                r'x\^?\d+',     # x^2, x2, x^3, etc.
-                r'x\s*[\+\-]',  # x + ..., x - ...
-                r'[\+\-]\s*x',  # ... + x, ... - x
-                r'\d+\s*\*?\s*x',  # 2x, 2*x, etc.
-                r'x\s*\*\s*x',  # x*x
-            ]
-
-            # Check for trigonometric functions with x
-            trig_with_x_patterns = [
-                r'sin\s*\(\s*x',    # sin(x)
-                r'cos\s*\(\s*x',    # cos(x)
-                r'tan\s*\(\s*x',    # tan(x)
-                r'log\s*\(\s*x',    # log(x)
-                r'ln\s*\(\s*x',     # ln(x)
-                r'sqrt\s*\(\s*x',   # sqrt(x)
-                r'exp\s*\(\s*x',    # exp(x)
-            ]
-
-            # If it contains x and polynomial patterns, it's likely a function
-            if any(re.search(pattern, text.lower()) for pattern in polynomial_patterns):
-                # Additional check: if it's just a number, it's not a function
-                if not re.match(r'^\s*\d+\.?\d*\s*$', text):
-                    return True
-
-            # If it contains trigonometric functions with x, it's a function
-            if any(re.search(pattern, text.lower()) for pattern in trig_with_x_patterns):
-                return True
-
-        return False
+        return message_router.is_function_expression(text)
     
     def is_alarm_time(self, text: str) -> bool:
         """Check if text looks like a time format"""
-        time_pattern = r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$'
-        return bool(re.match(time_pattern, text.strip()))
+        return message_router.is_alarm_time(text)
     
     async def prompt_math_expression(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Prompt user to enter a math expression or equation"""
@@ -524,7 +461,9 @@ class BotHandlers:
                 "• x + 5 = 12 (one-step addition)\n"
                 "• 2x = 10 (one-step multiplication)\n"
                 "• x/3 = 4 (one-step division)\n"
-                "• 3x - 7 = 14 (two-step equation)\n\n"
+                "• 3x - 7 = 14 (two-step equation)\n"
+                "• x + y = 5; x - y = 1 (system of equations)\n"
+                "• 2x + 3y = 6 for y (solve for a variable)\n\n"
                 "I support:\n"
                 "✅ Basic operations (+, -, *, /, ^)\n"
                 "✅ Trigonometric functions (sin, cos, tan)\n"
@@ -532,7 +471,8 @@ class BotHandlers:
                 "✅ Exponentials and roots (exp, sqrt)\n"
                 "✅ Constants (pi, e)\n"
                 "✅ Factorials (!)\n"
-                "✅ One-step and multi-step equations",
+                "✅ One-step and multi-step equations\n"
+                "✅ Systems of equations (separate with ;)",
                 parse_mode='Markdown'
             )
         except Exception as e:
@@ -548,7 +488,9 @@ class BotHandlers:
                 "• x + 5 = 12 (one-step addition)\n"
                 "• 2x = 10 (one-step multiplication)\n"
                 "• x/3 = 4 (one-step division)\n"
-                "• 3x - 7 = 14 (two-step equation)\n\n"
+                "• 3x - 7 = 14 (two-step equation)\n"
+                "• x + y = 5; x - y = 1 (system of equations)\n"
+                "• 2x + 3y = 6 for y (solve for a variable)\n\n"
                 "I support:\n"
                 "✅ Basic operations (+, -, *, /, ^)\n"
                 "✅ Trigonometric functions (sin, cos, tan)\n"
@@ -556,9 +498,11 @@ class BotHandlers:
                 "✅ Exponentials and roots (exp, sqrt)\n"
                 "✅ Constants (pi, e)\n"
                 "✅ Factorials (!)\n"
-                "✅ One-step and multi-step equations"
+                "✅ One-step and multi-step equations\n"
+                "✅ Systems of equations (separate with ;)"
             )
     
+    @observe_latency(HANDLER_SECONDS, HANDLER_ERRORS, route="solve")
     async def solve_math_expression(self, update: Update, context: ContextTypes.DEFAULT_TYPE, expression: str):
         """Solve a mathematical expression or equation - returns simple text message"""
         user_id = update.effective_user.id
@@ -577,8 +521,9 @@ class BotHandlers:
                 )
                 return
             
-            # Solve the expression or equation
-            success, result, steps = math_solver.solve_expression(expression)
+            # Solve the expression or equation (SymPy can take seconds - keep it off the event loop)
+            loop = asyncio.get_running_loop()
+            success, result, steps = await loop.run_in_executor(None, math_solver.solve_expression, expression)
             
             if success:
                 # Send simple text message (no PDF generation)
@@ -618,7 +563,8 @@ class BotHandlers:
                     "Please check your input and try again.\n\n"
                     "**Examples:**\n"
                     "• Expressions: `2 + 3 * 4`, `sin(30)`, `sqrt(16)`\n"
-                    "• Equations: `x + 5 = 12`, `2x - 3 = 7`, `x/4 = 6`\n\n"
+                    "• Equations: `x + 5 = 12`, `2x - 3 = 7`, `x/4 = 6`\n"
+                    "• Systems: `x + y = 5; x - y = 1`, `2x + 3y = 6 for y`\n\n"
                     "**Tips:**\n"
                     "• Use * for multiplication (2*3)\n"
                     "• Use ^ or ** for powers (2^3 or 2**3)\n"
@@ -637,6 +583,93 @@ class BotHandlers:
                 reply_markup=self.reply_markup
             )
     
+    def split_math_problems(self, text: str) -> list:
+        """Lines of a multi-line message if every line is a math problem, else []"""
+        lines = [PROBLEM_NUMBERING.sub('', line.strip()) for line in text.splitlines() if line.strip()]
+        if len(lines) < 2:
+            return []
+        if not all(self._is_batch_problem(line) and PROBLEM_CONTENT.search(line) for line in lines):
+            return []
+        return lines
+
+    def _is_batch_problem(self, line: str) -> bool:
+        """A line the router sends to the solver, or an equation in x such as 2x+3=7"""
+        decision = message_router.classify(line)
+        if decision.route == 'math':
+            return True
+        # Alone, equations in x go to function analysis; in a list they are exercises to solve.
+        # Expressions such as x^2+1 and f(x)= / y= definitions stay out (function analysis).
+        return decision.reason == 'function_of_x' and '=' in line and message_router.is_math_expression(line)
+
+    @observe_latency(HANDLER_SECONDS, HANDLER_ERRORS, route="solve_batch")
+    async def solve_math_batch(self, update: Update, context: ContextTypes.DEFAULT_TYPE, problems: list):
+        """Solve several expressions/equations and answer with one message (or one PDF)"""
+        user_id = update.effective_user.id
+
+        # Past the cap the rest are not solved - say so instead of dropping them silently
+        skipped = max(0, len(problems) - Config.MATH_BATCH_MAX_ITEMS)
+        problems = problems[:Config.MATH_BATCH_MAX_ITEMS]
+        skipped_note = (
+            f"\n\n⚠️ {skipped} more problem{'s' if skipped != 1 else ''} skipped - at most "
+            f"{Config.MATH_BATCH_MAX_ITEMS} per message, please send the rest separately."
+        ) if skipped else ""
+
+        try:
+            await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
+
+            results = await math_solver.solve_batch_async(problems)
+            solved = sum(1 for success, _, _ in results if success)
+
+            lines = []
+            for number, (problem, (success, result, _)) in enumerate(zip(problems, results), start=1):
+                answer = result if success else f"❌ {result}"
+                lines.append(f"{number}. {problem}  →  {answer}")
+            text = f"🧮 Math Solutions ({solved} of {len(problems)} solved)\n\n" + "\n".join(lines) + skipped_note
+
+            # Many problems, or answers too long for one message, go into a PDF
+            if len(problems) > Config.MATH_BATCH_PDF_THRESHOLD or self._telegram_length(text) > TELEGRAM_MESSAGE_LIMIT:
+                steps = []
+                for number, (problem, (_, result, problem_steps)) in enumerate(zip(problems, results), start=1):
+                    steps.append(f"{number}. {problem}")
+                    steps.extend(f"    {line}" for line in (problem_steps or result).split('\n'))
+                    steps.append("")
+
+                loop = asyncio.get_running_loop()
+                with tracer.span("render.pdf"):
+                    pdf_filename = await loop.run_in_executor(
+                        None,
+                        lambda: pdf_generator.generate_math_pdf(
+                            expression=f"{len(problems)} problems",
+                            result=f"{solved} of {len(problems)} solved",
+                            steps="\n".join(steps),
+                            user_id=user_id
+                        )
+                    )
+                if pdf_filename and os.path.exists(pdf_filename):
+                    with open(pdf_filename, 'rb') as pdf_file:
+                        await context.bot.send_document(
+                            chat_id=update.effective_chat.id,
+                            document=pdf_file,
+                            filename=f"math_solutions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                            caption=f"🧮 Solutions for {len(problems)} problems ({solved} solved){skipped_note}",
+                            reply_markup=self.reply_markup
+                        )
+                    pdf_generator.cleanup_file(pdf_filename)
+                    return
+
+            # Plain text: user input is not Markdown-safe. Split if the PDF could not be made
+            for chunk in self._split_message(text):
+                await update.message.reply_text(chunk, reply_markup=self.reply_markup)
+
+        except Exception as e:
+            print(f"Critical error in solve_math_batch: {e}")
+            await update.message.reply_text(
+                "❌ **Unexpected Error**\n\n"
+                "Something went wrong while solving your problems. Please try again or send them one at a time.",
+                parse_mode='Markdown',
+                reply_markup=self.reply_markup
+            )
+    
     async def prompt_function_analysis(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Prompt user to enter a function for analysis"""
         await update.message.reply_text(
@@ -658,35 +691,94 @@ class BotHandlers:
             parse_mode='Markdown'
         )
     
+    @observe_latency(HANDLER_SECONDS, HANDLER_ERRORS, route="analyze")
     async def analyze_function(self, update: Update, context: ContextTypes.DEFAULT_TYPE, function_str: str):
-        """Analyze a mathematical function"""
-        user_id = update.effective_user.id
-        
+        """
+        Analyze a mathematical function
+
+        The first steps are streamed into one progress message as they finish; the
+        remaining steps, the graph and the PDF continue in a background task.
+        """
         # Show typing indicator
         await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
         
+        steps = function_analyzer.iter_analysis(function_str)
         try:
-            # Analyze the function
-            analysis = function_analyzer.analyze_function(function_str)
-            
-            if 'error' in analysis:
-                await update.message.reply_text(
-                    f"❌ **Error analyzing function:**\n`{function_str}`\n\n"
-                    f"**Error:** {analysis['error']}\n\n"
-                    "Please check your function syntax and try again.",
-                    parse_mode='Markdown'
-                )
-                return
-            
+            _, _, function = await steps.__anext__()
+        except Exception as e:
+            await update.message.reply_text(
+                f"❌ **Error analyzing function:**\n`{function_str}`\n\n"
+                f"**Error:** {str(e)}\n\n"
+                "Please check your function syntax and try again.",
+                parse_mode='Markdown'
+            )
+            return
+
+        analysis = {'original': function_str, 'function': function}
+        progress = {'message': None, 'shown': [], 'step': 0, 'edited_at': 0.0}
+        step_numbers = {key: number for number, (key, _, _) in enumerate(function_analyzer.analysis_steps(function_str), start=1)}
+        total_steps = len(step_numbers)
+
+        try:
+            progress['message'] = await update.message.reply_text(
+                self._format_analysis_progress(function, progress['shown'], f"⏳ 0 of {total_steps} steps done...")
+            )
+            # Steps finish in any order; the first ones to finish are shown in step order
+            async for key, title, text in steps:
+                analysis[key] = text
+                progress['step'] += 1
+                progress['shown'].append((step_numbers[key], title, text))
+                progress['shown'].sort()
+                await self._update_analysis_progress(progress, function, total_steps, force=True)
+                if progress['step'] >= min(Config.FUNCTION_STREAM_STEPS, total_steps):
+                    break
+        except Exception as e:
+            await update.message.reply_text(
+                f"❌ **Unexpected error:**\n{str(e)}\n\n"
+                "Please try again or contact support.",
+                parse_mode='Markdown'
+            )
+            return
+
+        # Slower steps, the graph and the PDF don't hold up this update (the trace follows them)
+        context.application.create_task(
+            tracer.handoff(
+                "analysis.background",
+                self._finish_function_analysis(update, context, function_str, steps, analysis, progress, total_steps)
+            ),
+            update=update
+        )
+
+    @observe_latency(HANDLER_SECONDS, HANDLER_ERRORS, route="analyze_pdf")
+    async def _finish_function_analysis(self, update: Update, context: ContextTypes.DEFAULT_TYPE, function_str: str,
+                                        steps, analysis: dict, progress: dict, total_steps: int):
+        """Run the remaining analysis steps, then render the graph and PDF and attach it"""
+        user_id = update.effective_user.id
+        function = analysis['function']
+        
+        try:
+            async for key, title, text in steps:
+                analysis[key] = text
+                progress['step'] += 1
+                await self._update_analysis_progress(progress, function, total_steps)
+
+            await self._edit_analysis_progress(progress, function, "🎨 Drawing the graph and building the PDF...")
+            loop = asyncio.get_running_loop()
+
             # Generate graph
-            graph_base64 = function_analyzer.plot_function(function_str)
+            with tracer.span("render.plot"):
+                graph_base64 = await loop.run_in_executor(None, function_analyzer.plot_function, function_str)
             
             # Generate PDF
-            pdf_filename = pdf_generator.generate_function_pdf(
-                analysis=analysis,
-                graph_base64=graph_base64,
-                user_id=user_id
-            )
+            with tracer.span("render.pdf"):
+                pdf_filename = await loop.run_in_executor(
+                    None,
+                    lambda: pdf_generator.generate_function_pdf(
+                        analysis=analysis,
+                        graph_base64=graph_base64,
+                        user_id=user_id
+                    )
+                )
             
             if pdf_filename and os.path.exists(pdf_filename):
                 # Send PDF
@@ -701,6 +793,7 @@ class BotHandlers:
                 
                 # Clean up PDF file
                 pdf_generator.cleanup_file(pdf_filename)
+                await self._edit_analysis_progress(progress, function, "✅ Analysis complete - full report attached below.")
             else:
                 # Fallback to text message
                 summary = (
@@ -718,7 +811,74 @@ class BotHandlers:
                 "Please try again or contact support.",
                 parse_mode='Markdown'
             )
+
+    def _format_analysis_progress(self, function: str, shown: list, status: str) -> str:
+        """
+        Plain text (SymPy output is full of Markdown characters), within Telegram's limit:
+        each step is shortened, and once the budget is used up later steps show their title only
+        """
+        text = f"📈 Analyzing f(x) = {self._shorten(str(function), PROGRESS_FUNCTION_CHARS)}\n\n"
+        # Telegram counts UTF-16 code units: leave room for emoji in the status and titles
+        budget = TELEGRAM_MESSAGE_LIMIT - 2 * len(status) - 64
+        titles_only = False
+        for number, title, step_text in shown:
+            entry = f"{number}. {title}\n{self._shorten(step_text, PROGRESS_STEP_CHARS)}\n\n"
+            titles_only = titles_only or len(text) + len(entry) > budget
+            if titles_only:
+                entry = f"{number}. {title} (in the PDF)\n"
+            if len(text) + len(entry) > budget:
+                break
+            text += entry
+        return text + status
+
+    @staticmethod
+    def _shorten(text: str, limit: int) -> str:
+        return text if len(text) <= limit else text[:limit - 1] + "…"
+
+    @staticmethod
+    def _telegram_length(text: str) -> int:
+        """Length as Telegram counts it (UTF-16 code units: emoji count twice)"""
+        return len(text.encode('utf-16-le')) // 2
+
+    def _split_message(self, text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> list:
+        """Messages of at most limit, split between lines (a single longer line is cut)"""
+        chunks, current = [], ""
+        for line in text.split("\n"):
+            while self._telegram_length(line) > limit:
+                cut = limit // 2  # every character fits in two code units
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(line[:cut])
+                line = line[cut:]
+            candidate = f"{current}\n{line}" if current else line
+            if current and self._telegram_length(candidate) > limit:
+                chunks.append(current)
+                candidate = line
+            current = candidate
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def _update_analysis_progress(self, progress: dict, function: str, total_steps: int, force: bool = False):
+        """Edit the progress message after a step; status-only edits are throttled"""
+        if not force and time.monotonic() - progress['edited_at'] < Config.FUNCTION_PROGRESS_EDIT_INTERVAL:
+            return
+        if progress['step'] < total_steps:
+            status = f"⏳ {progress['step']} of {total_steps} steps done..."
+        else:
+            status = f"✅ All {total_steps} steps done."
+        await self._edit_analysis_progress(progress, function, status)
+
+    async def _edit_analysis_progress(self, progress: dict, function: str, status: str):
+        progress['edited_at'] = time.monotonic()
+        try:
+            await progress['message'].edit_text(self._format_analysis_progress(function, progress['shown'], status))
+        except TelegramError as e:
+            # "message is not modified", flood limits - the PDF still follows
+            logger.warning("⚠️ Could not update analysis progress: %s", e)
     
+    @observe_latency(HANDLER_SECONDS, HANDLER_ERRORS, route="alarm")
     async def prompt_set_alarm(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Prompt user to set an alarm - Step 1: Ask for alarm name"""
         user_id = update.effective_user.id
@@ -734,10 +894,10 @@ class BotHandlers:
             return
 
         # Set user state to waiting for alarm name
-        self.user_states[user_id] = {
+        self.user_states.put(user_id, {
             'state': 'waiting_for_alarm_name',
             'data': {}
-        }
+        })
 
         await update.message.reply_text(
             "⏰ **Starting Alarm Setup Process**\n\n"
@@ -755,6 +915,7 @@ class BotHandlers:
             parse_mode='Markdown'
         )
 
+    @observe_latency(HANDLER_SECONDS, HANDLER_ERRORS, route="alarm")
     async def complete_alarm_creation(self, update: Update, context: ContextTypes.DEFAULT_TYPE, alarm_name: str, alarm_time: str):
         """Complete the alarm creation process"""
         user_id = update.effective_user.id
@@ -813,6 +974,7 @@ class BotHandlers:
                 reply_markup=self.reply_markup
             )
 
+    @observe_latency(HANDLER_SECONDS, HANDLER_ERRORS, route="alarm")
     async def add_alarm(self, update: Update, context: ContextTypes.DEFAULT_TYPE, alarm_time: str):
         """Add a new alarm"""
         user_id = update.effective_user.id
@@ -856,6 +1018,7 @@ class BotHandlers:
 
             await update.message.reply_text(message, parse_mode='Markdown')
 
+    @observe_latency(HANDLER_SECONDS, HANDLER_ERRORS, route="alarm")
     async def list_user_alarms(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """List all user alarms with delete buttons"""
         user_id = update.effective_user.id
@@ -987,6 +1150,7 @@ class BotHandlers:
         elif callback_data == 'back_to_menu':
             await self.show_main_menu(update, context)
 
+    @observe_latency(HANDLER_SECONDS, HANDLER_ERRORS, route="alarm")
     async def handle_delete_alarm(self, update: Update, context: ContextTypes.DEFAULT_TYPE, callback_data: str):
         """Handle alarm deletion"""
         user_id = update.effective_user.id
@@ -1029,6 +1193,7 @@ class BotHandlers:
                 parse_mode='Markdown'
             )
 
+    @observe_latency(HANDLER_SECONDS, HANDLER_ERRORS, route="alarm")
     async def handle_alarm_response(self, update: Update, context: ContextTypes.DEFAULT_TYPE, callback_data: str):
         """Handle alarm notification response"""
         if alarm_module.alarm_manager:
@@ -1194,8 +1359,7 @@ Just tap a button below or type your math problem directly!"""
         
         try:
             # Clear user conversation state if exists
-            if user_id in self.user_states:
-                del self.user_states[user_id]
+            self.user_states.delete(user_id)
             
             # Clear AI conversation history
             from app.services.ai_assistant import ai_assistant
@@ -3,13 +3,34 @@ from datetime import datetime
 from typing import List, Dict, Optional
 from pymongo import MongoClient
 from pymongo.errors import DuplicateKeyError
+from pymongo import monitoring
 import pytz
 
 from config import Config
+from app.core.lazy import LazyService
+from app.core.metrics import EXTERNAL_CALL_SECONDS, EXTERNAL_CALL_ERRORS
+from app.core.tracing import tracer
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command (find, update, insert, ...) for /metrics and the update's trace"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        seconds = event.duration_micros / 1e6
+        EXTERNAL_CALL_SECONDS.observe(seconds, service="mongo", operation=event.command_name)
+        tracer.record(f"mongo.{event.command_name}", seconds)
+
+    def failed(self, event):
+        seconds = event.duration_micros / 1e6
+        EXTERNAL_CALL_SECONDS.observe(seconds, service="mongo", operation=event.command_name)
+        EXTERNAL_CALL_ERRORS.inc(service="mongo", operation=event.command_name)
+        tracer.record(f"mongo.{event.command_name}", seconds, error=str(event.failure))
 
 class DatabaseManager:
     def __init__(self):
-        self.client = MongoClient(Config.MONGODB_URI)
+        self.client = MongoClient(Config.MONGODB_URI, event_listeners=[MongoCommandMetrics()])
         self.db = self.client[Config.DATABASE_NAME]
         self.users = self.db[Config.USERS_COLLECTION]
         self.timezone = pytz.timezone(Config.TIMEZONE)
@@ -181,5 +202,5 @@ class DatabaseManager:
         """Close database connection"""
         self.client.close()
 
-# Global database instance
-db_manager = DatabaseManager()
+# Global database instance (connects on first use or during the startup warm-up)
+db_manager = LazyService(DatabaseManager, 'database')
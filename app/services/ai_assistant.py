@@ -2,10 +2,15 @@ import asyncio
 import aiohttp
 import json
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 from config import Config
+from app.core.metrics import metrics, EXTERNAL_CALL_SECONDS, EXTERNAL_CALL_ERRORS
+from app.core.tracing import traced
 from app.models.database import db_manager
+from app.services.rate_limiter import AdmissionController, AdmissionRejected
+from app.services.context_builder import ContextBuilder
+from app.services.message_router import message_router
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +26,23 @@ class AIAssistant:
 
         # AI model preference
         self.ai_model = Config.AI_MODEL
+
+        # Admission control: bounded in-flight calls per provider and a per-user token bucket
+        self.admission = AdmissionController(
+            provider_limits={
+                "gemini": Config.AI_MAX_CONCURRENT_GEMINI,
+                "deepseek": Config.AI_MAX_CONCURRENT_DEEPSEEK,
+            },
+            user_rate_per_minute=Config.AI_USER_RATE_PER_MINUTE,
+            user_burst=Config.AI_USER_BURST,
+            queue_timeout=Config.AI_QUEUE_TIMEOUT,
+        )
+
+        # Conversation history is trimmed/summarized to a token budget on every request
+        self.context_builder = ContextBuilder(
+            history_token_budget=Config.AI_HISTORY_TOKEN_BUDGET,
+            max_history_messages=Config.AI_HISTORY_MAX_MESSAGES,
+        )
         
         # Personal information about the bot creator
         self.creator_info = {
@@ -87,15 +109,13 @@ Remember: You are here to assist users with mathematics, learning, and productiv
     async def get_ai_response(self, user_message: str, user_id: int, conversation_history: List[Dict] = None) -> str:
         """Get AI response with automatic fallback between Gemini and DeepSeek"""
         try:
-            # Prepare conversation history
-            messages = [{"role": "system", "content": self.system_prompt}]
-
-            # Add conversation history if available
-            if conversation_history:
-                messages.extend(conversation_history[-10:])  # Keep last 10 messages for context
+            # Shed requests from users who exceed their rate before touching any provider
+            if not self.admission.allow_user(user_id):
+                logger.info(f"AI rate limit reached for user {user_id}, using fallback response")
+                return self.get_fallback_response(user_message)
 
-            # Add current user message
-            messages.append({"role": "user", "content": user_message})
+            # System prompt + history fitted to the token budget + current user message
+            messages = self.context_builder.build(self.system_prompt, conversation_history, user_message)
 
             # Try AI with automatic fallback
             ai_response = await self.get_ai_response_with_fallback(messages, user_id)
@@ -154,9 +174,10 @@ Remember: You are here to assist users with mathematics, learning, and productiv
             # Return response without mentioning fallback (cleaner UX)
             return response
 
-        # Both AIs failed
-        return self.get_fallback_response("")
+        # Both AIs failed (or were shed by admission control)
+        return self.get_fallback_response(messages[-1].get('content', '') if messages else "")
 
+    @traced("ai.deepseek")
     async def call_deepseek_api(self, messages: List[Dict], user_id: int) -> Optional[str]:
         """Call DeepSeek API"""
         if not self.deepseek_api_key:
@@ -176,7 +197,9 @@ Remember: You are here to assist users with mathematics, learning, and productiv
                 'max_tokens': 1000
             }
 
-            async with aiohttp.ClientSession() as session:
+            # Timed once a provider slot is held, so admission queueing is not counted as API latency
+            async with self.admission.provider_slot("deepseek"), aiohttp.ClientSession() as session, \
+                    EXTERNAL_CALL_SECONDS.time(service="deepseek", operation="chat_completions"):
                 async with session.post(self.deepseek_api_url, headers=headers, json=data, timeout=30) as response:
                     if response.status == 200:
                         result = await response.json()
@@ -186,13 +209,19 @@ Remember: You are here to assist users with mathematics, learning, and productiv
                             return response_text
                     else:
                         error_text = await response.text()
+                        EXTERNAL_CALL_ERRORS.inc(service="deepseek", operation="chat_completions")
                         logger.error(f"DeepSeek API error {response.status}: {error_text}")
                         return None
 
+        except AdmissionRejected as e:
+            logger.warning(f"DeepSeek request shed for user {user_id}: {e.reason}")
+            return None
         except asyncio.TimeoutError:
+            EXTERNAL_CALL_ERRORS.inc(service="deepseek", operation="chat_completions")
             logger.error("DeepSeek API timeout after 30 seconds")
             return None
         except Exception as e:
+            EXTERNAL_CALL_ERRORS.inc(service="deepseek", operation="chat_completions")
             logger.error(f"DeepSeek API exception: {type(e).__name__}: {str(e)}")
             return None
 
@@ -308,47 +337,22 @@ Remember: You are here to assist users with mathematics, learning, and productiv
     
     def is_ai_conversation(self, message: str) -> bool:
         """Determine if message should be handled by AI"""
-        # Don't handle if it's a clear math expression or function
-        if self.is_math_expression(message) or self.is_function_expression(message) or self.is_alarm_time(message):
-            return False
-        
-        # Handle if it's a question or general conversation
-        conversation_indicators = [
-            '?', 'what', 'how', 'why', 'when', 'where', 'who', 'can you', 'help', 'tell me',
-            'explain', 'hello', 'hi', 'hey', 'thanks', 'thank you', 'please', 'sorry'
-        ]
-        
-        message_lower = message.lower()
-        return any(indicator in message_lower for indicator in conversation_indicators) or len(message.split()) > 3
+        # Same classification the message handler uses - math, functions and times are not AI
+        return message_router.is_conversation(message)
     
     def is_math_expression(self, text: str) -> bool:
         """Check if text looks like a math expression"""
-        import re
-        math_patterns = [
-            r'[\+\-\*/\^]',  # Basic operators
-            r'(sin|cos|tan|log|ln|sqrt|exp|abs)',  # Functions
-            r'\d+\.\d+',  # Decimals
-            r'\(\d+\)',  # Numbers in parentheses
-        ]
-        return any(re.search(pattern, text.lower()) for pattern in math_patterns)
+        return message_router.is_math_expression(text)
     
     def is_function_expression(self, text: str) -> bool:
         """Check if text looks like a function definition"""
-        import re
-        function_patterns = [
-            r'f\(x\)\s*=',
-            r'y\s*=',
-            r'x\^?\d+',  # x with power
-            r'x[\+\-\*/]',  # x with operators
-        ]
-        return any(re.search(pattern, text.lower()) for pattern in function_patterns)
+        return message_router.is_function_expression(text)
     
     def is_alarm_time(self, text: str) -> bool:
         """Check if text looks like a time format"""
-        import re
-        time_pattern = r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$'
-        return bool(re.match(time_pattern, text.strip()))
+        return message_router.is_alarm_time(text)
 
+    @traced("ai.gemini")
     async def call_gemini_api(self, messages: List[Dict], user_id: int) -> Optional[str]:
         """Call Google Gemini API"""
         if not self.gemini_api_key:
@@ -356,8 +360,8 @@ Remember: You are here to assist users with mathematics, learning, and productiv
             return None
 
         try:
-            # Convert messages to Gemini format
-            prompt = self._convert_messages_to_gemini_prompt(messages)
+            # Convert messages to Gemini's native system instruction + multi-turn contents
+            system_instruction, contents = self._convert_messages_to_gemini_contents(messages)
 
             headers = {
                 'Content-Type': 'application/json',
@@ -367,15 +371,7 @@ Remember: You are here to assist users with mathematics, learning, and productiv
             url = f"{self.gemini_api_url}?key={self.gemini_api_key}"
 
             data = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
+                "contents": contents,
                 "generationConfig": {
                     "temperature": 0.7,
                     "topK": 40,
@@ -384,7 +380,12 @@ Remember: You are here to assist users with mathematics, learning, and productiv
                 }
             }
 
-            async with aiohttp.ClientSession() as session:
+            if system_instruction:
+                data["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+
+            # Timed once a provider slot is held, so admission queueing is not counted as API latency
+            async with self.admission.provider_slot("gemini"), aiohttp.ClientSession() as session, \
+                    EXTERNAL_CALL_SECONDS.time(service="gemini", operation="generate_content"):
                 async with session.post(url, headers=headers, json=data, timeout=30) as response:
                     if response.status == 200:
                         result = await response.json()
@@ -403,32 +404,51 @@ Remember: You are here to assist users with mathematics, learning, and productiv
                         return None
                     else:
                         error_text = await response.text()
+                        EXTERNAL_CALL_ERRORS.inc(service="gemini", operation="generate_content")
                         logger.error(f"Gemini API error {response.status}: {error_text}")
                         return None
 
+        except AdmissionRejected as e:
+            logger.warning(f"Gemini request shed for user {user_id}: {e.reason}")
+            return None
         except asyncio.TimeoutError:
+            EXTERNAL_CALL_ERRORS.inc(service="gemini", operation="generate_content")
             logger.error("Gemini API timeout after 30 seconds")
             return None
         except Exception as e:
+            EXTERNAL_CALL_ERRORS.inc(service="gemini", operation="generate_content")
             logger.error(f"Gemini API exception: {type(e).__name__}: {str(e)}")
             return None
 
-    def _convert_messages_to_gemini_prompt(self, messages: List[Dict]) -> str:
-        """Convert OpenAI-style messages to Gemini prompt format"""
-        prompt_parts = []
+    def _convert_messages_to_gemini_contents(self, messages: List[Dict]) -> Tuple[str, List[Dict]]:
+        """Convert OpenAI-style messages to Gemini (systemInstruction, contents)"""
+        system_parts = []
+        contents = []
 
         for message in messages:
             role = message.get('role', '')
             content = message.get('content', '')
 
+            if not content:
+                continue
+
             if role == 'system':
-                prompt_parts.append(f"System: {content}")
-            elif role == 'user':
-                prompt_parts.append(f"User: {content}")
-            elif role == 'assistant':
-                prompt_parts.append(f"Assistant: {content}")
+                system_parts.append(content)
+                continue
+
+            gemini_role = 'model' if role == 'assistant' else 'user'
+
+            # Gemini expects alternating turns - merge consecutive messages from the same side
+            if contents and contents[-1]['role'] == gemini_role:
+                contents[-1]['parts'].append({"text": content})
+            else:
+                contents.append({"role": gemini_role, "parts": [{"text": content}]})
+
+        # The conversation must open with a user turn
+        while contents and contents[0]['role'] == 'model':
+            contents.pop(0)
 
-        return "\n\n".join(prompt_parts)
+        return "\n\n".join(system_parts), contents
 
     async def clear_conversation_history(self, user_id: int) -> bool:
         """Clear user's conversation history"""
@@ -447,3 +467,20 @@ Remember: You are here to assist users with mathematics, learning, and productiv
 
 # Global AI assistant instance
 ai_assistant = AIAssistant()
+
+
+def _collect_ai_metrics():
+    """AI admission queue depths and shed requests for /metrics"""
+    stats = ai_assistant.admission.get_stats()
+    return [
+        ("mathbot_ai_requests_waiting", "gauge", "AI requests waiting for a provider slot",
+         [({"provider": provider}, count) for provider, count in stats['waiting'].items()]),
+        ("mathbot_ai_requests_in_flight", "gauge", "AI requests holding a provider slot",
+         [({"provider": provider}, count) for provider, count in stats['in_flight'].items()]),
+        ("mathbot_ai_provider_slots", "gauge", "Concurrent requests allowed per AI provider",
+         [({"provider": provider}, limit) for provider, limit in stats['limits'].items()]),
+        ("mathbot_ai_requests_shed_total", "counter", "AI requests rejected by admission control",
+         [({"reason": reason}, count) for reason, count in stats['shed'].items()]),
+    ]
+
+metrics.register_collector(_collect_ai_metrics)
@@ -0,0 +1,268 @@
+"""
+Alarm dispatch leadership
+With several uvicorn workers (or replicas) every process would schedule every alarm
+from the database and users would get each one N times. Instead alarm dispatch is
+owned through leases: the users are split into Config.ALARM_SHARDS shards by a hash
+of user_id, and only the holder of a shard's lease schedules its alarms. With one
+shard (the default) that is plain leader election.
+
+Leases are MongoDB documents in Config.LEASE_COLLECTION:
+
+    {_id: "alarm_shard:<n>", holder, expires_at}   - a shard, held by one process
+    {_id: "instance:<id>",   holder, expires_at}   - a live process (membership)
+
+Each process renews its leases every ALARM_LEASE_HEARTBEAT seconds. A process that
+stops renewing (crash, redeploy, network partition) loses its shards once their
+lease expires after ALARM_LEASE_TTL, and the others take them over on their next
+heartbeat. Shards are spread evenly: a process holds at most ceil(shards / live
+processes) of them and releases the surplus when another process joins.
+"""
+
+import asyncio
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Set
+
+from config import Config
+from app.core.metrics import metrics
+
+SHARD_LEASE_PREFIX = "alarm_shard:"
+INSTANCE_LEASE_PREFIX = "instance:"
+
+ALARM_SHARDS_OWNED = metrics.gauge("mathbot_alarm_shards_owned", "Alarm shards whose alarms this process dispatches")
+ALARM_LEASE_CHANGES = metrics.counter(
+    "mathbot_alarm_lease_changes_total", "Alarm shard leases acquired, lost or released by this process", ["change"]
+)
+
+
+def shard_of(user_id: int, shards: int) -> int:
+    """Shard of a user - stable across processes, unlike hash() of a str"""
+    if shards <= 1:
+        return 0
+    return zlib.crc32(str(user_id).encode()) % shards
+
+
+def new_instance_id() -> str:
+    """host:pid:random - unique per process, readable in the lease collection"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaseStore(ABC):
+    """Named leases with a holder and an expiry; acquire() also renews a lease the caller holds"""
+
+    @abstractmethod
+    def acquire(self, lease_id: str, holder: str, ttl: float) -> bool:
+        """True if holder now holds the lease for ttl seconds"""
+
+    @abstractmethod
+    def release(self, lease_id: str, holder: str):
+        """Give the lease up, if holder still holds it"""
+
+    @abstractmethod
+    def holders(self, prefix: str) -> Dict[str, str]:
+        """lease_id -> holder of the unexpired leases starting with prefix"""
+
+
+class MemoryLeaseStore(LeaseStore):
+    """Leases of a single process (tests and single-instance runs)"""
+
+    def __init__(self):
+        self._leases = {}  # lease_id -> (holder, expires_at monotonic)
+        self._lock = threading.Lock()
+
+    def acquire(self, lease_id, holder, ttl):
+        now = time.monotonic()
+        with self._lock:
+            current = self._leases.get(lease_id)
+            if current and current[0] != holder and current[1] > now:
+                return False
+            self._leases[lease_id] = (holder, now + ttl)
+            return True
+
+    def release(self, lease_id, holder):
+        with self._lock:
+            current = self._leases.get(lease_id)
+            if current and current[0] == holder:
+                del self._leases[lease_id]
+
+    def holders(self, prefix):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                lease_id: holder for lease_id, (holder, expires_at) in self._leases.items()
+                if lease_id.startswith(prefix) and expires_at > now
+            }
+
+
+class MongoLeaseStore(LeaseStore):
+    """Leases shared by every process using the database (see module docstring)"""
+
+    def __init__(self, collection_name: str = None):
+        self.collection_name = collection_name or Config.LEASE_COLLECTION
+        self._collection = None
+
+    @property
+    def collection(self):
+        """The lease collection, set up on first use"""
+        if self._collection is None:
+            from app.models.database import db_manager
+
+            collection = db_manager.db[self.collection_name]
+            # Not relied on for correctness (expires_at is checked on every acquire) - only cleans up
+            collection.create_index("expires_at", expireAfterSeconds=3600)
+            self._collection = collection
+        return self._collection
+
+    def _now(self) -> datetime:
+        # PyMongo returns naive UTC datetimes; store them the same way
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def acquire(self, lease_id, holder, ttl):
+        from pymongo.errors import DuplicateKeyError
+
+        now = self._now()
+        try:
+            # Matches a lease we hold or one that expired; upserts a missing one. If another holder
+            # has it the filter misses and the upsert collides with the existing _id.
+            self.collection.update_one(
+                {"_id": lease_id, "$or": [{"holder": holder}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"holder": holder, "expires_at": now + timedelta(seconds=ttl), "renewed_at": now}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def release(self, lease_id, holder):
+        self.collection.delete_one({"_id": lease_id, "holder": holder})
+
+    def holders(self, prefix):
+        documents = self.collection.find(
+            {"_id": {"$regex": f"^{prefix}"}, "expires_at": {"$gt": self._now()}}, {"holder": 1}
+        )
+        return {doc["_id"]: doc["holder"] for doc in documents}
+
+
+class AlarmLeadership:
+    """Keeps this process's alarm shard leases and tells the alarm manager which shards it owns"""
+
+    def __init__(self, alarm_manager, store: LeaseStore = None, shards: int = None, ttl: float = None,
+                 heartbeat: float = None, resync_interval: float = None, instance_id: str = None):
+        self.alarm_manager = alarm_manager
+        self.store = store or MongoLeaseStore()
+        self.shards = shards or Config.ALARM_SHARDS
+        self.ttl = ttl or Config.ALARM_LEASE_TTL
+        self.heartbeat_interval = heartbeat or Config.ALARM_LEASE_HEARTBEAT
+        self.resync_interval = resync_interval or Config.ALARM_RESYNC_INTERVAL
+        self.instance_id = instance_id or new_instance_id()
+
+        self.owned: Set[int] = set()
+        self.renewed_at: Optional[float] = None  # monotonic time of the last successful renewal
+        self.synced_at = 0.0
+        self._task = None
+
+        # Nothing is dispatched until a lease says so
+        alarm_manager.shards = self.shards
+        alarm_manager.owned_shards = set()
+
+    def _lease_id(self, shard: int) -> str:
+        return f"{SHARD_LEASE_PREFIX}{shard}"
+
+    def renew(self) -> Set[int]:
+        """One heartbeat against the lease store (blocking): the shards held afterwards"""
+        self.store.acquire(f"{INSTANCE_LEASE_PREFIX}{self.instance_id}", self.instance_id, self.ttl)
+        live_instances = max(len(self.store.holders(INSTANCE_LEASE_PREFIX)), 1)
+        target = math.ceil(self.shards / live_instances)
+
+        owned = {shard for shard in self.owned if self.store.acquire(self._lease_id(shard), self.instance_id, self.ttl)}
+        for shard in sorted(self.owned - owned):
+            print(f"⚠️ Lost alarm shard {shard} to another instance")
+            ALARM_LEASE_CHANGES.inc(change="lost")
+
+        # Hand over the surplus when more instances are running (highest shards first)
+        while len(owned) > target:
+            shard = max(owned)
+            self.store.release(self._lease_id(shard), self.instance_id)
+            owned.discard(shard)
+            ALARM_LEASE_CHANGES.inc(change="released")
+
+        if len(owned) < target:
+            held = self.store.holders(SHARD_LEASE_PREFIX)
+            for shard in range(self.shards):
+                if len(owned) >= target:
+                    break
+                if shard in owned or self._lease_id(shard) in held:
+                    continue
+                if self.store.acquire(self._lease_id(shard), self.instance_id, self.ttl):
+                    owned.add(shard)
+                    ALARM_LEASE_CHANGES.inc(change="acquired")
+        return owned
+
+    def heartbeat(self):
+        """Renew the leases and bring the alarm manager in line with them (blocking)"""
+        now = time.monotonic()
+        try:
+            owned = self.renew()
+            self.renewed_at = now
+        except Exception as e:
+            print(f"⚠️ Could not renew alarm leases: {e}")
+            if self.renewed_at is None or now - self.renewed_at < self.ttl:
+                return
+            # Our leases may have expired and been taken over - stop dispatching
+            owned = set()
+
+        changed = owned != self.owned
+        if changed:
+            print(f"Alarm shards owned by {self.instance_id}: {sorted(owned) or 'none'}")
+        self.owned = owned
+        ALARM_SHARDS_OWNED.set(len(owned))
+        if changed or now - self.synced_at >= self.resync_interval:
+            # Also picks up alarms added or removed through other workers
+            self.alarm_manager.set_owned_shards(owned)
+            self.synced_at = now
+
+    async def _run(self):
+        while True:
+            await asyncio.to_thread(self.heartbeat)
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def start(self):
+        """First heartbeat, then keep renewing in the background"""
+        await asyncio.to_thread(self.heartbeat)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop renewing and release the leases so another instance takes over right away"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await asyncio.to_thread(self.release_all)
+        except Exception as e:
+            print(f"⚠️ Could not release alarm leases: {e}")
+
+    def release_all(self):
+        for shard in self.owned:
+            self.store.release(self._lease_id(shard), self.instance_id)
+            ALARM_LEASE_CHANGES.inc(change="released")
+        self.store.release(f"{INSTANCE_LEASE_PREFIX}{self.instance_id}", self.instance_id)
+        self.owned = set()
+        ALARM_SHARDS_OWNED.set(0)
+
+    def status(self) -> Dict:
+        return {
+            "instance": self.instance_id,
+            "shards": self.shards,
+            "owned_shards": sorted(self.owned),
+            "leader": bool(self.owned),
+        }
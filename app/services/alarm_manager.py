@@ -1,20 +1,43 @@
 import asyncio
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 import pytz
-from typing import Dict, List
+from typing import Dict, List, Set
 from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
 
 from config import Config
+from app.core.telegram_request import InstrumentedRequest
 from app.models.database import db_manager
+from app.services.state_store import state_store, VersionConflict
+from app.services.alarm_leadership import shard_of
+
+# Pending alarms outlive their response timeout by this much, so a restarted
+# instance can still run the timeout it missed
+PENDING_ALARM_TTL_MARGIN = 3600
+# Dispatch claims (one per alarm and day) are kept this long
+SENT_ALARM_TTL = 2 * 86400
 
 class AlarmManager:
     def __init__(self, bot_token: str):
-        self.bot = Bot(token=bot_token)
+        self.bot = Bot(
+            token=bot_token,
+            base_url=f"{Config.TELEGRAM_API_BASE_URL}/bot",
+            base_file_url=f"{Config.TELEGRAM_API_BASE_URL}/file/bot",
+            request=InstrumentedRequest()
+        )
         self.scheduler = AsyncIOScheduler(timezone=pytz.timezone(Config.TIMEZONE))
         self.timezone = pytz.timezone(Config.TIMEZONE)
-        self.pending_alarms = {}  # Track alarms waiting for response
+        # Alarms waiting for a response, shared by all replicas (see state_store)
+        self.pending_alarms = state_store.namespace(
+            'pending_alarm', ttl=Config.ALARM_RESPONSE_TIMEOUT + PENDING_ALARM_TTL_MARGIN
+        )
+        # One dispatch per alarm and day, whichever instance holds the user's shard at the time
+        self.sent_alarms = state_store.namespace('alarm_sent', ttl=SENT_ALARM_TTL)
+        # Shards of users whose alarms this process dispatches - all of them unless
+        # AlarmLeadership assigns some (several workers or replicas)
+        self.shards = Config.ALARM_SHARDS
+        self.owned_shards = set(range(self.shards))
         
     def start_scheduler(self):
         """Start the alarm scheduler"""
@@ -25,6 +48,19 @@ class AlarmManager:
         """Stop the alarm scheduler"""
         self.scheduler.shutdown()
         print("Alarm scheduler stopped")
+
+    def owns(self, user_id: int) -> bool:
+        """Whether this process dispatches the user's alarms"""
+        return shard_of(user_id, self.shards) in self.owned_shards
+
+    def set_owned_shards(self, shards: Set[int]):
+        """Dispatch the alarms of these shards from now on (AlarmLeadership calls this on every change and resync)"""
+        gained = set(shards) - self.owned_shards
+        self.owned_shards = set(shards)
+        self.schedule_all_user_alarms()
+        if gained:
+            self.restore_pending_alarms()
+            self._catch_up_alarms(gained)
     
     def schedule_user_alarms(self, user_id: int):
         """Schedule all alarms for a specific user"""
@@ -35,6 +71,8 @@ class AlarmManager:
     
     def schedule_alarm(self, user_id: int, alarm_time: str):
         """Schedule a single alarm"""
+        if not self.owns(user_id):
+            return False  # the instance holding the user's shard picks it up on its next resync
         try:
             # Parse time (format: HH:MM)
             hour, minute = map(int, alarm_time.split(':'))
@@ -75,9 +113,13 @@ class AlarmManager:
             print(f"Error removing scheduled alarm: {e}")
             return False
     
-    async def send_alarm_notification(self, user_id: int, alarm_time: str):
+    async def send_alarm_notification(self, user_id: int, alarm_time: str, due_date: str = None):
         """Send alarm notification to user"""
         try:
+            # The instance that held the shard before a lease handover may have sent it already
+            if not self._claim_dispatch(user_id, alarm_time, due_date or datetime.now(self.timezone).strftime('%Y-%m-%d')):
+                return
+
             # Get user and find the alarm name
             user = db_manager.get_user(user_id)
             current_streak = user.get('streak', 0) if user else 0
@@ -117,24 +159,16 @@ class AlarmManager:
             
             # Track this alarm for timeout handling
             alarm_key = f"{user_id}_{alarm_time}_{sent_message.message_id}"
-            self.pending_alarms[alarm_key] = {
+            sent_at = datetime.now(self.timezone)
+            self.pending_alarms.put(alarm_key, {
                 'user_id': user_id,
                 'alarm_time': alarm_time,
                 'message_id': sent_message.message_id,
-                'timestamp': datetime.now(self.timezone)
-            }
+                'timestamp': sent_at
+            })
             
             # Schedule timeout check (1 hour from now)
-            from datetime import timedelta
-            timeout_time = datetime.now(self.timezone) + timedelta(seconds=Config.ALARM_RESPONSE_TIMEOUT)
-
-            self.scheduler.add_job(
-                self.handle_alarm_timeout,
-                'date',
-                run_date=timeout_time,
-                args=[alarm_key],
-                id=f"timeout_{alarm_key}"
-            )
+            self._schedule_timeout(alarm_key, sent_at)
             
         except Exception as e:
             print(f"Error sending alarm notification: {e}")
@@ -147,17 +181,9 @@ class AlarmManager:
             user_id = int(parts[2])
             alarm_time = parts[3]
             
-            # Find and remove pending alarm
-            alarm_key = None
-            for key, alarm_info in self.pending_alarms.items():
-                if (alarm_info['user_id'] == user_id and 
-                    alarm_info['alarm_time'] == alarm_time and 
-                    alarm_info['message_id'] == message_id):
-                    alarm_key = key
-                    break
-            
-            if alarm_key:
-                del self.pending_alarms[alarm_key]
+            # Claim the pending alarm - the timeout (on any replica) finds it gone
+            alarm_key = f"{user_id}_{alarm_time}_{message_id}"
+            if self.pending_alarms.take(alarm_key) is not None:
                 # Remove timeout job
                 timeout_job_id = f"timeout_{alarm_key}"
                 if self.scheduler.get_job(timeout_job_id):
@@ -196,8 +222,9 @@ class AlarmManager:
     async def handle_alarm_timeout(self, alarm_key: str):
         """Handle alarm timeout (no response within time limit)"""
         try:
-            if alarm_key in self.pending_alarms:
-                alarm_info = self.pending_alarms[alarm_key]
+            # Claim the pending alarm - None if the user answered (possibly on another replica)
+            alarm_info = self.pending_alarms.take(alarm_key)
+            if alarm_info is not None:
                 user_id = alarm_info['user_id']
                 
                 # Reset streak to 0
@@ -210,23 +237,93 @@ class AlarmManager:
                     parse_mode='Markdown'
                 )
                 
-                # Remove from pending alarms
-                del self.pending_alarms[alarm_key]
-                
         except Exception as e:
             print(f"Error handling alarm timeout: {e}")
     
+    def _claim_dispatch(self, user_id: int, alarm_time: str, due_date: str) -> bool:
+        """Record that the alarm due on due_date is being sent - False if some instance already did"""
+        try:
+            self.sent_alarms.put(f"{user_id}_{alarm_time}_{due_date}", True, expected_version=0)
+            return True
+        except VersionConflict:
+            return False
+
+    def _catch_up_alarms(self, shards: Set[int]):
+        """Send alarms of newly owned shards that came due while no instance held them (lease handover)"""
+        now = datetime.now(self.timezone)
+        window = timedelta(seconds=Config.ALARM_LEASE_TTL + Config.ALARM_LEASE_HEARTBEAT)
+        for user in db_manager.get_all_users_with_alarms():
+            user_id = user['user_id']
+            if shard_of(user_id, self.shards) not in shards:
+                continue
+            for alarm in user.get('alarms', []):
+                hour, minute = map(int, alarm['time'].split(':'))
+                due = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+                if due > now:
+                    due -= timedelta(days=1)
+                if now - due <= window:
+                    self.scheduler.add_job(
+                        self.send_alarm_notification,
+                        'date',
+                        run_date=now,
+                        args=[user_id, alarm['time'], due.strftime('%Y-%m-%d')],
+                        id=f"catchup_{user_id}_{alarm['time'].replace(':', '')}",
+                        replace_existing=True
+                    )
+
+    def _schedule_timeout(self, alarm_key: str, sent_at: datetime):
+        """Run handle_alarm_timeout ALARM_RESPONSE_TIMEOUT after the alarm was sent (at once if that passed)"""
+        if sent_at.tzinfo is None:
+            sent_at = pytz.utc.localize(sent_at)  # read back from MongoDB as naive UTC
+        run_date = max(sent_at + timedelta(seconds=Config.ALARM_RESPONSE_TIMEOUT), datetime.now(self.timezone))
+        self.scheduler.add_job(
+            self.handle_alarm_timeout,
+            'date',
+            run_date=run_date,
+            args=[alarm_key],
+            id=f"timeout_{alarm_key}",
+            replace_existing=True
+        )
+
+    def restore_pending_alarms(self):
+        """Schedule the timeouts of alarms still waiting for a response (sent before a restart)"""
+        try:
+            pending = {
+                alarm_key: entry for alarm_key, entry in self.pending_alarms.items().items()
+                if self.owns(entry.value['user_id'])
+            }
+            for alarm_key, entry in pending.items():
+                self._schedule_timeout(alarm_key, entry.value['timestamp'])
+            if pending:
+                print(f"Restored {len(pending)} pending alarm timeouts")
+        except Exception as e:
+            print(f"Error restoring pending alarms: {e}")
+
     def schedule_all_user_alarms(self):
-        """Schedule alarms for all users with alarms"""
+        """Schedule alarms for all users with alarms in the owned shards, dropping jobs of alarms gone or not owned"""
         try:
-            users_with_alarms = db_manager.get_all_users_with_alarms()
+            users_with_alarms = [
+                user for user in db_manager.get_all_users_with_alarms() if self.owns(user['user_id'])
+            ]
             
+            wanted = set()
+            added = 0
             for user in users_with_alarms:
                 user_id = user['user_id']
                 for alarm in user.get('alarms', []):
-                    self.schedule_alarm(user_id, alarm['time'])
-                    
-            print(f"Scheduled alarms for {len(users_with_alarms)} users")
+                    job_id = f"alarm_{user_id}_{alarm['time'].replace(':', '')}"
+                    wanted.add(job_id)
+                    if not self.scheduler.get_job(job_id):
+                        added += self.schedule_alarm(user_id, alarm['time'])
+
+            removed = 0
+            for job in self.scheduler.get_jobs():
+                if job.id.startswith('alarm_') and job.id not in wanted:
+                    job.remove()
+                    removed += 1
+
+            if added or removed:
+                print(f"Scheduled alarms for {len(users_with_alarms)} users ({added} added, {removed} removed)")
             
         except Exception as e:
             print(f"Error scheduling all user alarms: {e}")
@@ -0,0 +1,100 @@
+"""
+Token-budgeted conversation context for AI requests
+Keeps the newest turns verbatim and folds older turns into a short local summary
+"""
+
+import re
+from typing import List, Dict, Tuple
+
+# Rough token estimate without a tokenizer: ~4 characters per token for English,
+# but never fewer tokens than words (short words and emojis tokenize poorly)
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4  # role markers and separators per message
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a piece of text"""
+    if not text:
+        return 0
+    by_chars = (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    by_words = len(_WORD_RE.findall(text))
+    return max(by_chars, by_words)
+
+
+def estimate_message_tokens(message: Dict) -> int:
+    """Estimate the token count of a single chat message"""
+    return estimate_tokens(message.get('content', '')) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextBuilder:
+    """Build the message list sent to the AI providers within a token budget"""
+
+    def __init__(self, history_token_budget: int, max_history_messages: int = 20,
+                 summary_snippet_chars: int = 80, max_summary_items: int = 6):
+        self.history_token_budget = history_token_budget
+        self.max_history_messages = max_history_messages
+        self.summary_snippet_chars = summary_snippet_chars
+        self.max_summary_items = max_summary_items
+
+    def build(self, system_prompt: str, history: List[Dict], user_message: str) -> List[Dict]:
+        """
+        Build OpenAI-style messages: system prompt, fitted history, current user message
+
+        Args:
+            system_prompt: Instructions sent with every request
+            history: Previous messages, oldest first
+            user_message: The message being answered
+
+        Returns:
+            List of {"role", "content"} messages
+        """
+        recent, older = self.fit_history(history or [])
+
+        messages = [{"role": "system", "content": system_prompt}]
+
+        summary = self.summarize(older)
+        if summary:
+            messages.append({"role": "system", "content": summary})
+
+        messages.extend(recent)
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def fit_history(self, history: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """Split history into (recent messages that fit the budget, older messages)"""
+        non_empty = [m for m in history if m.get('content')]
+        candidates = non_empty[-self.max_history_messages:]
+        dropped = non_empty[:len(non_empty) - len(candidates)]
+
+        used = 0
+        start = len(candidates)
+        for index in range(len(candidates) - 1, -1, -1):
+            cost = estimate_message_tokens(candidates[index])
+            if used + cost > self.history_token_budget:
+                break
+            used += cost
+            start = index
+
+        # Never start the kept window with an assistant reply (orphaned answer)
+        while start < len(candidates) and candidates[start].get('role') == 'assistant':
+            start += 1
+
+        return candidates[start:], dropped + candidates[:start]
+
+    def summarize(self, older: List[Dict]) -> str:
+        """Fold older turns into one short line per earlier user question"""
+        questions = [m['content'] for m in older if m.get('role') == 'user']
+        if not questions:
+            return ""
+
+        questions = questions[-self.max_summary_items:]
+        snippets = []
+        for question in questions:
+            snippet = ' '.join(question.split())
+            if len(snippet) > self.summary_snippet_chars:
+                snippet = snippet[:self.summary_snippet_chars - 1].rstrip() + "…"
+            snippets.append(f"- {snippet}")
+
+        return "Earlier in this conversation the user asked about:\n" + "\n".join(snippets)
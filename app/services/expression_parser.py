@@ -0,0 +1,211 @@
+"""
+Shared math expression normalizer and parser
+One linear tokenizer pass handles unicode symbols, powers, factorials,
+implicit multiplication and f(x)= headers; the resulting tokens go straight
+into SymPy's parser transformations, skipping SymPy's own string tokenizing.
+Used by both MathSolver and FunctionAnalyzer so they parse input identically.
+"""
+
+import builtins
+import re
+import types
+from tokenize import NUMBER, NAME, OP, ERRORTOKEN, ENDMARKER
+from typing import Dict, List, Tuple
+
+import sympy as sp
+from sympy.parsing.sympy_parser import (
+    auto_symbol, auto_number, factorial_notation, untokenize, eval_expr, null
+)
+
+Token = Tuple[int, str]
+
+CONSTANTS = {
+    'pi': sp.pi,
+    'e': sp.E,
+    'inf': sp.oo,
+    'infinity': sp.oo,
+}
+
+FUNCTIONS = {
+    'sin': sp.sin,
+    'cos': sp.cos,
+    'tan': sp.tan,
+    'asin': sp.asin,
+    'acos': sp.acos,
+    'atan': sp.atan,
+    'sinh': sp.sinh,
+    'cosh': sp.cosh,
+    'tanh': sp.tanh,
+    'log': sp.log,
+    'ln': sp.log,
+    'log10': lambda x: sp.log(x, 10),
+    'sqrt': sp.sqrt,
+    'abs': sp.Abs,
+    'exp': sp.exp,
+    'factorial': sp.factorial,
+    'floor': sp.floor,
+    'ceil': sp.ceiling,
+}
+
+# Symbols replaced before tokenizing (single characters only)
+UNICODE_OPERATORS = str.maketrans({
+    '×': '*', '·': '*', '∙': '*', '⋅': '*',
+    '÷': '/', '∕': '/',
+    '−': '-', '–': '-', '—': '-',
+})
+
+UNICODE_NAMES = {
+    'π': 'pi',
+    '∞': 'inf',
+    '√': 'sqrt',
+}
+
+SUPERSCRIPTS = {
+    '⁰': '0', '¹': '1', '²': '2', '³': '3', '⁴': '4',
+    '⁵': '5', '⁶': '6', '⁷': '7', '⁸': '8', '⁹': '9', '⁻': '-',
+}
+
+FUNCTION_HEADER = re.compile(r'\s*(?:[fgh]\s*\(\s*x\s*\)|y)\s*=\s*', re.IGNORECASE)
+
+TOKEN_PATTERN = re.compile(
+    r'(?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)'  # 1e5 is a number, not 1*e^5
+    r'|(?P<name>[A-Za-z_][A-Za-z_0-9]*|[π∞√])'
+    r'|(?P<superscript>[' + ''.join(SUPERSCRIPTS) + r']+)'
+    r'|(?P<power>\*\*|\^)'
+    r'|(?P<op>.)'
+)
+
+# Single letter followed by digits, e.g. x2 -> x**2 (a missed '^')
+LETTER_POWER = re.compile(r'([A-Za-z])(\d+)')
+
+# auto_symbol turns unknown names into Symbols, auto_number makes exact Integers/Rationals
+TRANSFORMATIONS = (auto_symbol, auto_number, factorial_notation)
+
+
+def _build_global_dict() -> Dict:
+    """Namespace SymPy's parse_expr evaluates in (built once instead of per call)"""
+    global_dict = {}
+    exec('from sympy import *', global_dict)
+    for name, obj in vars(builtins).items():
+        if isinstance(obj, types.BuiltinFunctionType):
+            global_dict[name] = obj
+    global_dict['max'] = sp.Max
+    global_dict['min'] = sp.Min
+    return global_dict
+
+
+class ExpressionParser:
+    def __init__(self, constants: Dict = None, functions: Dict = None):
+        self.constants = constants if constants is not None else CONSTANTS
+        self.functions = functions if functions is not None else FUNCTIONS
+        self.local_dict = {**self.constants, **self.functions}
+        self.global_dict = _build_global_dict()
+
+    def strip_function_header(self, text: str) -> str:
+        """'f(x) = x^2' -> 'x^2' (also y =, g(x) =, h(x) =)"""
+        match = FUNCTION_HEADER.match(text)
+        return text[match.end():] if match else text
+
+    def tokenize(self, text: str, function_header: bool = False, letter_powers: bool = True) -> List[Token]:
+        """
+        Normalize an expression into Python tokens in one pass
+
+        Whitespace is ignored, '^' and superscripts become '**', '!' is kept for
+        SymPy's factorial transformation and '*' is inserted for implicit
+        multiplication: 2x, 2(x+1), (x+1)(x-1), (x+1)2, x(x+1), 2sin(x).
+        letter_powers=False keeps x2 a name (subscripted unknowns in systems).
+        """
+        if function_header:
+            text = self.strip_function_header(text)
+        text = ''.join(text.split()).translate(UNICODE_OPERATORS)
+
+        tokens: List[Token] = []
+        wrap_next = False  # '√9' -> sqrt(9)
+        for match in TOKEN_PATTERN.finditer(text):
+            kind = match.lastgroup
+            value = match.group()
+
+            if kind == 'power':
+                tokens.append((OP, '**'))
+                continue
+            if kind == 'superscript':
+                exponent = ''.join(SUPERSCRIPTS[char] for char in value)
+                if exponent.isdigit():
+                    tokens.extend([(OP, '**'), (NUMBER, exponent)])
+                else:
+                    tokens.extend([(OP, '**'), (OP, '('), (OP, exponent[0]), (NUMBER, exponent[1:]), (OP, ')')])
+                continue
+            if kind == 'op':
+                if value == '!':
+                    tokens.append((ERRORTOKEN, '!'))
+                    continue
+                if value == '(':
+                    if wrap_next:
+                        wrap_next = False  # '√(x+1)' is already a call
+                    elif self._ends_operand(tokens) and not self._ends_function_name(tokens):
+                        tokens.append((OP, '*'))
+                tokens.append((OP, value))
+                continue
+
+            # number or name: an operand
+            if self._ends_operand(tokens) and not wrap_next:
+                tokens.append((OP, '*'))
+
+            if kind == 'number':
+                operand = [(NUMBER, value)]
+            else:
+                value = UNICODE_NAMES.get(value, value)
+                letter_power = LETTER_POWER.fullmatch(value)
+                if letter_powers and letter_power and value not in self.local_dict:
+                    operand = [(NAME, letter_power.group(1)), (OP, '**'), (NUMBER, letter_power.group(2))]
+                else:
+                    operand = [(NAME, value)]
+
+            if wrap_next:
+                operand = [(OP, '(')] + operand + [(OP, ')')]
+                wrap_next = False
+            tokens.extend(operand)
+
+            if value == 'sqrt' and match.group() == '√':
+                wrap_next = True
+        return tokens
+
+    def _ends_operand(self, tokens: List[Token]) -> bool:
+        """True if the tokens so far end in something a new operand would multiply"""
+        if not tokens:
+            return False
+        toknum, tokval = tokens[-1]
+        return toknum in (NUMBER, NAME) or tokval == ')' or (toknum == ERRORTOKEN and tokval == '!')
+
+    def _ends_function_name(self, tokens: List[Token]) -> bool:
+        toknum, tokval = tokens[-1]
+        return toknum == NAME and (tokval in self.functions or callable(self.global_dict.get(tokval)))
+
+    def normalize(self, text: str, function_header: bool = False, letter_powers: bool = True) -> str:
+        """Normalized expression as a string (for display and string-based callers)"""
+        return untokenize(self.tokenize(text, function_header, letter_powers)).replace(' ', '')
+
+    def parse(self, text: str, function_header: bool = False, letter_powers: bool = True) -> sp.Expr:
+        """Parse user input straight from tokens into a SymPy expression"""
+        tokens = self.tokenize(text, function_header, letter_powers)
+        if not tokens:
+            raise ValueError("Empty expression")
+
+        # factorial_notation closes a pending '!' on the following token
+        tokens.append((ENDMARKER, ''))
+
+        local_dict = dict(self.local_dict)
+        for transform in TRANSFORMATIONS:
+            tokens = transform(tokens, local_dict, self.global_dict)
+        code = untokenize(tokens)
+
+        try:
+            expr = eval_expr(code, local_dict, self.global_dict)
+            local_dict.pop(null, None)
+            return sp.sympify(expr)
+        except (SyntaxError, TypeError, AttributeError, sp.SympifyError) as e:
+            # e.g. 'sin^2(x)' - a function raised to a power before its argument
+            raise ValueError(f"Could not parse expression '{text}'") from e
+
+# Global expression parser instance
+expression_parser = ExpressionParser()
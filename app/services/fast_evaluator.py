@@ -0,0 +1,224 @@
+"""
+Fast numeric evaluator for constant expressions
+Plain arithmetic like 2+3*4 or sqrt(16) does not need SymPy. The normalized
+expression is parsed with Python's ast and evaluated over Fractions (exact) and
+floats (after the first transcendental function), with the same function
+whitelist as MathSolver. Anything it cannot answer exactly like SymPy would -
+symbols, complex or infinite results, huge numbers, near-integer float results
+that may be exact symbolically (sin(pi)) - is handed back for SymPy to solve.
+"""
+
+import ast
+import math
+from fractions import Fraction
+from tokenize import ERRORTOKEN
+from typing import Optional, Set, Tuple, Union
+
+from sympy.parsing.sympy_parser import factorial_notation
+
+from app.services.expression_parser import expression_parser
+
+# int and Fraction are exact, float is not
+Number = Union[int, Fraction, float]
+
+# Exact results at or above this size are left to SymPy (its formatting of big values)
+MAX_EXACT_MAGNITUDE = 10 ** 15
+MAX_EXPONENT = 256
+MAX_EXACT_BITS = 4096  # intermediate exact powers, e.g. (10^256)^256
+MAX_FACTORIAL = 170
+# Relative distance to an integer below which a float result might be exact symbolically
+NEAR_INTEGER_TOLERANCE = 1e-9
+
+
+class FastPathUnavailable(Exception):
+    """The expression needs SymPy"""
+
+
+def _is_exact(value: Number) -> bool:
+    return isinstance(value, (int, Fraction))
+
+
+def _exact(value: Fraction) -> Number:
+    """Integers stay plain ints - much cheaper than Fraction arithmetic"""
+    return value.numerator if value.denominator == 1 else value
+
+
+def _real(value: float) -> float:
+    if isinstance(value, complex) or math.isnan(value) or math.isinf(value):
+        raise FastPathUnavailable("non-finite or complex result")
+    return value
+
+
+def _sqrt(value: Number) -> Number:
+    if value < 0:
+        raise FastPathUnavailable("complex square root")
+    if _is_exact(value):
+        value = Fraction(value)
+        numerator, denominator = math.isqrt(value.numerator), math.isqrt(value.denominator)
+        if numerator * numerator == value.numerator and denominator * denominator == value.denominator:
+            return _exact(Fraction(numerator, denominator))
+    return math.sqrt(value)
+
+
+def _log(value: Number, base: Number = None) -> Number:
+    if value <= 0 or (base is not None and (base <= 0 or base == 1)):
+        raise FastPathUnavailable("logarithm outside its real domain")
+    if value == 1:
+        return 0
+    if base is None:
+        return math.log(value)
+    return math.log(value) / math.log(base)
+
+
+def _factorial(value: Number) -> int:
+    if not isinstance(value, int) or not 0 <= value <= MAX_FACTORIAL:
+        raise FastPathUnavailable("factorial argument")
+    return math.factorial(value)
+
+
+def _float_function(function, exact_at_zero=None):
+    """Wrap a math function; f(0) stays exact where it is a known integer"""
+    def wrapped(value: Number) -> Number:
+        if exact_at_zero is not None and value == 0:
+            return exact_at_zero
+        try:
+            return _real(function(value))
+        except (ValueError, OverflowError):
+            raise FastPathUnavailable(f"{function.__name__} domain")
+    return wrapped
+
+
+# Same names as MathSolver.functions
+FUNCTIONS = {
+    'sin': _float_function(math.sin, 0),
+    'cos': _float_function(math.cos, 1),
+    'tan': _float_function(math.tan, 0),
+    'asin': _float_function(math.asin, 0),
+    'acos': _float_function(math.acos),
+    'atan': _float_function(math.atan, 0),
+    'sinh': _float_function(math.sinh, 0),
+    'cosh': _float_function(math.cosh, 1),
+    'tanh': _float_function(math.tanh, 0),
+    'log': _log,
+    'ln': _log,
+    'log10': lambda value: _log(value, 10),
+    'sqrt': _sqrt,
+    'abs': abs,
+    'exp': _float_function(math.exp, 1),
+    'factorial': _factorial,
+    'floor': math.floor,
+    'ceil': math.ceil,
+}
+
+CONSTANTS = {
+    'pi': math.pi,
+    'e': math.e,
+}
+
+
+class FastEvaluator:
+    def __init__(self, parser=None):
+        self.parser = parser or expression_parser
+
+    def evaluate(self, expression: str) -> Optional[Tuple[Number, str, Set[str]]]:
+        """
+        Evaluate a constant expression without SymPy
+
+        Returns:
+            (value, normalized_expression, functions_used), or None when SymPy is needed
+        """
+        try:
+            tokens = self.parser.tokenize(expression)
+            if any(toknum == ERRORTOKEN for toknum, _ in tokens):
+                tokens = factorial_notation(tokens + [(0, '')], {}, {})
+            # Implicit multiplication is already explicit, so tokens can be joined as-is
+            code = ''.join(tokval for _, tokval in tokens)
+            tree = ast.parse(code, mode='eval')
+
+            used: Set[str] = set()
+            value = self._eval(tree.body, used)
+        except (FastPathUnavailable, SyntaxError, ZeroDivisionError, OverflowError,
+                ValueError, TypeError, RecursionError):
+            return None
+
+        if _is_exact(value):
+            if abs(value) >= MAX_EXACT_MAGNITUDE:
+                return None
+        else:
+            if isinstance(value, complex) or not math.isfinite(value):
+                return None
+            # sin(pi) is 1.2e-16 as a float but exactly 0 for SymPy
+            nearest = round(value)
+            if abs(value - nearest) <= NEAR_INTEGER_TOLERANCE * max(1.0, abs(value)):
+                return None
+
+        return value, code, used
+
+    def _eval(self, node, used: Set[str]) -> Number:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            # Decimal literals are exact like SymPy's parsed numbers
+            return _exact(Fraction(str(node.value))) if isinstance(node.value, float) else node.value
+
+        if isinstance(node, ast.Name):
+            if node.id in CONSTANTS:
+                return CONSTANTS[node.id]
+            raise FastPathUnavailable(f"symbol {node.id}")
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self._eval(node.operand, used)
+            return -operand if isinstance(node.op, ast.USub) else operand
+
+        if isinstance(node, ast.BinOp):
+            left = self._eval(node.left, used)
+            right = self._eval(node.right, used)
+            if isinstance(node.op, ast.Add):
+                return left + right
+            if isinstance(node.op, ast.Sub):
+                return left - right
+            if isinstance(node.op, ast.Mult):
+                return left * right
+            if isinstance(node.op, ast.Div):
+                if right == 0:
+                    raise FastPathUnavailable("division by zero")
+                if _is_exact(left) and _is_exact(right):
+                    return _exact(Fraction(left) / right)
+                return left / right
+            if isinstance(node.op, ast.Pow):
+                return self._power(left, right)
+            raise FastPathUnavailable("operator")
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            function = FUNCTIONS.get(node.func.id)
+            if function is None:
+                raise FastPathUnavailable(f"function {node.func.id}")
+            arguments = [self._eval(argument, used) for argument in node.args]
+            if node.func.id not in ('log', 'ln') and len(arguments) != 1:
+                raise FastPathUnavailable("arity")
+            used.add(node.func.id)
+            return function(*arguments)
+
+        raise FastPathUnavailable(type(node).__name__)
+
+    def _power(self, base: Number, exponent: Number) -> Number:
+        if isinstance(exponent, int):
+            if abs(exponent) > MAX_EXPONENT:
+                raise FastPathUnavailable("exponent too large")
+            if base == 0 and exponent < 0:
+                raise FastPathUnavailable("division by zero")
+            if _is_exact(base):
+                base = Fraction(base)
+                bits = max(base.numerator.bit_length(), base.denominator.bit_length())
+                if bits * abs(exponent) > MAX_EXACT_BITS:
+                    raise FastPathUnavailable("exact power too large")
+                return _exact(base ** exponent)
+            return _real(base ** exponent)
+        if base < 0:
+            raise FastPathUnavailable("complex power")
+        if base == 0:
+            if exponent <= 0:
+                raise FastPathUnavailable("zero to a non-positive power")
+            return 0
+        return _real(math.pow(base, exponent))
+
+# Global fast evaluator instance
+fast_evaluator = FastEvaluator()
@@ -1,49 +1,74 @@
 import sympy as sp
 import numpy as np
-import matplotlib.pyplot as plt
-from typing import Dict, List, Tuple, Optional
+from typing import AsyncIterator, Callable, Dict, List, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
 import io
 import base64
+import threading
+import time
+
+from config import Config
+from app.core.metrics import metrics, observe_latency, ANALYSIS_STEP_SECONDS, MATH_PHASE_SECONDS
+from app.core.tracing import tracer
+from app.services.expression_parser import expression_parser
+from app.services.numeric_solver import call_with_time_budget, SymbolicTimeout
+
+# Analysis as a dependency graph: node -> nodes whose results it takes as keyword arguments.
+# Shared intermediate results are computed once; everything else runs in parallel.
+ANALYSIS_GRAPH = {
+    'derivative': (),
+    'critical_points': ('derivative',),
+    'zeros': (),
+    'step1_definition': (),
+    'step2_domain': (),
+    'step3_derivative': ('derivative',),
+    'step4_limits': (),
+    'step5_critical_points': ('critical_points',),
+    'step6_table_values': (),
+    'step7_variation_table': ('critical_points',),
+    'step8_sign_table': ('zeros',),
+    'step9_intercepts': ('zeros',),
+    'step10_asymptotes': (),
+    'step11_graph_description': (),
+}
+
+# Math phase (for /metrics) of graph nodes that are not generic analysis steps
+ANALYSIS_PHASES = {
+    'derivative': 'derivative',
+    'step3_derivative': 'derivative',
+    'critical_points': 'solve',
+    'zeros': 'solve',
+    'step4_limits': 'limit',
+    'step10_asymptotes': 'limit',
+}
+
+# Extra wait on the event loop side for the worker to report a step's timeout
+STEP_TIMEOUT_GRACE = 2.0
+
+
+class StepTimeout(Exception):
+    """An analysis step ran out of time"""
+
+
+class DependencyFailed(Exception):
+    """Passed to a step in place of a shared result that failed; the step degrades as if computing it failed"""
 
 class FunctionAnalyzer:
     def __init__(self):
         self.x = sp.Symbol('x')
+        # pyplot keeps global state; plots may now be drawn from executor threads
+        self._plot_lock = threading.Lock()
+
+        # Worker processes for analysis steps, created on first use
+        self.workers = Config.FUNCTION_WORKERS
+        self.step_timeout = Config.FUNCTION_STEP_TIMEOUT
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots = None  # (event loop, semaphore of free workers)
         
     def parse_function(self, func_str: str) -> sp.Expr:
-        """Parse function string into SymPy expression"""
-        import re
-
-        # Handle common function formats first
-        # Use regex to handle spaces around = sign
-        func_patterns = [
-            (r'f\s*\(\s*x\s*\)\s*=\s*(.+)', 'f(x)'),
-            (r'y\s*=\s*(.+)', 'y'),
-            (r'g\s*\(\s*x\s*\)\s*=\s*(.+)', 'g(x)'),
-            (r'h\s*\(\s*x\s*\)\s*=\s*(.+)', 'h(x)'),
-        ]
-
-        for pattern, name in func_patterns:
-            match = re.match(pattern, func_str.strip(), re.IGNORECASE)
-            if match:
-                func_str = match.group(1).strip()
-                break
-
-        # Replace mathematical notation
-        func_str = func_str.replace('^', '**')
-        func_str = func_str.replace('π', 'pi')
-
-        # Handle implicit multiplication (2x -> 2*x, 3x^2 -> 3*x^2, etc.)
-        # Replace patterns like 2x, 3x, 10x with 2*x, 3*x, 10*x
-        func_str = re.sub(r'(\d+)([a-zA-Z])', r'\1*\2', func_str)
-
-        # Replace patterns like x2, x3 with x**2, x**3 (in case ^ was missed)
-        func_str = re.sub(r'([a-zA-Z])(\d+)', r'\1**\2', func_str)
-
-        # Clean up extra spaces
-        func_str = func_str.replace(' ', '')
-
-        # Parse with SymPy
-        return sp.sympify(func_str)
+        """Parse function string (optionally with an f(x)= / y= header) into SymPy expression"""
+        return expression_parser.parse(func_str, function_header=True)
     
     def analyze_function(self, func_str: str) -> Dict:
         """Complete function analysis with structured step-by-step approach"""
@@ -54,24 +79,143 @@ class FunctionAnalyzer:
             analysis = {
                 'original': func_str,
                 'function': str(func),
-                'step1_definition': self._generate_step1_definition(func_str, func),
-                'step2_domain': self._generate_step2_domain(func),
-                'step3_derivative': self._generate_step3_derivative(func),
-                'step4_limits': self._generate_step4_limits(func),
-                'step5_critical_points': self._generate_step5_critical_points(func),
-                'step6_table_values': self._generate_step6_table_values(func),
-                'step7_variation_table': self._generate_step7_variation_table(func),
-                'step8_sign_table': self._generate_step8_sign_table(func),
-                'step9_intercepts': self._generate_step9_intercepts(func),
-                'step10_asymptotes': self._generate_step10_asymptotes(func),
-                'step11_graph_description': self._generate_step11_graph_description(func)
             }
+            for key, _, step in self.analysis_steps(func_str):
+                analysis[key] = step(func)
 
             return analysis
 
         except Exception as e:
             return {'error': str(e)}
 
+    def analysis_steps(self, func_str: str) -> List[Tuple[str, str, Callable[[sp.Expr], str]]]:
+        """The eleven analysis steps in order as (key, title, step(func))"""
+        return [
+            ('step1_definition', 'Definition', lambda func: self._generate_step1_definition(func_str, func)),
+            ('step2_domain', 'Domain', self._generate_step2_domain),
+            ('step3_derivative', 'Derivative', self._generate_step3_derivative),
+            ('step4_limits', 'Limits', self._generate_step4_limits),
+            ('step5_critical_points', 'Critical points', self._generate_step5_critical_points),
+            ('step6_table_values', 'Table of values', self._generate_step6_table_values),
+            ('step7_variation_table', 'Variation table', self._generate_step7_variation_table),
+            ('step8_sign_table', 'Sign table', self._generate_step8_sign_table),
+            ('step9_intercepts', 'Intercepts', self._generate_step9_intercepts),
+            ('step10_asymptotes', 'Asymptotes', self._generate_step10_asymptotes),
+            ('step11_graph_description', 'Graph', self._generate_step11_graph_description),
+        ]
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = metrics.track_executor(
+                "function_analysis", ProcessPoolExecutor(max_workers=self.workers), self.workers
+            )
+        return self._pool
+
+    def run_node(self, node: str, func_str: str, func: sp.Expr, inputs: Dict):
+        """Compute one node of ANALYSIS_GRAPH from the results of its dependencies"""
+        if node == 'derivative':
+            return sp.diff(func, self.x)
+        if node == 'critical_points':
+            return sp.solve(self._dependency(inputs['derivative'], lambda: sp.diff(func, self.x)), self.x)
+        if node == 'zeros':
+            return sp.solve(func, self.x)
+        steps = {key: step for key, _, step in self.analysis_steps(func_str)}
+        return steps[node](func, **inputs)
+
+    async def iter_analysis(self, func_str: str) -> AsyncIterator[Tuple[str, str, str]]:
+        """
+        Run the analysis steps in parallel, yielding (key, title, text) as each step finishes
+
+        The first item is ('function', 'Function', <parsed function>); parse errors are raised.
+        Steps arrive in completion order. Each node of ANALYSIS_GRAPH runs on the process
+        pool with its own deadline; a step that runs out of time yields a "could not be
+        completed" entry instead of holding up the rest. A failed shared result reaches its
+        steps as DependencyFailed, so only the parts that need it are left out.
+        """
+        loop = asyncio.get_running_loop()
+        with MATH_PHASE_SECONDS.time(phase="parse"), tracer.span("analysis.parse"):
+            func = await loop.run_in_executor(None, self.parse_function, func_str)
+        yield 'function', 'Function', str(func)
+
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run(node: str):
+            inputs = {}
+            for dependency in ANALYSIS_GRAPH[node]:
+                try:
+                    inputs[dependency] = await tasks[dependency]
+                except Exception as e:
+                    inputs[dependency] = DependencyFailed(f"{dependency}: {e or type(e).__name__}")
+            return await self._run_node_with_deadline(node, func_str, func, inputs)
+
+        # ANALYSIS_GRAPH lists dependencies before the nodes that use them
+        for node in ANALYSIS_GRAPH:
+            tasks[node] = asyncio.ensure_future(run(node))
+
+        titles = {key: title for key, title, _ in self.analysis_steps(func_str)}
+        pending = {tasks[key]: key for key in titles}
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    key = pending.pop(task)
+                    yield key, titles[key], self._step_text(titles[key], task)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    async def _run_node_with_deadline(self, node: str, func_str: str, func: sp.Expr, inputs: Dict):
+        loop = asyncio.get_running_loop()
+        # Submit only when a worker is free, so the deadline covers running time, not queueing.
+        # The slot is given back when the worker finishes, not when the deadline gives up on it
+        slots = self._worker_slots(loop)
+        await slots.acquire()
+        with tracer.span(f"analysis.{node}"):
+            started = time.perf_counter()
+            try:
+                worker_future = self.pool.submit(_run_node_in_worker, node, func_str, func, inputs, self.step_timeout)
+            except Exception:
+                slots.release()
+                raise
+            worker_future.add_done_callback(lambda _: self._release_slot(loop, slots))
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(worker_future), self.step_timeout + STEP_TIMEOUT_GRACE)
+            except (SymbolicTimeout, asyncio.TimeoutError):
+                raise StepTimeout(node)
+            finally:
+                elapsed = time.perf_counter() - started
+                ANALYSIS_STEP_SECONDS.observe(elapsed, step=node)
+                MATH_PHASE_SECONDS.observe(elapsed, phase=ANALYSIS_PHASES.get(node, 'analysis'))
+
+    def _worker_slots(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        if self._slots is None or self._slots[0] is not loop:
+            self._slots = (loop, asyncio.Semaphore(self.workers))
+        return self._slots[1]
+
+    @staticmethod
+    def _release_slot(loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore):
+        """Done callback of a worker future (runs on the pool's thread)"""
+        try:
+            loop.call_soon_threadsafe(slots.release)
+        except RuntimeError:
+            pass  # the event loop is closed, and its semaphore with it
+
+    def _dependency(self, value, compute: Callable):
+        """A shared result from iter_analysis, computed here when not given; a failed one is raised"""
+        if isinstance(value, DependencyFailed):
+            raise value
+        return compute() if value is None else value
+
+    def _step_text(self, title: str, task: asyncio.Task) -> str:
+        try:
+            return task.result()
+        except StepTimeout:
+            return f"{title} could not be completed within {self.step_timeout:g} s."
+        except Exception as e:
+            print(f"Analysis step '{title}' failed: {e}")
+            return f"{title} could not be completed."
+
     def _generate_step1_definition(self, func_str: str, func: sp.Expr) -> str:
         """Generate Step 1: Function Definition"""
         return f"We consider the function defined by f(x) = {func}."
@@ -81,10 +225,10 @@ class FunctionAnalyzer:
         domain = self._find_domain(func)
         return f"Its domain of definition is {domain}."
 
-    def _generate_step3_derivative(self, func: sp.Expr) -> str:
+    def _generate_step3_derivative(self, func: sp.Expr, derivative: sp.Expr = None) -> str:
         """Generate Step 3: Derivative Analysis"""
         try:
-            derivative = sp.diff(func, self.x)
+            derivative = self._dependency(derivative, lambda: sp.diff(func, self.x))
             simplified = sp.simplify(derivative)
             factored = sp.factor(derivative)
 
@@ -109,11 +253,10 @@ class FunctionAnalyzer:
         except:
             return "Limits analysis could not be completed."
 
-    def _generate_step5_critical_points(self, func: sp.Expr) -> str:
+    def _generate_step5_critical_points(self, func: sp.Expr, critical_points: List = None) -> str:
         """Generate Step 5: Critical Points Analysis"""
         try:
-            derivative = sp.diff(func, self.x)
-            critical_points = sp.solve(derivative, self.x)
+            critical_points = self._dependency(critical_points, lambda: sp.solve(sp.diff(func, self.x), self.x))
 
             if not critical_points:
                 return "The function has no critical points."
@@ -155,11 +298,10 @@ class FunctionAnalyzer:
         except:
             return "Table of values could not be generated."
 
-    def _generate_step7_variation_table(self, func: sp.Expr) -> str:
+    def _generate_step7_variation_table(self, func: sp.Expr, critical_points: List = None) -> str:
         """Generate Step 7: Variation Table"""
         try:
-            derivative = sp.diff(func, self.x)
-            critical_points = sp.solve(derivative, self.x)
+            critical_points = self._dependency(critical_points, lambda: sp.solve(sp.diff(func, self.x), self.x))
 
             result = "Its table of variations is:\n\n"
 
@@ -177,10 +319,10 @@ class FunctionAnalyzer:
         except:
             return "Variation table could not be created."
 
-    def _generate_step8_sign_table(self, func: sp.Expr) -> str:
+    def _generate_step8_sign_table(self, func: sp.Expr, zeros: List = None) -> str:
         """Generate Step 8: Sign Table"""
         try:
-            zeros = sp.solve(func, self.x)
+            zeros = self._dependency(zeros, lambda: sp.solve(func, self.x))
             factored = sp.factor(func)
 
             result = "Its table of signs is:\n\n"
@@ -200,7 +342,7 @@ class FunctionAnalyzer:
         except:
             return "Sign table could not be created."
 
-    def _generate_step9_intercepts(self, func: sp.Expr) -> str:
+    def _generate_step9_intercepts(self, func: sp.Expr, zeros: List = None) -> str:
         """Generate Step 9: Intercepts Analysis"""
         try:
             result = "Intercepts analysis:\n"
@@ -214,7 +356,7 @@ class FunctionAnalyzer:
 
             # X-intercepts
             try:
-                x_intercepts = sp.solve(func, self.x)
+                x_intercepts = self._dependency(zeros, lambda: sp.solve(func, self.x))
                 if x_intercepts:
                     result += f"• X-intercepts: {x_intercepts}"
                 else:
@@ -783,8 +925,12 @@ class FunctionAnalyzer:
         
         return asymptotes
     
+    @observe_latency(MATH_PHASE_SECONDS, phase="plot")
     def plot_function(self, func_str: str, x_range: Tuple[float, float] = (-10, 10)) -> str:
         """Plot the function and return base64 encoded image"""
+        # pyplot takes ~0.5 s to import - only pay for it once a plot is needed
+        import matplotlib.pyplot as plt
+
         try:
             func = self.parse_function(func_str)
             
@@ -798,30 +944,35 @@ class FunctionAnalyzer:
             y_vals = func_lambdified(x_vals)
             
             # Create the plot
-            plt.figure(figsize=(10, 8))
-            plt.plot(x_vals, y_vals, 'b-', linewidth=2, label=f'f(x) = {func}')
-            plt.grid(True, alpha=0.3)
-            plt.axhline(y=0, color='k', linewidth=0.5)
-            plt.axvline(x=0, color='k', linewidth=0.5)
-            plt.xlabel('x')
-            plt.ylabel('f(x)')
-            plt.title(f'Graph of f(x) = {func}')
-            plt.legend()
-            
-            # Save to bytes
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-            img_buffer.seek(0)
-            
-            # Convert to base64
-            img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-            
-            plt.close()
+            with self._plot_lock:
+                plt.figure(figsize=(10, 8))
+                plt.plot(x_vals, y_vals, 'b-', linewidth=2, label=f'f(x) = {func}')
+                plt.grid(True, alpha=0.3)
+                plt.axhline(y=0, color='k', linewidth=0.5)
+                plt.axvline(x=0, color='k', linewidth=0.5)
+                plt.xlabel('x')
+                plt.ylabel('f(x)')
+                plt.title(f'Graph of f(x) = {func}')
+                plt.legend()
+            
+                # Save to bytes
+                img_buffer = io.BytesIO()
+                plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
+                img_buffer.seek(0)
+            
+                # Convert to base64
+                img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
+            
+                plt.close()
             return img_base64
             
         except Exception as e:
             print(f"Error plotting function: {e}")
             return None
 
+def _run_node_in_worker(node: str, func_str: str, func: sp.Expr, inputs: Dict, timeout: float):
+    """Pool worker entry point; the node is interrupted at the deadline (see call_with_time_budget)"""
+    return call_with_time_budget(timeout, function_analyzer.run_node, node, func_str, func, inputs)
+
 # Global function analyzer instance
 function_analyzer = FunctionAnalyzer()
@@ -0,0 +1,193 @@
+"""
+Image preprocessing before OCR
+Shrinks photos to what text extraction actually needs: EXIF orientation fix,
+downscale, grayscale, contrast normalization and optional crop to the text region.
+"""
+
+import hashlib
+import io
+import threading
+import time
+from typing import Dict, Tuple
+
+from PIL import Image, ImageOps, ImageFilter
+
+from config import Config
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only file object over a bytes-like buffer without copying it (io.BytesIO copies memoryviews)"""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        count = min(len(target), len(self._view) - self._position)
+        if count <= 0:
+            return 0
+        target[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+def content_hash(image_data) -> str:
+    """
+    Exact hash of the image bytes sent to OCR, the OCR cache's level 2 key
+
+    Deliberately not perceptual: two exercises that differ in a single digit look
+    almost identical to any perceptual hash, and must never share a cached result.
+    Preprocessing is deterministic, so the same photo still hashes the same.
+    """
+    return hashlib.blake2b(memoryview(image_data), digest_size=16).hexdigest()
+
+
+class ImagePreprocessor:
+    def __init__(self, max_side: int = None, auto_crop: bool = None, binarize: bool = None,
+                 jpeg_quality: int = 85, crop_margin: int = 16):
+        self.max_side = max_side if max_side is not None else Config.OCR_TARGET_MAX_SIDE
+        self.auto_crop = Config.OCR_AUTO_CROP if auto_crop is None else auto_crop
+        self.binarize = Config.OCR_BINARIZE if binarize is None else binarize
+        self.jpeg_quality = jpeg_quality
+        self.crop_margin = crop_margin
+
+        # Counters exposed for monitoring (preprocess runs on several OCR executor threads)
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'images': 0,
+            'failures': 0,
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'total_ms': 0.0,
+        }
+
+    def preprocess(self, image_data) -> Tuple[bytes, Dict]:
+        """
+        Prepare an image for OCR
+
+        Args:
+            image_data: Encoded image (bytes, bytearray or memoryview)
+
+        Returns:
+            Tuple of (processed_image_bytes, info) where info holds sizes and timing
+        """
+        started = time.perf_counter()
+        size_in = len(image_data)
+
+        try:
+            image = Image.open(BufferReader(image_data))
+            original_size = image.size
+
+            # JPEG can decode straight at a reduced scale (power-of-two DCT scaling),
+            # which is far cheaper than decoding full size and resizing afterwards
+            if image.format == 'JPEG' and max(original_size) > 2 * self.max_side:
+                image.draft('L', (self.max_side, self.max_side))
+
+            # Phone photos are often stored sideways with an EXIF rotation flag
+            image = ImageOps.exif_transpose(image)
+
+            # Grayscale first so every later step works on one channel
+            image = image.convert('L')
+
+            # Downscale the rest of the way with a proper resample
+            if max(image.size) > self.max_side:
+                image.thumbnail((self.max_side, self.max_side), Image.LANCZOS, reducing_gap=2.0)
+
+            # Stretch contrast: darkest ink to black, clipping the brightest 1% (glare)
+            # so paper ends up near white. Text usually covers well under 1% of the
+            # pixels, so the dark end must not be clipped.
+            image = ImageOps.autocontrast(image, cutoff=(0, 1))
+
+            if self.auto_crop:
+                image = self._crop_to_text(image)
+
+            if self.binarize:
+                image = image.point(lambda value: 255 if value > 128 else 0, mode='1')
+
+            output = io.BytesIO()
+            if self.binarize:
+                image.save(output, format='PNG', optimize=True)
+            else:
+                image.save(output, format='JPEG', quality=self.jpeg_quality, optimize=True)
+            processed = output.getvalue()
+
+        except Exception as e:
+            with self._stats_lock:
+                self.stats['failures'] += 1
+            raise ValueError(f"Could not preprocess image: {e}")
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self.stats['images'] += 1
+            self.stats['bytes_in'] += size_in
+            self.stats['bytes_out'] += len(processed)
+            self.stats['total_ms'] += elapsed_ms
+
+        info = {
+            'original_size': original_size,
+            'processed_size': image.size,
+            'bytes_in': size_in,
+            'bytes_out': len(processed),
+            'elapsed_ms': elapsed_ms,
+            'image_hash': content_hash(processed),
+        }
+        return processed, info
+
+    def _crop_to_text(self, image: Image.Image) -> Image.Image:
+        """Crop to the bounding box of dark (ink) pixels, keeping a small margin"""
+        # Mark dark (ink) pixels at full resolution - a lookup table, so cheap - then
+        # shrink the mask: each small pixel holds the ink coverage of its block
+        scale = max(1, max(image.size) // 400)
+        mask = image.point(lambda value: 255 if value < 160 else 0)
+        if scale > 1:
+            mask = mask.reduce(scale)
+
+        # Blocks with a few percent ink count as text (drops isolated specks);
+        # a max filter then joins neighbouring characters
+        mask = mask.point(lambda value: 255 if value >= 8 else 0).filter(ImageFilter.MaxFilter(5))
+        bbox = mask.getbbox()
+        if not bbox:
+            return image
+
+        bbox = tuple(coordinate * scale for coordinate in bbox)
+        left, top, right, bottom = bbox
+        width, height = image.size
+
+        # Not worth it when text already fills the frame
+        if (right - left) * (bottom - top) > 0.9 * width * height:
+            return image
+
+        return image.crop((
+            max(0, left - self.crop_margin),
+            max(0, top - self.crop_margin),
+            min(width, right + self.crop_margin),
+            min(height, bottom + self.crop_margin),
+        ))
+
+    def get_stats(self) -> Dict:
+        """Byte-size and latency counters"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        images = stats['images']
+        return {
+            **stats,
+            'avg_ms': stats['total_ms'] / images if images else 0.0,
+            'size_ratio': stats['bytes_out'] / stats['bytes_in'] if stats['bytes_in'] else 0.0,
+        }
+
+# Global image preprocessor instance
+image_preprocessor = ImagePreprocessor()
@@ -1,63 +1,87 @@
 import sympy as sp
+import asyncio
 import re
-from typing import Tuple, Optional
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Tuple, Optional, List
 import math
+import threading
+
+from sympy.solvers.solveset import NonlinearError
+
+from config import Config
+from app.core.metrics import metrics, observe_latency, MATH_PHASE_SECONDS
+from app.core.tracing import traced
+from app.services.expression_parser import expression_parser, CONSTANTS, FUNCTIONS
+from app.services.fast_evaluator import fast_evaluator
+from app.services.numeric_solver import (numeric_root_finder, solve_symbolic, call_with_time_budget, in_worker_process,
+                                         SymbolicTimeout)
+
+# Systems: 'x + y = 5; x - y = 1'
+SYSTEM_SEPARATOR = re.compile(r'\s*;\s*')
+# Explicit unknowns: '2x + 3y = 6 for y', 'solve for x, y: x + y = 5; x - y = 1'
+UNKNOWN_LIST = r'(?P<unknowns>[a-z]\w*(?:\s*,\s*[a-z]\w*)*)'
+SOLVE_FOR_SUFFIX = re.compile(r'^\s*(?:solve\s+)?(?P<equations>.+?=.+?)\s+for\s+' + UNKNOWN_LIST + r'\s*$', re.IGNORECASE)
+SOLVE_FOR_PREFIX = re.compile(r'^\s*solve\s+for\s+' + UNKNOWN_LIST + r'\s*:?\s+(?P<equations>.+=.+)$', re.IGNORECASE)
+# sp.solve answers in these return one branch only (e^x = 3x: LambertW gives 0.619, not 1.512),
+# so such solutions are cross-checked against a numeric scan
+NON_ELEMENTARY_SOLUTIONS = (sp.LambertW, sp.erfinv, sp.erfcinv, sp.polylog, sp.Integral)
 
 class MathSolver:
     def __init__(self):
-        # Define common mathematical constants and functions
-        self.constants = {
-            'pi': sp.pi,
-            'e': sp.E,
-            'inf': sp.oo,
-            'infinity': sp.oo
-        }
-        
-        # Define function mappings
-        self.functions = {
-            'sin': sp.sin,
-            'cos': sp.cos,
-            'tan': sp.tan,
-            'asin': sp.asin,
-            'acos': sp.acos,
-            'atan': sp.atan,
-            'sinh': sp.sinh,
-            'cosh': sp.cosh,
-            'tanh': sp.tanh,
-            'log': sp.log,
-            'ln': sp.log,
-            'log10': lambda x: sp.log(x, 10),
-            'sqrt': sp.sqrt,
-            'abs': sp.Abs,
-            'exp': sp.exp,
-            'factorial': sp.factorial,
-            'floor': sp.floor,
-            'ceil': sp.ceiling,
-        }
+        # Common mathematical constants and the function whitelist, shared with the parser
+        self.constants = CONSTANTS
+        self.functions = FUNCTIONS
+        self.parser = expression_parser
+        self.fast_evaluator = fast_evaluator
+        self.stats = {'fast_path': 0, 'sympy': 0, 'parse_cache_hits': 0, 'parse_cache_misses': 0}
+
+        # Parsed expressions by input text (SymPy expressions are immutable, safe to share);
+        # solve_expression runs on executor threads, so the LRU is only touched under the lock
+        self._parse_cache = OrderedDict()
+        self._parse_cache_lock = threading.Lock()
+        self.parse_cache_size = Config.MATH_PARSE_CACHE_SIZE
+
+        # Worker processes for symbolic work in batches and budgeted solves, created on first use
+        self.workers = Config.MATH_WORKERS
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+        # Equations sp.solve cannot finish in time are solved numerically
+        self.symbolic_timeout = Config.MATH_SYMBOLIC_TIMEOUT
+        self.root_finder = numeric_root_finder
     
     def preprocess_expression(self, expression: str) -> str:
         """Preprocess the mathematical expression for better parsing"""
-        # Remove spaces
-        expression = expression.replace(' ', '')
-        
-        # Replace common patterns
-        expression = expression.replace('^', '**')  # Power operator
-        expression = expression.replace('π', 'pi')
-        expression = expression.replace('∞', 'inf')
-        
-        # Handle factorial (convert ! to factorial function)
-        expression = re.sub(r'(\d+)!', r'factorial(\1)', expression)
-        expression = re.sub(r'([a-zA-Z]+)!', r'factorial(\1)', expression)
-        
-        # Handle implicit multiplication (e.g., 2x -> 2*x, 3(x+1) -> 3*(x+1))
-        expression = re.sub(r'(\d)([a-zA-Z])', r'\1*\2', expression)
-        expression = re.sub(r'(\d)(\()', r'\1*\2', expression)
-        expression = re.sub(r'(\))(\d)', r'\1*\2', expression)
-        expression = re.sub(r'(\))(\()', r'\1*\2', expression)
-        expression = re.sub(r'([a-zA-Z])(\()', r'\1*\2', expression)
-        
-        return expression
+        return self.parser.normalize(expression)
     
+    def parse_expression(self, expression: str, letter_powers: bool = True) -> sp.Expr:
+        """
+        Parse an expression (implicit multiplication, factorials, unicode symbols)
+
+        letter_powers=False keeps x1, x2 as unknowns instead of reading x2 as x^2 (systems).
+        """
+        key = (expression, letter_powers)
+        with self._parse_cache_lock:
+            expr = self._parse_cache.get(key)
+            if expr is not None:
+                self.stats['parse_cache_hits'] += 1
+                self._parse_cache.move_to_end(key)
+                return expr
+            self.stats['parse_cache_misses'] += 1
+
+        # Parse outside the lock - two threads may parse the same text, the last one is kept
+        with MATH_PHASE_SECONDS.time(phase="parse"):
+            expr = self.parser.parse(expression, letter_powers=letter_powers)
+        with self._parse_cache_lock:
+            self._parse_cache[key] = expr
+            while len(self._parse_cache) > self.parse_cache_size:
+                self._parse_cache.popitem(last=False)
+        return expr
+    
+    @traced("math.solve")
+    @observe_latency(MATH_PHASE_SECONDS, phase="solve")
     def solve_expression(self, expression: str) -> Tuple[bool, str, Optional[str]]:
         """
         Solve a mathematical expression or equation
@@ -68,14 +92,14 @@ class MathSolver:
             if '=' in expression:
                 return self.solve_equation(expression)
             
-            # Preprocess the expression
-            processed_expr = self.preprocess_expression(expression)
-            
-            # Combine constants and functions for sympify
-            sympify_locals = {**self.constants, **self.functions}
+            # Plain arithmetic is evaluated directly - SymPy only when it is needed
+            fast_result = self._solve_fast(expression)
+            if fast_result is not None:
+                return fast_result
+            self.stats['sympy'] += 1
             
             # Parse the expression using SymPy
-            expr = sp.sympify(processed_expr, locals=sympify_locals)
+            expr = self.parse_expression(expression)
             
             # Evaluate the expression
             result = expr.evalf()
@@ -97,12 +121,96 @@ class MathSolver:
         except Exception as e:
             return False, f"Error: {str(e)}", None
 
+    def _solve_fast(self, expression: str) -> Optional[Tuple[bool, str, Optional[str]]]:
+        """Numeric fast path for constant expressions, None if SymPy is needed"""
+        fast_result = self.fast_evaluator.evaluate(expression)
+        if fast_result is None:
+            return None
+        value, normalized, functions_used = fast_result
+        self.stats['fast_path'] += 1
+        return True, self._format_number(value), self._generate_fast_steps(normalized, functions_used, value)
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        # Budgeted solves reach this from several executor threads at once
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = metrics.track_executor(
+                        "math", ProcessPoolExecutor(max_workers=self.workers), self.workers
+                    )
+        return self._pool
+
+    @property
+    def budget_executor(self) -> Optional[ProcessPoolExecutor]:
+        """Where budgeted sp.solve calls run: the pool, or None inside a worker (it times itself)"""
+        if self.workers < 1 or in_worker_process():
+            return None
+        return self.pool
+
+    def _plan_batch(self, expressions: List[str]):
+        """
+        Answer what the fast path can right away
+
+        Returns:
+            (results, pending) - results has None where SymPy is still needed,
+            pending lists those expressions once each (duplicates are solved once)
+        """
+        results = []
+        for expression in expressions:
+            results.append(None if '=' in expression else self._solve_fast(expression))
+        pending = list(dict.fromkeys(
+            expression for expression, result in zip(expressions, results) if result is None
+        ))
+        return results, pending
+
+    def _use_pool(self, pending_count: int) -> bool:
+        # Spreading work only pays off with at least two symbolic items and two workers
+        return pending_count > 1 and self.workers > 1
+
+    def solve_batch(self, expressions: List[str]) -> List[Tuple[bool, str, Optional[str]]]:
+        """
+        Solve several expressions/equations together
+
+        Constant expressions take the fast path inline; the rest are deduplicated and
+        solved in parallel worker processes. Results are returned in input order.
+        """
+        results, pending = self._plan_batch(expressions)
+        if pending:
+            if self._use_pool(len(pending)):
+                solved = dict(zip(pending, self.pool.map(_solve_in_worker, pending)))
+            else:
+                solved = {expression: self.solve_expression(expression) for expression in pending}
+            results = [result or solved[expression] for expression, result in zip(expressions, results)]
+        return results
+
+    @traced("math.solve_batch")
+    async def solve_batch_async(self, expressions: List[str]) -> List[Tuple[bool, str, Optional[str]]]:
+        """solve_batch without blocking the event loop"""
+        results, pending = self._plan_batch(expressions)
+        if pending:
+            loop = asyncio.get_running_loop()
+            if self._use_pool(len(pending)):
+                futures = [loop.run_in_executor(self.pool, _solve_in_worker, expression) for expression in pending]
+            else:
+                futures = [loop.run_in_executor(None, self.solve_expression, expression) for expression in pending]
+            solved = dict(zip(pending, await asyncio.gather(*futures)))
+            results = [result or solved[expression] for expression, result in zip(expressions, results)]
+        return results
+
     def solve_equation(self, equation: str) -> Tuple[bool, str, Optional[str]]:
         """
         Solve one-step and multi-step equations
         Returns: (success, solution, steps)
         """
         try:
+            # Systems and equations with explicit unknowns
+            equations, unknowns = self.split_system(equation)
+            if len(equations) > 1 or unknowns:
+                return self.solve_system(equations, unknowns)
+            if equations:
+                equation = equations[0]
+
             # Split equation by = sign
             parts = equation.split('=')
             if len(parts) != 2:
@@ -110,16 +218,9 @@ class MathSolver:
             
             left_side, right_side = parts[0].strip(), parts[1].strip()
             
-            # Preprocess both sides
-            left_expr = self.preprocess_expression(left_side)
-            right_expr = self.preprocess_expression(right_side)
-            
-            # Combine constants and functions for sympify
-            sympify_locals = {**self.constants, **self.functions}
-            
             # Parse both sides
-            left = sp.sympify(left_expr, locals=sympify_locals)
-            right = sp.sympify(right_expr, locals=sympify_locals)
+            left = self.parse_expression(left_side)
+            right = self.parse_expression(right_side)
             
             # Create equation
             equation_obj = sp.Eq(left, right)
@@ -137,48 +238,197 @@ class MathSolver:
             elif len(variables) == 1:
                 # One variable - solve for it
                 var = list(variables)[0]
-                solutions = sp.solve(equation_obj, var)
+                try:
+                    solutions = self._solve_symbolic(left - right, var)
+                except (SymbolicTimeout, NotImplementedError) as e:
+                    return self._solve_numeric(equation, left - right, var, str(e).splitlines()[0])
                 
                 if not solutions:
                     return True, "No solution", f"The equation {equation} has no solution"
+
+                if any(sol.has(*NON_ELEMENTARY_SOLUTIONS) for sol in solutions):
+                    missed = self._missed_real_roots(left - right, var, solutions)
+                    if missed:
+                        return self._format_with_numeric_roots(equation, var, solutions, missed)
                 
                 # Format solutions
                 if len(solutions) == 1:
                     sol = solutions[0]
-                    if sol.is_real:
-                        if sol == int(sol):
-                            formatted_sol = str(int(sol))
-                        else:
-                            formatted_sol = f"{float(sol):.10g}"
-                    else:
-                        formatted_sol = str(sol)
-                    
-                    result = f"{var} = {formatted_sol}"
+                    result = f"{var} = {self._format_solution(sol)}"
                     steps = self._generate_equation_steps(equation, var, sol)
                     return True, result, steps
                 else:
                     # Multiple solutions
-                    formatted_sols = []
-                    for sol in solutions:
-                        if sol.is_real:
-                            if sol == int(sol):
-                                formatted_sols.append(str(int(sol)))
-                            else:
-                                formatted_sols.append(f"{float(sol):.10g}")
-                        else:
-                            formatted_sols.append(str(sol))
-                    
+                    formatted_sols = [self._format_solution(sol) for sol in solutions]
                     result = f"{var} = {', '.join(formatted_sols)}"
                     steps = f"Solving: {equation}\nSolutions: {result}"
                     return True, result, steps
             
             else:
                 # Multiple variables
-                return False, "Equation has multiple variables. Please specify which variable to solve for.", None
+                names = sorted(str(variable) for variable in variables)
+                return False, ("Equation has multiple variables. Please specify which variable to solve for, "
+                               f"e.g. '{equation.strip()} for {names[-1]}'"), None
                 
         except Exception as e:
             return False, f"Error solving equation: {str(e)}", None
 
+    def split_system(self, text: str) -> Tuple[List[str], List[str]]:
+        """
+        Split input into equations and explicitly requested unknowns
+
+        'x + y = 5; x - y = 1' -> (['x + y = 5', 'x - y = 1'], [])
+        '2x + 3y = 6 for y'    -> (['2x + 3y = 6'], ['y'])
+        """
+        unknowns = []
+        match = SOLVE_FOR_PREFIX.match(text) or SOLVE_FOR_SUFFIX.match(text)
+        if match:
+            text = match.group('equations')
+            unknowns = [name.strip() for name in match.group('unknowns').split(',')]
+        equations = [part for part in SYSTEM_SEPARATOR.split(text.strip()) if part]
+        return equations, unknowns
+
+    def solve_system(self, equations: List[str], unknown_names: List[str] = None) -> Tuple[bool, str, Optional[str]]:
+        """
+        Solve a system of equations for all of its variables (or the requested ones)
+
+        Linear systems go through linsolve, which row-reduces a sparse domain matrix;
+        anything else falls back to sp.solve under the symbolic time budget.
+        Returns: (success, solution, steps)
+        """
+        try:
+            if any(part.count('=') != 1 for part in equations):
+                return False, "Each equation needs exactly one '='. Separate equations with ';', e.g. x + y = 5; x - y = 1", None
+
+            exprs = []
+            for part in equations:
+                left_side, right_side = part.split('=')
+                # Systems name their unknowns x1, x2, a1 ... - not powers of x or a
+                exprs.append(self.parse_expression(left_side.strip(), letter_powers=False)
+                             - self.parse_expression(right_side.strip(), letter_powers=False))
+
+            symbols = set().union(*(expr.free_symbols for expr in exprs))
+            if unknown_names:
+                by_name = {str(symbol): symbol for symbol in symbols}
+                missing = [name for name in unknown_names if name not in by_name]
+                if missing:
+                    return False, f"{', '.join(missing)} does not appear in the equations", None
+                unknowns = [by_name[name] for name in unknown_names]
+            else:
+                unknowns = sorted(symbols, key=str)
+
+            if not unknowns:
+                is_true = all(sp.simplify(expr) == 0 for expr in exprs)
+                return True, "True" if is_true else "False", f"Checking {len(exprs)} equations\nResult: {is_true}"
+
+            try:
+                solutions = [dict(zip(unknowns, values)) for values in sp.linsolve(exprs, unknowns)]
+                method = "Linear system: Gauss-Jordan elimination (linsolve)"
+            except NonlinearError:
+                solutions = call_with_time_budget(self.symbolic_timeout, partial(sp.solve, dict=True), exprs, unknowns,
+                                                  executor=self.budget_executor)
+                method = "Nonlinear system: symbolic solve"
+        except SymbolicTimeout:
+            return False, f"Could not solve the system within {self.symbolic_timeout:g} s", None
+        except Exception as e:
+            return False, f"Error solving system: {str(e).splitlines()[0]}", None
+
+        steps = ["Solving the system:"]
+        steps.extend(f"  {part}" for part in equations)
+        steps.append(f"Unknowns: {', '.join(str(unknown) for unknown in unknowns)}")
+        steps.append(method)
+
+        if not solutions:
+            steps.append("No solution: the equations are inconsistent")
+            return True, "No solution", '\n'.join(steps)
+
+        formatted = [self._format_system_solution(solution, unknowns) for solution in solutions]
+        result = ' or '.join(formatted)
+        if len(solutions) == 1:
+            steps.append(f"Solution: {result}")
+        else:
+            steps.append(f"{len(solutions)} solutions:")
+            steps.extend(f"  {solution}" for solution in formatted)
+        return True, result, '\n'.join(steps)
+
+    def _format_system_solution(self, solution: dict, unknowns: list) -> str:
+        """'x = 3, y = 2'; unknowns left free (parametric solutions) are omitted"""
+        assignments = [
+            f"{unknown} = {self._format_solution(solution[unknown])}"
+            for unknown in unknowns
+            if unknown in solution and solution[unknown] != unknown
+        ]
+        return ', '.join(assignments) or "any value (identity)"
+
+    def _format_solution(self, sol) -> str:
+        """Integer, 10 significant digits, or the symbolic form for non-real/parametric values"""
+        if sol.is_real:
+            if sol == int(sol):
+                return str(int(sol))
+            return f"{float(sol):.10g}"
+        return str(sol)
+
+    def _solve_symbolic(self, expr: sp.Expr, var: sp.Symbol) -> list:
+        """sp.solve; anything beyond polynomials and rational functions gets a time budget"""
+        if expr.is_polynomial(var) or expr.is_rational_function(var):
+            return sp.solve(expr, var)
+        return solve_symbolic(expr, var, self.symbolic_timeout, self.budget_executor)
+
+    def _missed_real_roots(self, expr: sp.Expr, var: sp.Symbol, solutions: list) -> List[float]:
+        """Real roots in the scan interval that none of the symbolic solutions evaluates to"""
+        known = []
+        for sol in solutions:
+            try:
+                value = complex(sp.N(sol))
+            except TypeError:
+                continue  # not a number (free parameters)
+            if abs(value.imag) <= 1e-12 * max(1.0, abs(value.real)):
+                known.append(value.real)
+        try:
+            roots, _ = self.root_finder.find_roots(expr, var)
+        except Exception:
+            return []
+        return [root for root in roots
+                if all(abs(root - value) > 1e-8 * max(1.0, abs(root)) for value in known)]
+
+    def _format_with_numeric_roots(self, equation: str, var: sp.Symbol, solutions: list,
+                                   missed: List[float]) -> Tuple[bool, str, Optional[str]]:
+        """Symbolic solutions followed by the roots only the numeric scan found"""
+        low, high = self.root_finder.interval
+        formatted = [self._format_solution(sol) for sol in solutions]
+        formatted.extend(f"≈ {self._format_number(root)}" for root in missed)
+        result = f"{var} = {', '.join(formatted)}"
+
+        steps = [f"Solving: {equation}"]
+        steps.extend(f"Symbolic solution: {var} = {sol}" for sol in solutions)
+        steps.append(f"The symbolic form covers one branch only; numeric check on [{low:g}, {high:g}] "
+                     f"found {len(missed)} more real root(s)")
+        steps.extend(f"{var} ≈ {self._format_number(root)}" for root in missed)
+        return True, result, '\n'.join(steps)
+
+    def _solve_numeric(self, equation: str, expr: sp.Expr, var: sp.Symbol, reason: str) -> Tuple[bool, str, Optional[str]]:
+        """Fallback for equations with no symbolic solution: real roots in the configured interval"""
+        low, high = self.root_finder.interval
+        interval = f"[{low:g}, {high:g}]"
+        roots, total = self.root_finder.find_roots(expr, var)
+        if not roots:
+            return False, f"Could not solve symbolically and found no real solution in {interval}", None
+
+        formatted = ', '.join(self._format_number(root) for root in roots)
+        result = f"{var} ≈ {formatted} (numeric approximation)"
+
+        steps = [
+            f"Solving: {equation}",
+            f"Symbolic solution not available ({reason})",
+            f"Numeric root finding on {interval}: sign changes in a "
+            f"{self.root_finder.scan_points}-point scan, refined with Brent's method",
+        ]
+        if total > len(roots):
+            steps.append(f"Found {total} roots; showing the {len(roots)} closest to 0")
+        steps.extend(f"{var} ≈ {self._format_number(root)}" for root in roots)
+        steps.append("Note: these are numeric approximations; roots outside the interval are not searched")
+        return True, result, '\n'.join(steps)
+
     def _generate_equation_steps(self, original_equation: str, variable, solution) -> str:
         """Generate step-by-step solution for equations"""
         steps = []
@@ -209,6 +459,24 @@ class MathSolver:
         except:
             return f"Equation: {original_equation}\nSolution: {variable} = {solution}"
     
+    def _format_number(self, value) -> str:
+        """Format a fast-path result exactly like an evalf() result"""
+        if value == int(value):
+            return str(int(value))
+        return f"{float(value):.10g}"
+
+    def _generate_fast_steps(self, normalized: str, functions_used, value) -> str:
+        """Steps for a fast-path result, in the same shape as _generate_steps"""
+        steps = [f"Original: {normalized}"]
+        if functions_used & {'log', 'ln', 'log10'}:
+            steps.append("Evaluating logarithmic functions...")
+        if functions_used & {'sin', 'cos', 'tan'}:
+            steps.append("Evaluating trigonometric functions...")
+        if 'exp' in functions_used:
+            steps.append("Evaluating exponential functions...")
+        steps.append(f"Result: {float(value):.15g}")
+        return "\n".join(steps)
+
     def _generate_steps(self, expr, result) -> str:
         """Generate step-by-step solution if possible"""
         steps = []
@@ -238,9 +506,7 @@ class MathSolver:
     def validate_expression(self, expression: str) -> Tuple[bool, str]:
         """Validate if the expression is mathematically valid"""
         try:
-            processed_expr = self.preprocess_expression(expression)
-            sympify_locals = {**self.constants, **self.functions}
-            sp.sympify(processed_expr, locals=sympify_locals)
+            self.parse_expression(expression)
             return True, "Valid expression"
         except Exception as e:
             return False, f"Invalid expression: {str(e)}"
@@ -248,9 +514,7 @@ class MathSolver:
     def get_expression_info(self, expression: str) -> dict:
         """Get additional information about the expression"""
         try:
-            processed_expr = self.preprocess_expression(expression)
-            sympify_locals = {**self.constants, **self.functions}
-            expr = sp.sympify(processed_expr, locals=sympify_locals)
+            expr = self.parse_expression(expression)
             
             info = {
                 "variables": list(expr.free_symbols),
@@ -266,5 +530,25 @@ class MathSolver:
         except:
             return {}
 
+def _solve_in_worker(expression: str) -> Tuple[bool, str, Optional[str]]:
+    """Entry point for worker processes (uses the worker's own solver and parse cache)"""
+    return math_solver.solve_expression(expression)
+
 # Global math solver instance
 math_solver = MathSolver()
+
+
+def _collect_math_metrics():
+    """Parse cache hit rate and evaluation paths for /metrics (this process; batch workers keep their own)"""
+    stats = math_solver.stats
+    hits, misses = stats['parse_cache_hits'], stats['parse_cache_misses']
+    return [
+        ("mathbot_math_parse_cache_lookups_total", "counter", "Math parse cache lookups by result",
+         [({"result": "hit"}, hits), ({"result": "miss"}, misses)]),
+        ("mathbot_math_parse_cache_hit_ratio", "gauge", "Share of math parse cache lookups that hit",
+         [({}, hits / (hits + misses) if hits + misses else 0.0)]),
+        ("mathbot_math_evaluations_total", "counter", "Expressions evaluated, by fast path or SymPy",
+         [({"path": "fast"}, stats['fast_path']), ({"path": "sympy"}, stats['sympy'])]),
+    ]
+
+metrics.register_collector(_collect_math_metrics)
@@ -0,0 +1,141 @@
+"""
+Message router
+Classifies free-text messages as function / alarm / math / AI.
+The text is lowercased once and each decision stage is a single precompiled
+alternation, evaluated in priority order and short-circuited on the first hit,
+instead of a few dozen re.search calls with patterns looked up on every message.
+"""
+
+import re
+from dataclasses import dataclass
+
+# Equation systems and explicit unknowns: 'x + y = 5; x - y = 1', '2x + 3y = 6 for y', 'solve for y: ...'
+SOLVE_FOR = re.compile(r'^\s*solve\s+for\s+[a-z]|=.*\sfor\s+[a-z]\w*(?:\s*,\s*[a-z]\w*)*\s*$')
+
+# Explicit function notation: f(x) = ..., y = ...
+FUNCTION_NOTATION = re.compile(r'[fgh]\(x\)\s*=|y\s*=')
+
+# Polynomial-like use of x (x^2, x + ..., ... - x, 2x, x*x) or functions applied to x
+FUNCTION_OF_X = re.compile(
+    r'x\^?\d+|x\s*[\+\-]|[\+\-]\s*x|\d+\s*\*?\s*x|x\s*\*\s*x'
+    r'|(?:sin|cos|tan|log|ln|sqrt|exp)\s*\(\s*x'
+)
+
+ALARM_TIME = re.compile(r'([01]?[0-9]|2[0-3]):[0-5][0-9]')
+
+QUESTION_WORD = re.compile(r'what|how|why|when|where|who|can|could|would|should|help|tell|explain')
+
+STRONG_MATH = re.compile(
+    r'\d+\s*[\+\-\*/\^]\s*\d+'                     # 2+3, 2^3
+    r'|(?:sin|cos|tan|log|ln|sqrt|exp|abs)\s*\('   # sin(
+    r'|\d+!'                                       # 5!
+    r'|pi\s*[\+\-\*/]|e\s*[\+\-\*/]'               # constants with operators
+    r'|[a-z]\s*[\+\-\*/\^]\s*\d+'                  # x+5
+    r'|\d+\s*\*?\s*[a-z]'                          # 2x, 3*y
+)
+
+# Weak indicators, cheapest first - two of them are needed
+WEAK_MATH = (
+    re.compile(r'[\+\-\*/\^]'),
+    re.compile(r'[a-z]'),
+    re.compile(r'\(\d+\)'),
+    re.compile(r'\d+\.\d+'),
+    re.compile(r'(?:pi|e)\b'),
+)
+
+CONVERSATION = re.compile(
+    r'\?|what|how|why|when|where|who|can you|help|tell me|explain'
+    r'|hello|hi|hey|thanks|thank you|please|sorry'
+)
+
+EQUATION_SIDE_CHARS = frozenset('xyz+-*/^()')
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    route: str          # 'function', 'alarm', 'math' or 'ai'
+    confidence: float   # 0..1, how clear-cut the classification was
+    reason: str         # which check decided
+
+
+class MessageRouter:
+    def classify(self, text: str) -> RouteDecision:
+        """
+        Decide how a free-text message is handled
+
+        Priority matches the handler: equation systems, function, then alarm time, then math, else AI.
+        """
+        lowered = text.lower()
+
+        if '=' in lowered and ((';' in lowered and lowered.count('=') > 1) or SOLVE_FOR.search(lowered)):
+            return RouteDecision('math', 0.95, 'equation_system')
+
+        if FUNCTION_NOTATION.search(lowered):
+            return RouteDecision('function', 0.95, 'function_notation')
+        if 'x' in lowered and FUNCTION_OF_X.search(lowered):
+            return RouteDecision('function', 0.8, 'function_of_x')
+
+        stripped = text.strip()
+        if ALARM_TIME.fullmatch(stripped):
+            return RouteDecision('alarm', 1.0, 'alarm_time')
+
+        math = self._classify_math(text, lowered, stripped)
+        if math:
+            return math
+
+        if CONVERSATION.search(lowered) or len(text.split()) > 3:
+            return RouteDecision('ai', 0.9, 'conversation')
+        return RouteDecision('ai', 0.5, 'fallback')
+
+    def _classify_math(self, text: str, lowered: str, stripped: str):
+        """RouteDecision if the text is math, otherwise None"""
+        if len(stripped) < 2:
+            return None
+
+        # Equations: both sides of a single '=' carry math-like characters
+        if '=' in text:
+            parts = text.split('=')
+            if len(parts) == 2:
+                left, right = parts[0].strip(), parts[1].strip()
+                if self._has_math_chars(left) and self._has_math_chars(right):
+                    return RouteDecision('math', 0.9, 'equation')
+
+        # Questions and longer sentences are conversation
+        if QUESTION_WORD.search(lowered):
+            return None
+        word_count = len(text.split())
+        if word_count > 10:
+            return None
+
+        if STRONG_MATH.search(lowered):
+            return RouteDecision('math', 0.85, 'strong_math')
+
+        if word_count <= 5:
+            weak_matches = 0
+            for pattern in WEAK_MATH:
+                if pattern.search(lowered):
+                    weak_matches += 1
+                    if weak_matches == 2:
+                        return RouteDecision('math', 0.6, 'weak_math')
+
+        return None
+
+    def _has_math_chars(self, side: str) -> bool:
+        return any(char.isdigit() or char in EQUATION_SIDE_CHARS for char in side)
+
+    def is_function_expression(self, text: str) -> bool:
+        return self.classify(text).route == 'function'
+
+    def is_math_expression(self, text: str) -> bool:
+        return self._classify_math(text, text.lower(), text.strip()) is not None
+
+    def is_alarm_time(self, text: str) -> bool:
+        return ALARM_TIME.fullmatch(text.strip()) is not None
+
+    def is_conversation(self, text: str) -> bool:
+        """True if the message is plain conversation rather than math, a function or a time"""
+        decision = self.classify(text)
+        return decision.route == 'ai' and decision.reason == 'conversation'
+
+# Global message router instance
+message_router = MessageRouter()
@@ -0,0 +1,292 @@
+"""
+Hybrid equation solving helpers
+sp.solve is tried first under a time budget (a SIGALRM timer in pool worker processes; the
+bot's process hands the call to such a pool); transcendental equations it cannot finish - cos(x) = x,
+x*sin(x) = 1 - fall back to numeric root finding: a vectorized numpy scan of a
+configurable interval for sign changes, refined with Brent's method.
+"""
+
+import math
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import Executor, TimeoutError as FutureTimeout
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import sympy as sp
+
+from config import Config
+
+# Brent's method stopping criteria
+BRENT_XTOL = 1e-14
+BRENT_RTOL = 4 * np.finfo(float).eps
+BRENT_MAX_ITERATIONS = 200
+# A refined root is accepted only if |f| there is tiny, absolutely or relative to the bracket
+# ends (steep functions); sign changes across poles (tan at pi/2) or jumps (floor) fail both
+ROOT_RESIDUAL_TOLERANCE = 1e-8
+BRACKET_RESIDUAL_RATIO = 1e-6
+# Candidates for touching roots (no sign change): scan values with |f| below this
+TANGENT_CANDIDATE_TOLERANCE = 1e-2
+# After the budget runs out the alarm repeats, in case SymPy swallowed the first one
+ALARM_REPEAT_INTERVAL = 0.05
+# Extra wait for a pool worker to report its own timeout before the caller gives up on it
+POOL_RESULT_GRACE = 1.0
+
+
+class SymbolicTimeout(Exception):
+    """sp.solve did not finish within the time budget"""
+
+
+class _AlarmExpired(BaseException):
+    """Raised from the SIGALRM handler; BaseException so SymPy's 'except Exception' can't swallow it"""
+
+
+def call_with_time_budget(timeout: float, function: Callable, *args, executor: Optional[Executor] = None):
+    """
+    function(*args) with a time budget
+
+    On the main thread of a pool worker process a SIGALRM timer interrupts the call,
+    which keeps SymPy's caches warm. The bot's own process never installs the handler
+    (its main thread runs the event loop) and never forks per call: it submits the call
+    to executor, a ProcessPoolExecutor whose workers take the SIGALRM path, and stops
+    waiting once the budget (plus POOL_RESULT_GRACE) has passed. Without an executor
+    the call runs inline, unbudgeted.
+
+    function and args must pickle when an executor is given.
+
+    Raises:
+        SymbolicTimeout: the budget ran out
+        NotImplementedError: the call failed (SymPy has no algorithm for it)
+    """
+    if timeout <= 0:
+        return function(*args)
+    if _in_worker_main_thread():
+        return _call_with_alarm(timeout, function, args)
+    if executor is None:
+        return function(*args)
+
+    future = executor.submit(call_with_time_budget, timeout, function, *args)
+    try:
+        return future.result(timeout + POOL_RESULT_GRACE)
+    except FutureTimeout:
+        future.cancel()  # still queued behind other solves; a running worker stops at its own alarm
+        raise SymbolicTimeout(f"symbolic solving did not finish within {timeout:g} s")
+
+
+def in_worker_process() -> bool:
+    """Running in a process started by multiprocessing (a ProcessPoolExecutor worker)"""
+    return multiprocessing.parent_process() is not None
+
+
+def _in_worker_main_thread() -> bool:
+    """A worker process started by multiprocessing (ProcessPoolExecutor), on its main thread"""
+    return (hasattr(signal, 'setitimer')
+            and in_worker_process()
+            and threading.current_thread() is threading.main_thread())
+
+
+def _call_with_alarm(timeout: float, function: Callable, args: tuple):
+    expired = False
+    active = True
+
+    def on_alarm(signum, frame):
+        nonlocal expired
+        if active:
+            expired = True
+            raise _AlarmExpired()
+
+    previous_handler = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout, ALARM_REPEAT_INTERVAL)
+    try:
+        result = function(*args)
+    except _AlarmExpired:
+        pass
+    except Exception as e:
+        if not expired:
+            raise NotImplementedError(str(e) or type(e).__name__)
+    finally:
+        active = False
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+    # Also when a bare 'except:' caught the alarm and the call returned a fallback
+    if expired:
+        raise SymbolicTimeout(f"symbolic solving did not finish within {timeout:g} s")
+    return result
+
+
+def solve_symbolic(expr: sp.Expr, var: sp.Symbol, timeout: float, executor: Optional[Executor] = None) -> list:
+    """sp.solve(expr, var) with a time budget (see call_with_time_budget)"""
+    return call_with_time_budget(timeout, sp.solve, expr, var, executor=executor)
+
+
+def _brent(f: Callable[[float], float], xpre: float, xcur: float, fpre: float, fcur: float) -> float:
+    """Brent's method (as in scipy's brentq) on a bracket with f(xpre), f(xcur) of opposite sign"""
+    xblk = fblk = spre = scur = 0.0
+    for _ in range(BRENT_MAX_ITERATIONS):
+        if fpre * fcur < 0:
+            xblk, fblk = xpre, fpre
+            spre = scur = xcur - xpre
+        if abs(fblk) < abs(fcur):
+            xpre, xcur, xblk = xcur, xblk, xcur
+            fpre, fcur, fblk = fcur, fblk, fcur
+
+        delta = (BRENT_XTOL + BRENT_RTOL * abs(xcur)) / 2
+        sbis = (xblk - xcur) / 2
+        if fcur == 0 or abs(sbis) < delta:
+            return xcur
+
+        if abs(spre) > delta and abs(fcur) < abs(fpre):
+            if xpre == xblk:
+                # secant
+                stry = -fcur * (xcur - xpre) / (fcur - fpre)
+            else:
+                # inverse quadratic interpolation
+                dpre = (fpre - fcur) / (xpre - xcur)
+                dblk = (fblk - fcur) / (xblk - xcur)
+                stry = -fcur * (fblk * dblk - fpre * dpre) / (dblk * dpre * (fblk - fpre))
+            if 2 * abs(stry) < min(abs(spre), 3 * abs(sbis) - delta):
+                spre, scur = scur, stry
+            else:
+                spre = scur = sbis
+        else:
+            spre = scur = sbis
+
+        xpre, fpre = xcur, fcur
+        xcur += scur if abs(scur) > delta else math.copysign(delta, sbis)
+        fcur = f(xcur)
+        if not math.isfinite(fcur):
+            return float('nan')
+    return xcur
+
+
+class NumericRootFinder:
+    def __init__(self, interval: Tuple[float, float] = None, scan_points: int = None, max_roots: int = None):
+        self.interval = interval or (Config.MATH_NUMERIC_INTERVAL_MIN, Config.MATH_NUMERIC_INTERVAL_MAX)
+        self.scan_points = scan_points or Config.MATH_NUMERIC_SCAN_POINTS
+        self.max_roots = max_roots or Config.MATH_NUMERIC_MAX_ROOTS
+
+    def find_roots(self, expr: sp.Expr, var: sp.Symbol) -> Tuple[List[float], int]:
+        """
+        Real roots of expr = 0 in the configured interval
+
+        Returns:
+            (roots, total_found) - at most max_roots roots, those closest to 0, sorted
+        """
+        if expr.has(sp.factorial):
+            expr = expr.rewrite(sp.gamma)  # defined between the integers too
+        function = self._vectorize(expr, var)
+        derivative = self._vectorize(sp.diff(expr, var), var)
+
+        low, high = self.interval
+        xs = np.linspace(low, high, self.scan_points)
+        ys = self._evaluate(function, xs)
+
+        roots = [float(x) for x in xs[ys == 0]]
+        roots.extend(self._sign_change_roots(function, xs, ys))
+        roots.extend(self._tangent_roots(function, derivative, xs, ys))
+        roots = self._deduplicate(roots)
+
+        total = len(roots)
+        if total > self.max_roots:
+            roots = sorted(sorted(roots, key=abs)[:self.max_roots])
+        return roots, total
+
+    def _vectorize(self, expr: sp.Expr, var: sp.Symbol) -> Callable:
+        numpy_function = sp.lambdify(var, expr, 'numpy')
+        try:
+            with np.errstate(all='ignore'):
+                numpy_function(np.linspace(0.5, 1.5, 3))
+            return numpy_function
+        except Exception:
+            # e.g. gamma has no numpy counterpart - evaluate point by point
+            math_function = sp.lambdify(var, expr, 'math')
+
+            def pointwise(values):
+                results = []
+                for value in np.atleast_1d(values):
+                    try:
+                        results.append(float(math_function(float(value))))
+                    except (ValueError, TypeError, OverflowError, ZeroDivisionError):
+                        results.append(float('nan'))
+                return np.array(results) if np.ndim(values) else results[0]
+            return pointwise
+
+    def _evaluate(self, function: Callable, xs: np.ndarray) -> np.ndarray:
+        """Real values of f over xs; complex, infinite or failed points are NaN"""
+        with np.errstate(all='ignore'):
+            try:
+                ys = np.broadcast_to(np.asarray(function(xs)), xs.shape)
+            except (ValueError, TypeError, ZeroDivisionError):
+                return np.full(xs.shape, np.nan)
+            if np.iscomplexobj(ys):
+                ys = np.where(np.abs(ys.imag) <= 1e-12 * np.maximum(1, np.abs(ys.real)), ys.real, np.nan)
+            ys = ys.astype(float)
+        ys[~np.isfinite(ys)] = np.nan
+        return ys
+
+    def _scalar(self, function: Callable) -> Callable[[float], float]:
+        def evaluate(x: float) -> float:
+            with np.errstate(all='ignore'):
+                try:
+                    value = complex(function(x))
+                except (ValueError, TypeError, ZeroDivisionError, OverflowError):
+                    return float('nan')
+            if abs(value.imag) > 1e-12 * max(1.0, abs(value.real)):
+                return float('nan')
+            return value.real
+        return evaluate
+
+    def _sign_change_roots(self, function: Callable, xs: np.ndarray, ys: np.ndarray) -> List[float]:
+        signs = np.sign(ys)
+        brackets = np.nonzero(signs[:-1] * signs[1:] < 0)[0]
+        f = self._scalar(function)
+        roots = []
+        for i in brackets:
+            a, b, fa, fb = float(xs[i]), float(xs[i + 1]), float(ys[i]), float(ys[i + 1])
+            root = _brent(f, a, b, fa, fb)
+            if not math.isfinite(root):
+                continue
+            residual = abs(f(root))
+            if residual <= ROOT_RESIDUAL_TOLERANCE or residual <= BRACKET_RESIDUAL_RATIO * max(abs(fa), abs(fb)):
+                roots.append(root)
+        return roots
+
+    def _tangent_roots(self, function: Callable, derivative: Callable, xs: np.ndarray, ys: np.ndarray) -> List[float]:
+        """Roots where f touches zero without crossing (sin(x) = 1): f' changes sign there"""
+        magnitude = np.abs(ys)
+        signs = np.sign(ys)
+        with np.errstate(invalid='ignore'):
+            candidates = np.nonzero(
+                (magnitude[1:-1] < TANGENT_CANDIDATE_TOLERANCE)
+                & (magnitude[1:-1] <= magnitude[:-2])
+                & (magnitude[1:-1] <= magnitude[2:])
+                & (signs[:-2] * signs[2:] > 0)
+            )[0] + 1
+        if len(candidates) == 0:
+            return []
+
+        f = self._scalar(function)
+        df = self._scalar(derivative)
+        roots = []
+        for i in candidates:
+            a, b = float(xs[i - 1]), float(xs[i + 1])
+            da, db = df(a), df(b)
+            if not (math.isfinite(da) and math.isfinite(db)) or da * db > 0:
+                continue
+            root = a if da == 0 else b if db == 0 else _brent(df, a, b, da, db)
+            if math.isfinite(root) and abs(f(root)) <= ROOT_RESIDUAL_TOLERANCE:
+                roots.append(root)
+        return roots
+
+    def _deduplicate(self, roots: List[float]) -> List[float]:
+        unique: List[float] = []
+        for root in sorted(roots):
+            if unique and abs(root - unique[-1]) <= 1e-9 * max(1.0, abs(root)):
+                continue
+            unique.append(0.0 if root == 0 else root)
+        return unique
+
+# Global numeric root finder instance
+numeric_root_finder = NumericRootFinder()
@@ -0,0 +1,214 @@
+"""
+OCR backends
+Each backend turns a batch of encoded images into (success, text, error) tuples.
+annotate_batch() is blocking and is always called from the OCR thread pool.
+"""
+
+import importlib.util
+import io
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional
+
+from config import Config
+from app.core.metrics import metrics, observe_latency, EXTERNAL_CALL_SECONDS, EXTERNAL_CALL_ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Google Cloud Vision is optional and slow to import - only check that it is installed
+# here, it is imported when the backend sets up its client
+try:
+    GOOGLE_VISION_AVAILABLE = importlib.util.find_spec("google.cloud.vision") is not None
+except ImportError:
+    GOOGLE_VISION_AVAILABLE = False
+
+# Try to import Tesseract bindings - make it optional
+try:
+    import pytesseract
+    TESSERACT_AVAILABLE = True
+except ImportError:
+    TESSERACT_AVAILABLE = False
+    pytesseract = None
+
+OCRResult = Tuple[bool, str, str]
+
+
+class OCRBackend(ABC):
+    """Base class for OCR engines"""
+
+    name = "base"
+    max_batch_size = 16
+
+    def __init__(self):
+        self.is_available = False
+
+    @abstractmethod
+    def annotate_batch(self, images: List[bytes]) -> List[OCRResult]:
+        """One result per image, in order (blocking)"""
+
+    def shutdown(self):
+        """Release worker processes or clients (nothing by default)"""
+
+
+class GoogleVisionBackend(OCRBackend):
+    """Google Cloud Vision TEXT_DETECTION via batch_annotate_images"""
+
+    name = "google"
+    max_batch_size = 16  # Vision limit for synchronous batch requests
+
+    def __init__(self):
+        super().__init__()
+        self.client = None
+        self.vision = None
+        self._setup_client()
+
+    def _setup_client(self):
+        """Setup Google Cloud Vision client"""
+        try:
+            # Check if Google Cloud Vision library is available
+            if not GOOGLE_VISION_AVAILABLE:
+                logger.warning("⚠️ Google Cloud Vision library not installed "
+                               "(to enable it: pip install google-cloud-vision)")
+                return
+
+            # Check if Google Cloud credentials are available
+            credentials_path = getattr(Config, 'GOOGLE_CLOUD_CREDENTIALS_PATH', None)
+
+            if credentials_path and os.path.exists(credentials_path):
+                from google.cloud import vision
+                os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
+                self.vision = vision
+                self.client = vision.ImageAnnotatorClient()
+                self.is_available = True
+                logger.info("✅ Google Cloud Vision OCR enabled")
+            else:
+                logger.warning("⚠️ Google Cloud Vision credentials not found "
+                               "(to enable it, set GOOGLE_CLOUD_CREDENTIALS_PATH in your .env file)")
+
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to initialize Google Cloud Vision: {e}")
+
+    @observe_latency(EXTERNAL_CALL_SECONDS, EXTERNAL_CALL_ERRORS, service="vision", operation="batch_annotate_images")
+    def annotate_batch(self, images: List[bytes]) -> List[OCRResult]:
+        vision = self.vision
+        requests = [
+            vision.AnnotateImageRequest(
+                image=vision.Image(content=bytes(image)),
+                features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)]
+            )
+            for image in images
+        ]
+        response = self.client.batch_annotate_images(requests=requests)
+        return [self._parse_text_response(item) for item in response.responses]
+
+    def _parse_text_response(self, response) -> OCRResult:
+        """Turn a single AnnotateImageResponse into (success, extracted_text, error_message)"""
+        # Check for errors
+        if response.error.message:
+            return False, "", f"Vision API error: {response.error.message}"
+
+        # Extract text annotations
+        texts = response.text_annotations
+
+        if not texts:
+            return False, "", "No text detected in the image."
+
+        # Get the full text (first annotation contains all detected text)
+        extracted_text = texts[0].description.strip()
+
+        if not extracted_text:
+            return False, "", "No readable text found in the image."
+
+        return True, extracted_text, ""
+
+
+def _tesseract_image_to_text(image_data: bytes, config: str) -> OCRResult:
+    """Run Tesseract on one image (executes inside a worker process)"""
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        text = pytesseract.image_to_string(image, config=config).strip()
+    except Exception as e:
+        return False, "", f"Tesseract error: {e}"
+
+    if not text:
+        return False, "", "No text detected in the image."
+    return True, text, ""
+
+
+class TesseractBackend(OCRBackend):
+    """Local, offline Tesseract OCR in a process pool (CPU-bound, so not threads)"""
+
+    name = "tesseract"
+    max_batch_size = 16
+
+    def __init__(self):
+        super().__init__()
+        self.config = Config.OCR_TESSERACT_CONFIG
+        self.workers = Config.OCR_TESSERACT_WORKERS
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+        if not TESSERACT_AVAILABLE:
+            logger.warning("⚠️ pytesseract not installed (to enable local OCR: pip install pytesseract "
+                           "and the tesseract-ocr package)")
+            return
+
+        try:
+            version = pytesseract.get_tesseract_version()
+            self.is_available = True
+            logger.info(f"✅ Tesseract OCR enabled (v{version}, {self.workers} workers)")
+        except Exception as e:
+            logger.warning(f"⚠️ Tesseract binary not found: {e}")
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        # Created on first use so importing the service never forks worker processes;
+        # several OCR threads can get here at once
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = metrics.track_executor(
+                        "tesseract", ProcessPoolExecutor(max_workers=self.workers), self.workers
+                    )
+        return self._pool
+
+    def annotate_batch(self, images: List[bytes]) -> List[OCRResult]:
+        futures = [self.pool.submit(_tesseract_image_to_text, bytes(image), self.config) for image in images]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+def create_ocr_backend(name: str = None) -> Optional[OCRBackend]:
+    """
+    Build the OCR backend selected by Config.OCR_BACKEND
+
+    'google' and 'tesseract' select one engine; 'auto' prefers Google Cloud Vision
+    and falls back to local Tesseract. Returns None when nothing is usable.
+    """
+    name = (name or Config.OCR_BACKEND).lower()
+    candidates = {
+        'google': [GoogleVisionBackend],
+        'tesseract': [TesseractBackend],
+        'auto': [GoogleVisionBackend, TesseractBackend],
+    }.get(name)
+
+    if candidates is None:
+        logger.warning(f"⚠️ Unknown OCR_BACKEND '{name}' - OCR disabled")
+        return None
+
+    for backend_class in candidates:
+        backend = backend_class()
+        if backend.is_available:
+            return backend
+
+    return None
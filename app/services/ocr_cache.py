@@ -0,0 +1,175 @@
+"""
+Two-level OCR result cache
+Level 1 is keyed by Telegram's file_unique_id (a hit needs no download at all),
+level 2 by an exact hash of the preprocessed image (the same picture uploaded
+again under a new file id). Level 2 is exact on purpose: math photos that differ
+in one digit are near-duplicates to any perceptual hash. Both levels live in a
+bounded in-memory LRU backed by a capped MongoDB collection, so entries survive
+restarts and the store stays bounded.
+
+Lookups and stores run on the OCR thread pool: the LRUs and stats are only touched
+under a lock, and the collection is set up once under its own.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+import pytz
+from pymongo import DESCENDING
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from config import Config
+
+# MongoDB error code of create_collection on a name that exists
+NAMESPACE_EXISTS = 48
+
+
+class OCRCache:
+    def __init__(self, memory_entries: int = None):
+        self.memory_entries = memory_entries or Config.OCR_CACHE_MEMORY_ENTRIES
+        self.timezone = pytz.timezone(Config.TIMEZONE)
+
+        self.by_file_id = OrderedDict()  # {file_unique_id: text}
+        self.by_image_hash = OrderedDict()  # {image_hash: text}
+
+        self._lock = threading.Lock()  # LRUs and stats
+        self._collection = None
+        self._collection_failed = False
+        self._collection_lock = threading.Lock()
+
+        self.stats = {'file_id_hits': 0, 'image_hash_hits': 0, 'misses': 0, 'stores': 0}
+
+    @property
+    def collection(self):
+        """Capped MongoDB collection, created on first use"""
+        if self._collection is None and not self._collection_failed:
+            with self._collection_lock:
+                if self._collection is None and not self._collection_failed:
+                    self._setup_collection()
+        return self._collection
+
+    def _setup_collection(self):
+        try:
+            from app.models.database import db_manager
+
+            db = db_manager.db
+            name = Config.OCR_CACHE_COLLECTION
+            if name not in db.list_collection_names():
+                try:
+                    db.create_collection(
+                        name,
+                        capped=True,
+                        size=Config.OCR_CACHE_MAX_BYTES,
+                        max=Config.OCR_CACHE_MAX_DOCUMENTS
+                    )
+                except CollectionInvalid:
+                    pass  # another bot instance created it first
+                except OperationFailure as e:
+                    if e.code != NAMESPACE_EXISTS:
+                        raise
+            collection = db[name]
+            collection.create_index("file_unique_id")
+            collection.create_index("image_hash")
+            self._collection = collection
+        except Exception as e:
+            print(f"⚠️ OCR cache persistence disabled: {e}")
+            self._collection_failed = True
+
+    def _recall(self, store: OrderedDict, key) -> Optional[str]:
+        with self._lock:
+            return store.get(key)
+
+    def _remember(self, store: OrderedDict, key, text: str, stat: str):
+        with self._lock:
+            self._put(store, key, text)
+            self.stats[stat] += 1
+
+    def _put(self, store: OrderedDict, key, text: str):
+        """Insert into an LRU (the caller holds the lock)"""
+        store[key] = text
+        store.move_to_end(key)
+        while len(store) > self.memory_entries:
+            store.popitem(last=False)
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def get_by_file_id(self, file_unique_id: str) -> Optional[str]:
+        """Level 1 lookup (blocking when it falls through to MongoDB)"""
+        if not file_unique_id:
+            return None
+
+        text = self._recall(self.by_file_id, file_unique_id)
+        if text is None and self.collection is not None:
+            try:
+                doc = self.collection.find_one(
+                    {"file_unique_id": file_unique_id},
+                    sort=[("$natural", DESCENDING)]
+                )
+                if doc:
+                    text = doc["text"]
+            except Exception as e:
+                print(f"⚠️ OCR cache lookup failed: {e}")
+
+        if text is None:
+            return None
+
+        self._remember(self.by_file_id, file_unique_id, text, 'file_id_hits')
+        return text
+
+    def get_by_image_hash(self, image_hash: str) -> Optional[str]:
+        """Level 2 lookup (blocking when it falls through to MongoDB)"""
+        if image_hash is None:
+            return None
+
+        text = self._recall(self.by_image_hash, image_hash)
+        if text is None and self.collection is not None:
+            try:
+                doc = self.collection.find_one({"image_hash": image_hash}, sort=[("$natural", DESCENDING)])
+                if doc:
+                    text = doc["text"]
+            except Exception as e:
+                print(f"⚠️ OCR cache lookup failed: {e}")
+
+        if text is None:
+            self._count('misses')
+            return None
+
+        self._remember(self.by_image_hash, image_hash, text, 'image_hash_hits')
+        return text
+
+    def store(self, text: str, file_unique_id: str = None, image_hash: str = None):
+        """Remember a successful OCR result under both keys"""
+        with self._lock:
+            if file_unique_id:
+                self._put(self.by_file_id, file_unique_id, text)
+            if image_hash is not None:
+                self._put(self.by_image_hash, image_hash, text)
+            self.stats['stores'] += 1
+
+        if self.collection is not None:
+            try:
+                self.collection.insert_one({
+                    "file_unique_id": file_unique_id,
+                    "image_hash": image_hash,
+                    "text": text,
+                    "created_at": datetime.now(self.timezone)
+                })
+            except Exception as e:
+                print(f"⚠️ OCR cache store failed: {e}")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            memory_entries = len(self.by_file_id) + len(self.by_image_hash)
+        lookups = stats['file_id_hits'] + stats['image_hash_hits'] + stats['misses']
+        hits = stats['file_id_hits'] + stats['image_hash_hits']
+        return {
+            **stats,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'memory_entries': memory_entries,
+            'persistent': self._collection is not None,
+        }
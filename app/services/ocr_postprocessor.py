@@ -0,0 +1,138 @@
+"""
+Math-aware cleanup of OCR output
+Tokenizes the extracted text once and fixes the usual OCR confusions in context
+(multiplication signs, superscripts, letters read inside numbers) instead of
+blind string replacement, so variables like x are left alone.
+"""
+
+import re
+from typing import List, Tuple
+
+# Single characters that map 1:1 to ASCII math
+CHARACTER_MAP = str.maketrans({
+    '×': '*', '·': '*', '∙': '*', '⋅': '*', '✕': '*',
+    '÷': '/', '∕': '/',
+    '−': '-', '–': '-', '—': '-', '‒': '-',
+    '（': '(', '）': ')',
+    '＝': '=', '＋': '+',
+})
+
+WORD_MAP = {
+    'π': 'pi',
+    '∞': 'infinity',
+}
+
+SUPERSCRIPTS = {
+    '⁰': '0', '¹': '1', '²': '2', '³': '3', '⁴': '4',
+    '⁵': '5', '⁶': '6', '⁷': '7', '⁸': '8', '⁹': '9',
+    '⁻': '-', '⁺': '+',
+}
+
+# Letters OCR engines commonly read in place of digits
+DIGIT_LOOKALIKES = str.maketrans({'O': '0', 'o': '0', 'l': '1', 'I': '1'})
+
+SUPERSCRIPT_RUN = re.compile('[' + ''.join(SUPERSCRIPTS) + ']+')
+TRAILING_EQUALS = re.compile(r'\s*=\s*\?*\s*$')
+
+TOKEN_PATTERN = re.compile(r"""
+    (?P<suspect>(?<![A-Za-z0-9])[0-9OolI]*[0-9][0-9OolI]*(?:\.[0-9]+)?(?![A-Za-z0-9]))
+  | (?P<number>[0-9]+(?:\.[0-9]*)?|\.[0-9]+)
+  | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+  | (?P<space>\s+)
+  | (?P<op>.)
+""", re.VERBOSE)
+
+
+class MathTextPostProcessor:
+    def __init__(self):
+        self.multiplication_letters = {'x', 'X'}
+
+    def clean(self, text: str) -> str:
+        """
+        Turn raw OCR text into something the math solver can parse
+
+        Args:
+            text: Raw extracted text
+
+        Returns:
+            Cleaned text suitable for math processing
+        """
+        text = text.translate(CHARACTER_MAP)
+        for symbol, word in WORD_MAP.items():
+            text = text.replace(symbol, word)
+        text = SUPERSCRIPT_RUN.sub(self._superscript_to_power, text)
+
+        tokens = self._tokenize(text)
+        tokens = self._fix_multiplication(tokens)
+        tokens = self._fix_square_roots(tokens)
+
+        cleaned = ''.join(' ' if kind == 'space' else value for kind, value in tokens).strip()
+
+        # "2 + 3 =" and "2 + 3 = ?" are questions, not equations
+        return TRAILING_EQUALS.sub('', cleaned)
+
+    def _superscript_to_power(self, match) -> str:
+        exponent = ''.join(SUPERSCRIPTS[char] for char in match.group())
+        return f"^{exponent}" if exponent.isdigit() else f"^({exponent})"
+
+    def _tokenize(self, text: str) -> List[Tuple[str, str]]:
+        tokens = []
+        for match in TOKEN_PATTERN.finditer(text):
+            kind = match.lastgroup
+            value = match.group()
+            if kind == 'suspect':
+                # Digits with look-alike letters mixed in: "1O5" -> "105"
+                kind, value = 'number', value.translate(DIGIT_LOOKALIKES)
+            tokens.append((kind, value))
+        return tokens
+
+    def _fix_multiplication(self, tokens: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """x/X between two numbers is a times sign, anywhere else it is a variable"""
+        result = []
+        for index, (kind, value) in enumerate(tokens):
+            if kind == 'name' and self._previous_kind(result) == 'number':
+                if value in self.multiplication_letters and self._next_kind(tokens, index) == 'number':
+                    result.append(('op', '*'))
+                    continue
+                # "2x3" is tokenized as 2, x3
+                if value[0] in self.multiplication_letters and value[1:].isdigit():
+                    result.extend([('op', '*'), ('number', value[1:])])
+                    continue
+            result.append((kind, value))
+        return result
+
+    def _fix_square_roots(self, tokens: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """√9 -> sqrt(9), √(x+1) -> sqrt(x+1)"""
+        result = []
+        index = 0
+        while index < len(tokens):
+            kind, value = tokens[index]
+            if kind == 'op' and value == '√':
+                result.append(('name', 'sqrt'))
+                following = index + 1
+                while following < len(tokens) and tokens[following][0] == 'space':
+                    following += 1
+                if following < len(tokens) and tokens[following][0] in ('number', 'name'):
+                    result.extend([('op', '('), tokens[following], ('op', ')')])
+                    index = following
+                else:
+                    index = following - 1
+            else:
+                result.append((kind, value))
+            index += 1
+        return result
+
+    def _previous_kind(self, tokens: List[Tuple[str, str]]) -> str:
+        for kind, _ in reversed(tokens):
+            if kind != 'space':
+                return kind
+        return ''
+
+    def _next_kind(self, tokens: List[Tuple[str, str]], index: int) -> str:
+        for kind, _ in tokens[index + 1:]:
+            if kind != 'space':
+                return kind
+        return ''
+
+# Global post-processor instance
+math_postprocessor = MathTextPostProcessor()
@@ -1,60 +1,58 @@
 """
-OCR Service using Google Cloud Vision API
-Extracts text from images, especially math calculations and numbers
+OCR Service
+Extracts text from images, especially math calculations and numbers.
+The engine (Google Cloud Vision or local Tesseract) is chosen by Config.OCR_BACKEND.
 """
 
-import os
 import io
 import asyncio
-from typing import Optional, Tuple
+import logging
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, List
 from PIL import Image
 import tempfile
 import aiofiles
 
 from config import Config
+from app.core.lazy import LazyService
+from app.core.metrics import metrics, observe_latency, EXTERNAL_CALL_SECONDS, EXTERNAL_CALL_ERRORS
+from app.core.tracing import traced
+from app.services.image_preprocessor import image_preprocessor, content_hash
+from app.services.ocr_backends import create_ocr_backend
+from app.services.ocr_cache import OCRCache
+from app.services.ocr_postprocessor import math_postprocessor
 
-# Try to import Google Cloud Vision - make it optional
-try:
-    from google.cloud import vision
-    GOOGLE_VISION_AVAILABLE = True
-except ImportError:
-    GOOGLE_VISION_AVAILABLE = False
-    vision = None
+logger = logging.getLogger(__name__)
 
 class OCRService:
     def __init__(self):
-        """Initialize OCR service with Google Cloud Vision API"""
-        self.client = None
-        self.is_enabled = False
-        self._setup_client()
-    
-    def _setup_client(self):
-        """Setup Google Cloud Vision client"""
-        try:
-            # Check if Google Cloud Vision library is available
-            if not GOOGLE_VISION_AVAILABLE:
-                print("⚠️ Google Cloud Vision library not installed - OCR disabled")
-                print("   To enable OCR, install: pip install google-cloud-vision")
-                self.is_enabled = False
-                return
-
-            # Check if Google Cloud credentials are available
-            credentials_path = getattr(Config, 'GOOGLE_CLOUD_CREDENTIALS_PATH', None)
-
-            if credentials_path and os.path.exists(credentials_path):
-                os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
-                self.client = vision.ImageAnnotatorClient()
-                self.is_enabled = True
-                print("✅ Google Cloud Vision OCR enabled")
-            else:
-                print("⚠️ Google Cloud Vision credentials not found - OCR disabled")
-                print("   To enable OCR, set GOOGLE_CLOUD_CREDENTIALS_PATH in your .env file")
-                self.is_enabled = False
+        """Initialize OCR service with the configured OCR backend"""
+        self.backend = create_ocr_backend()
+        self.is_enabled = self.backend is not None
+        if not self.is_enabled:
+            logger.warning("⚠️ No OCR backend available - OCR disabled")
 
-        except Exception as e:
-            print(f"⚠️ Failed to initialize Google Cloud Vision: {e}")
-            self.is_enabled = False
-    
+        # OCR calls are blocking (network round-trips or CPU) - run them off the event loop,
+        # micro-batching concurrent photos into one backend call
+        self.batch_max_size = Config.OCR_BATCH_MAX_SIZE
+        if self.backend is not None:
+            self.batch_max_size = min(self.batch_max_size, self.backend.max_batch_size)
+        self.batch_linger = Config.OCR_BATCH_LINGER_MS / 1000.0
+        self._executor = metrics.track_executor(
+            "ocr",
+            ThreadPoolExecutor(max_workers=Config.OCR_EXECUTOR_WORKERS, thread_name_prefix="ocr"),
+            Config.OCR_EXECUTOR_WORKERS
+        )
+        self._pending = []  # [(image_bytes, future)] waiting for the next batch
+        self._flush_handle = None
+        self._batch_tasks = set()  # strong references to in-flight batch tasks
+        self.batch_stats = {'batches': 0, 'images': 0, 'largest_batch': 0}
+
+        # Results keyed by Telegram file_unique_id and by a hash of the preprocessed image
+        self.cache = OCRCache()
+
+    @traced("ocr.extract")
     async def extract_text_from_image(self, image_data: bytes) -> Tuple[bool, str, str]:
         """
         Extract text from image data
@@ -66,56 +64,221 @@ class OCRService:
             Tuple of (success, extracted_text, error_message)
         """
         if not self.is_enabled:
-            return False, "", "OCR service is not available. Google Cloud Vision API not configured."
+            return False, "", "OCR service is not available. No OCR backend configured."
         
         try:
-            # Create Vision API image object
-            image = vision.Image(content=image_data)
-            
-            # Perform text detection
-            response = self.client.text_detection(image=image)
-            
-            # Check for errors
-            if response.error.message:
-                return False, "", f"Vision API error: {response.error.message}"
-            
-            # Extract text annotations
-            texts = response.text_annotations
-            
-            if not texts:
-                return False, "", "No text detected in the image."
-            
-            # Get the full text (first annotation contains all detected text)
-            extracted_text = texts[0].description.strip()
-            
-            if not extracted_text:
-                return False, "", "No readable text found in the image."
-            
-            return True, extracted_text, ""
-            
+            # Queue the image for the next batch and wait for its own result
+            return await self._submit_to_batch(image_data)
+
         except Exception as e:
             return False, "", f"Error processing image: {str(e)}"
-    
-    async def process_telegram_photo(self, photo_file) -> Tuple[bool, str, str]:
+
+    async def _submit_to_batch(self, image_data: bytes) -> Tuple[bool, str, str]:
+        """Add an image to the pending batch and await its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((image_data, future))
+
+        if len(self._pending) >= self.batch_max_size:
+            self._flush_batch()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_linger, self._flush_batch)
+
+        return await future
+
+    def _flush_batch(self):
+        """Send everything pending as one batch (called on the event loop)"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending[:self.batch_max_size], self._pending[self.batch_max_size:]
+        if self._pending:
+            # More than one batch worth queued up - schedule the remainder right away
+            self._flush_handle = asyncio.get_running_loop().call_soon(self._flush_batch)
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[bytes, asyncio.Future]]):
+        """Run one backend batch call in the executor and fan results back out"""
+        loop = asyncio.get_running_loop()
+        images = [image for image, _ in batch]
+
+        self.batch_stats['batches'] += 1
+        self.batch_stats['images'] += len(images)
+        self.batch_stats['largest_batch'] = max(self.batch_stats['largest_batch'], len(images))
+
+        try:
+            results = await loop.run_in_executor(self._executor, self.backend.annotate_batch, images)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def process_photo_message(self, bot, photo_sizes) -> Tuple[bool, str, str]:
+        """
+        Extract text from a Telegram photo message, using the OCR cache
+
+        Args:
+            bot: Telegram bot used to resolve the file
+            photo_sizes: update.message.photo (list of PhotoSize, smallest first)
+
+        Returns:
+            Tuple of (success, extracted_text, error_message)
+        """
+        photo = self.select_photo_size(photo_sizes)
+        if photo is None:
+            limit_mb = Config.OCR_MAX_DOWNLOAD_BYTES / (1024 * 1024)
+            return False, "", f"Photo is too large to process (limit {limit_mb:.0f} MB)."
+
+        # Level 1: the exact same Telegram file was already read - no download needed
+        cached_text = await self._run_blocking(self.cache.get_by_file_id, photo.file_unique_id)
+        if cached_text:
+            return True, cached_text, ""
+
+        photo_file = await bot.get_file(photo.file_id)
+        return await self.process_telegram_photo(photo_file, file_unique_id=photo.file_unique_id)
+
+    def select_photo_size(self, photo_sizes):
+        """
+        Pick the smallest photo size whose longer side reaches the OCR target
+
+        Preprocessing downscales to OCR_TARGET_MAX_SIDE anyway, so larger sizes only
+        cost bandwidth and memory. Sizes over the download cap are never chosen;
+        if none reaches the target, the largest allowed one is used.
+        """
+        allowed = [
+            photo for photo in photo_sizes
+            if not photo.file_size or photo.file_size <= Config.OCR_MAX_DOWNLOAD_BYTES
+        ]
+        if not allowed:
+            return None
+
+        for photo in sorted(allowed, key=lambda size: size.width * size.height):
+            if max(photo.width, photo.height) >= Config.OCR_TARGET_MAX_SIDE:
+                return photo
+        return max(allowed, key=lambda size: size.width * size.height)
+
+    @traced("ocr.download")
+    @observe_latency(EXTERNAL_CALL_SECONDS, EXTERNAL_CALL_ERRORS, service="telegram", operation="downloadFile")
+    async def download_photo(self, photo_file) -> memoryview:
+        """
+        Stream a Telegram file into one preallocated buffer with a hard byte cap
+
+        Returns:
+            Zero-copy memoryview over the downloaded bytes
+        """
+        max_bytes = Config.OCR_MAX_DOWNLOAD_BYTES
+        expected = photo_file.file_size or 0
+        if expected > max_bytes:
+            raise ValueError(f"photo is {expected} bytes, limit is {max_bytes}")
+
+        file_path = photo_file.file_path or ""
+        if not file_path.startswith(("http://", "https://")):
+            # Local Bot API server mode: the file is already on disk
+            data = await photo_file.download_as_bytearray()
+            if len(data) > max_bytes:
+                raise ValueError(f"photo is {len(data)} bytes, limit is {max_bytes}")
+            return memoryview(data)
+
+        # file_size is known for photos, so the buffer is normally allocated exactly once
+        buffer = bytearray(expected or Config.OCR_DOWNLOAD_CHUNK_BYTES)
+        received = 0
+
+        timeout = aiohttp.ClientTimeout(total=Config.OCR_DOWNLOAD_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(file_path) as response:
+                if response.status != 200:
+                    raise ValueError(f"download failed with HTTP {response.status}")
+
+                async for chunk in response.content.iter_chunked(Config.OCR_DOWNLOAD_CHUNK_BYTES):
+                    end = received + len(chunk)
+                    if end > max_bytes:
+                        raise ValueError(f"photo exceeds the {max_bytes} byte limit")
+                    if end > len(buffer):
+                        # Size was unknown or wrong - grow geometrically, never past the cap
+                        buffer.extend(bytes(min(max(end, 2 * len(buffer)), max_bytes) - len(buffer)))
+                    buffer[received:end] = chunk
+                    received = end
+
+        return memoryview(buffer)[:received]
+
+    async def process_telegram_photo(self, photo_file, file_unique_id: str = None) -> Tuple[bool, str, str]:
         """
         Process a photo from Telegram and extract text
         
         Args:
             photo_file: Telegram photo file object
+            file_unique_id: Telegram file_unique_id, used as the level 1 cache key
             
         Returns:
             Tuple of (success, extracted_text, error_message)
         """
         try:
-            # Download the photo to memory
-            photo_bytes = await photo_file.download_as_bytearray()
-            
+            # Stream the photo into a capped buffer (no intermediate copies)
+            photo_bytes = await self.download_photo(photo_file)
+
+            # Shrink/clean the image before it is handed to the OCR backend
+            image_data, image_hash = await self.preprocess_image(photo_bytes)
+            del photo_bytes  # release the download buffer before OCR
+
+            # Level 2: the same image was already read under another file id. Not written
+            # back under this file id - level 1 only ever holds text read from that file.
+            cached_text = await self._run_blocking(self.cache.get_by_image_hash, image_hash)
+            if cached_text:
+                return True, cached_text, ""
+
             # Extract text from the image
-            return await self.extract_text_from_image(bytes(photo_bytes))
+            success, extracted_text, error_message = await self.extract_text_from_image(image_data)
+
+            if success:
+                await self._run_blocking(self.cache.store, extracted_text, file_unique_id, image_hash)
+
+            return success, extracted_text, error_message
             
         except Exception as e:
             return False, "", f"Error downloading or processing photo: {str(e)}"
     
+    @traced("ocr.preprocess")
+    async def preprocess_image(self, image_data) -> Tuple[bytes, Optional[str]]:
+        """
+        Run the preprocessing pipeline in the executor
+
+        Returns:
+            Tuple of (image_bytes, image_hash). Falls back to the original bytes
+            if preprocessing is disabled or fails; the hash is None if it cannot be computed.
+        """
+        if Config.OCR_PREPROCESS:
+            try:
+                processed, info = await self._run_blocking(image_preprocessor.preprocess, image_data)
+                return processed, info['image_hash']
+            except Exception as e:
+                logger.warning(f"⚠️ Image preprocessing failed, sending original image: {e}")
+
+        try:
+            image_hash = await self._run_blocking(content_hash, image_data)
+        except Exception:
+            image_hash = None
+        return bytes(image_data), image_hash
+
+    def shutdown(self):
+        """Stop the backend's worker processes and the OCR threads"""
+        if self.backend is not None:
+            self.backend.shutdown()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run_blocking(self, func, *args):
+        """Run a blocking call (PIL work, cache lookups in MongoDB) in the OCR executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
     def is_math_related(self, text: str) -> bool:
         """
         Check if extracted text contains math-related content
@@ -154,29 +317,30 @@ class OCRService:
         Returns:
             Cleaned text suitable for math processing
         """
-        # Remove extra whitespace and newlines
-        cleaned = ' '.join(text.split())
-        
-        # Common OCR corrections for math symbols
-        replacements = {
-            'x': '*',  # Only replace standalone x that might be multiplication
-            '×': '*',
-            '÷': '/',
-            '−': '-',  # Unicode minus to ASCII minus
-            '–': '-',  # En dash to minus
-            '—': '-',  # Em dash to minus
-            '²': '^2',
-            '³': '^3',
-            'π': 'pi',
-            '∞': 'infinity',
-        }
-        
-        # Apply replacements carefully
-        for old, new in replacements.items():
-            if old in cleaned:
-                cleaned = cleaned.replace(old, new)
-        
-        return cleaned.strip()
+        return math_postprocessor.clean(text)
 
 # Global OCR service instance
-ocr_service = OCRService()
+ocr_service = LazyService(OCRService, 'ocr')
+
+
+def _collect_ocr_metrics():
+    """OCR batch queue depth and cache hit rate for /metrics (nothing until the service exists)"""
+    if not ocr_service.initialized:
+        return []
+    service = ocr_service.instance()
+    cache = service.cache.get_stats()
+    return [
+        ("mathbot_ocr_pending_images", "gauge", "Images waiting for the next OCR batch",
+         [({}, len(service._pending))]),
+        ("mathbot_ocr_batches_total", "counter", "OCR backend batch calls",
+         [({}, service.batch_stats['batches'])]),
+        ("mathbot_ocr_images_total", "counter", "Images sent to the OCR backend",
+         [({}, service.batch_stats['images'])]),
+        ("mathbot_ocr_cache_lookups_total", "counter", "OCR cache lookups by result",
+         [({"result": "file_id_hit"}, cache['file_id_hits']), ({"result": "image_hash_hit"}, cache['image_hash_hits']),
+          ({"result": "miss"}, cache['misses'])]),
+        ("mathbot_ocr_cache_hit_ratio", "gauge", "Share of OCR cache lookups that hit",
+         [({}, cache['hit_rate'])]),
+    ]
+
+metrics.register_collector(_collect_ocr_metrics)
@@ -12,6 +12,8 @@ import io
 from PIL import Image as PILImage
 
 from config import Config
+from app.core.lazy import LazyService
+from app.core.metrics import observe_latency, MATH_PHASE_SECONDS
 
 class PDFGenerator:
     def __init__(self):
@@ -22,6 +24,7 @@ class PDFGenerator:
         # Ensure temp directory exists
         os.makedirs(Config.TEMP_DIR, exist_ok=True)
     
+    @observe_latency(MATH_PHASE_SECONDS, phase="pdf")
     def generate_math_pdf(self, expression: str, result: str, steps: str = None, user_id: int = None) -> str:
         """Generate PDF for math expression solution"""
         filename = f"{Config.TEMP_DIR}/math_solution_{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
@@ -74,6 +77,7 @@ class PDFGenerator:
             print(f"Error generating math PDF: {e}")
             return None
     
+    @observe_latency(MATH_PHASE_SECONDS, phase="pdf")
     def generate_function_pdf(self, analysis: dict, graph_base64: str = None, user_id: int = None) -> str:
         """Generate PDF for function analysis with complete step-by-step structure"""
         filename = f"{Config.TEMP_DIR}/function_analysis_{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
@@ -341,4 +345,4 @@ class PDFGenerator:
             return {"files": 0, "size": 0}
 
 # Global PDF generator instance
-pdf_generator = PDFGenerator()
+pdf_generator = LazyService(PDFGenerator, 'pdf_generator')
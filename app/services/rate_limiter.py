@@ -0,0 +1,119 @@
+"""
+Admission control for outbound AI provider calls
+Bounds concurrent requests per provider and how often a single user can call the AI
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of being sent to a provider"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class TokenBucket:
+    """Per-key token bucket (one bucket per user)"""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = 10000):
+        self.rate = rate_per_minute / 60.0  # tokens per second
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: Dict[int, Tuple[float, float]] = {}  # {key: (tokens, last_refill)}
+
+    def consume(self, key: int, tokens: float = 1.0) -> bool:
+        """Take tokens from the key's bucket, returns False if the bucket is empty"""
+        now = time.monotonic()
+        available = self._available(key, now)
+
+        if available < tokens:
+            self.buckets[key] = (available, now)
+            return False
+
+        self.buckets[key] = (available - tokens, now)
+
+        if len(self.buckets) > self.max_keys:
+            self._prune(now)
+        return True
+
+    def retry_after(self, key: int, tokens: float = 1.0) -> float:
+        """Seconds until consume(key, tokens) can succeed, 0 if it can now"""
+        missing = tokens - self._available(key, time.monotonic())
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else float('inf')
+
+    def _available(self, key: int, now: float) -> float:
+        available, last = self.buckets.get(key, (float(self.burst), now))
+        return min(float(self.burst), available + (now - last) * self.rate)
+
+    def _prune(self, now: float):
+        """Drop buckets that have refilled completely (they behave like new ones)"""
+        refill_time = self.burst / self.rate if self.rate > 0 else float('inf')
+        stale = [key for key, (_, last) in self.buckets.items() if now - last >= refill_time]
+        for key in stale:
+            del self.buckets[key]
+
+
+class AdmissionController:
+    """Global per-provider concurrency limits plus a per-user rate limit"""
+
+    def __init__(self, provider_limits: Dict[str, int], user_rate_per_minute: float,
+                 user_burst: int, queue_timeout: float):
+        self.provider_limits = dict(provider_limits)
+        self.semaphores = {name: asyncio.Semaphore(limit) for name, limit in provider_limits.items()}
+        self.in_flight = {name: 0 for name in provider_limits}
+        self.waiting = {name: 0 for name in provider_limits}
+        self.user_buckets = TokenBucket(user_rate_per_minute, user_burst)
+        self.queue_timeout = queue_timeout
+        self.shed_count = {'user_rate': 0, 'queue_timeout': 0}
+
+    def allow_user(self, user_id: int) -> bool:
+        """Check the user's token bucket before any provider is contacted"""
+        allowed = self.user_buckets.consume(user_id)
+        if not allowed:
+            self.shed_count['user_rate'] += 1
+        return allowed
+
+    @asynccontextmanager
+    async def provider_slot(self, provider: str, timeout: Optional[float] = None):
+        """Wait (up to the queue deadline) for a free slot on the provider"""
+        semaphore = self.semaphores.get(provider)
+        if semaphore is None:
+            yield
+            return
+
+        timeout = self.queue_timeout if timeout is None else timeout
+        self.waiting[provider] += 1
+        try:
+            # asyncio.timeout cancels the acquire itself, so a grant racing the deadline is
+            # either kept or handed back by the semaphore - wait_for could drop it (3.11)
+            async with asyncio.timeout(timeout):
+                await semaphore.acquire()
+        except TimeoutError:
+            self.shed_count['queue_timeout'] += 1
+            raise AdmissionRejected(f"{provider} queue wait exceeded {timeout}s")
+        finally:
+            self.waiting[provider] -= 1
+
+        self.in_flight[provider] += 1
+        try:
+            yield
+        finally:
+            self.in_flight[provider] -= 1
+            semaphore.release()
+
+    def get_stats(self) -> Dict:
+        """Snapshot of queue depths and shed counters"""
+        return {
+            'limits': dict(self.provider_limits),
+            'in_flight': dict(self.in_flight),
+            'waiting': dict(self.waiting),
+            'shed': dict(self.shed_count),
+            'tracked_users': len(self.user_buckets.buckets),
+        }
@@ -0,0 +1,388 @@
+"""
+Conversation state store
+Short-lived per-user state - alarm setup steps (BotHandlers.user_states) and alarms
+waiting for a reply (AlarmManager.pending_alarms) - kept behind one interface so it
+can live outside the process. With the MongoDB backend every replica behind the
+webhook sees the same state and it survives redeploys; the in-memory backend keeps
+a single instance working without extra round trips.
+
+Entries expire after a TTL (a MongoDB TTL index removes them; reads ignore expired
+entries before that) and carry a version: writes and deletes can require the
+version they read (optimistic concurrency), and take() claims an entry atomically so
+two replicas never act on the same state. get_many / put_many / delete_many do a
+whole batch in one round trip.
+"""
+
+import copy
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+from config import Config
+from app.core.metrics import metrics
+
+# Expired entries of the in-memory backend are swept every this many writes
+MEMORY_SWEEP_INTERVAL = 256
+
+
+class VersionConflict(Exception):
+    """The entry changed (or appeared / disappeared) since the version the caller read"""
+
+    def __init__(self, namespace: str, key):
+        super().__init__(f"{namespace}:{key} was modified concurrently")
+        self.namespace = namespace
+        self.key = key
+
+
+@dataclass(frozen=True)
+class StateEntry:
+    value: Any
+    version: int  # starts at 1, +1 on every write
+
+
+class StateStore(ABC):
+    """
+    Interface of the backends
+
+    expected_version on put/delete: None writes unconditionally, 0 requires that the
+    entry does not exist, n requires that it is still at version n. A failed check
+    raises VersionConflict. ttl is in seconds (None: the namespace default).
+    """
+
+    def __init__(self):
+        self.stats = {'reads': 0, 'writes': 0, 'deletes': 0, 'conflicts': 0}
+
+    def namespace(self, name: str, ttl: float) -> "StateNamespace":
+        return StateNamespace(self, name, ttl)
+
+    @abstractmethod
+    def get_many(self, namespace: str, keys: Iterable[Hashable]) -> Dict[Hashable, StateEntry]:
+        """Live entries of the given keys; missing and expired keys are left out"""
+
+    @abstractmethod
+    def put(self, namespace: str, key, value, ttl: float, expected_version: int = None) -> int:
+        """Store value, returns its new version"""
+
+    @abstractmethod
+    def put_many(self, namespace: str, values: Dict[Hashable, Any], ttl: float):
+        """Unconditional writes of several entries"""
+
+    @abstractmethod
+    def delete(self, namespace: str, key, expected_version: int = None) -> bool:
+        """True if an entry was removed"""
+
+    @abstractmethod
+    def delete_many(self, namespace: str, keys: Iterable[Hashable]) -> int:
+        """Unconditional deletes, returns how many entries were removed"""
+
+    @abstractmethod
+    def take(self, namespace: str, key, expected_version: int = None) -> Optional[StateEntry]:
+        """Remove and return an entry atomically - None if it is gone (or at another version)"""
+
+    @abstractmethod
+    def items(self, namespace: str) -> Dict[Hashable, StateEntry]:
+        """All live entries of a namespace (startup recovery, admin views)"""
+
+    def _conflict(self, namespace: str, key) -> VersionConflict:
+        self.stats['conflicts'] += 1
+        return VersionConflict(namespace, key)
+
+
+class MemoryStateStore(StateStore):
+    """Process-local backend (single instance; state is lost on restart)"""
+
+    def __init__(self):
+        super().__init__()
+        self._entries: Dict[str, Dict[Hashable, list]] = {}  # namespace -> key -> [value, version, expires_at]
+        self._lock = threading.Lock()
+        self._writes_since_sweep = 0
+
+    def _live(self, namespace: str, key, now: float) -> Optional[list]:
+        entry = self._entries.get(namespace, {}).get(key)
+        if entry is not None and entry[2] <= now:
+            del self._entries[namespace][key]
+            return None
+        return entry
+
+    def _check(self, namespace: str, key, entry: Optional[list], expected_version: Optional[int]):
+        if expected_version is None:
+            return
+        current = entry[1] if entry is not None else 0
+        if current != expected_version:
+            raise self._conflict(namespace, key)
+
+    def _sweep(self, now: float):
+        self._writes_since_sweep += 1
+        if self._writes_since_sweep < MEMORY_SWEEP_INTERVAL:
+            return
+        self._writes_since_sweep = 0
+        for entries in self._entries.values():
+            for key in [key for key, entry in entries.items() if entry[2] <= now]:
+                del entries[key]
+
+    def get_many(self, namespace, keys):
+        now = time.monotonic()
+        with self._lock:
+            self.stats['reads'] += 1
+            found = {}
+            for key in keys:
+                entry = self._live(namespace, key, now)
+                if entry is not None:
+                    found[key] = StateEntry(copy.deepcopy(entry[0]), entry[1])
+            return found
+
+    def put(self, namespace, key, value, ttl, expected_version=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live(namespace, key, now)
+            self._check(namespace, key, entry, expected_version)
+            version = (entry[1] if entry is not None else 0) + 1
+            # Copies keep the semantics of the shared backend: callers can't mutate stored state in place
+            self._entries.setdefault(namespace, {})[key] = [copy.deepcopy(value), version, now + ttl]
+            self.stats['writes'] += 1
+            self._sweep(now)
+            return version
+
+    def put_many(self, namespace, values, ttl):
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries.setdefault(namespace, {})
+            for key, value in values.items():
+                entry = self._live(namespace, key, now)
+                entries[key] = [copy.deepcopy(value), (entry[1] if entry is not None else 0) + 1, now + ttl]
+            self.stats['writes'] += 1
+            self._sweep(now)
+
+    def delete(self, namespace, key, expected_version=None):
+        return self.take(namespace, key, expected_version) is not None
+
+    def delete_many(self, namespace, keys):
+        now = time.monotonic()
+        with self._lock:
+            self.stats['deletes'] += 1
+            removed = 0
+            for key in keys:
+                if self._live(namespace, key, now) is not None:
+                    del self._entries[namespace][key]
+                    removed += 1
+            return removed
+
+    def take(self, namespace, key, expected_version=None):
+        now = time.monotonic()
+        with self._lock:
+            self.stats['deletes'] += 1
+            entry = self._live(namespace, key, now)
+            if entry is None or (expected_version is not None and entry[1] != expected_version):
+                return None
+            del self._entries[namespace][key]
+            return StateEntry(entry[0], entry[1])
+
+    def items(self, namespace):
+        now = time.monotonic()
+        with self._lock:
+            self.stats['reads'] += 1
+            entries = self._entries.get(namespace, {})
+            return {
+                key: StateEntry(copy.deepcopy(entry[0]), entry[1])
+                for key, entry in list(entries.items()) if self._live(namespace, key, now) is not None
+            }
+
+    def size(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+
+class MongoStateStore(StateStore):
+    """
+    Shared backend: one document per entry in Config.STATE_COLLECTION
+
+    {_id: "<namespace>:<key>", namespace, key, value, version, expires_at}
+    A TTL index on expires_at lets MongoDB delete expired documents (within about a
+    minute); reads filter on expires_at so they never see them in between.
+    """
+
+    def __init__(self, collection_name: str = None):
+        super().__init__()
+        self.collection_name = collection_name or Config.STATE_COLLECTION
+        self._collection = None
+
+    @property
+    def collection(self):
+        """The state collection with its indexes, set up on first use"""
+        if self._collection is None:
+            from app.models.database import db_manager
+
+            collection = db_manager.db[self.collection_name]
+            collection.create_index("expires_at", expireAfterSeconds=0)
+            collection.create_index([("namespace", 1), ("expires_at", 1)])
+            self._collection = collection
+        return self._collection
+
+    def _id(self, namespace: str, key) -> str:
+        return f"{namespace}:{key}"
+
+    def _now(self) -> datetime:
+        # PyMongo returns naive UTC datetimes; store them the same way
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def _live_filter(self, now: datetime) -> Dict:
+        return {"expires_at": {"$gt": now}}
+
+    def get_many(self, namespace, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        by_id = {self._id(namespace, key): key for key in keys}
+        self.stats['reads'] += 1
+        documents = self.collection.find({"_id": {"$in": list(by_id)}, **self._live_filter(self._now())})
+        return {by_id[doc["_id"]]: StateEntry(doc["value"], doc["version"]) for doc in documents}
+
+    def put(self, namespace, key, value, ttl, expected_version=None):
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
+
+        now = self._now()
+        fields = {"namespace": namespace, "key": key, "value": value, "expires_at": now + timedelta(seconds=ttl)}
+        self.stats['writes'] += 1
+
+        if expected_version == 0:
+            # Create only: clear an expired leftover the TTL monitor hasn't removed yet, then insert
+            self.collection.delete_one({"_id": self._id(namespace, key), "expires_at": {"$lte": now}})
+            try:
+                self.collection.insert_one({"_id": self._id(namespace, key), **fields, "version": 1})
+            except DuplicateKeyError:
+                raise self._conflict(namespace, key)
+            return 1
+
+        if expected_version is None:
+            query = {"_id": self._id(namespace, key)}
+            # An expired leftover restarts at version 1 like a new entry
+            update = [{"$set": {**{name: {"$literal": field} for name, field in fields.items()}, "version": {
+                "$cond": [{"$gt": ["$expires_at", now]}, {"$add": [{"$ifNull": ["$version", 0]}, 1]}, 1]
+            }}}]
+            upsert = True
+        else:
+            query = {"_id": self._id(namespace, key), "version": expected_version, **self._live_filter(now)}
+            update = {"$set": fields, "$inc": {"version": 1}}
+            upsert = False
+
+        document = self.collection.find_one_and_update(
+            query, update, upsert=upsert, return_document=ReturnDocument.AFTER, projection={"version": 1}
+        )
+        if document is None:
+            raise self._conflict(namespace, key)
+        return document["version"]
+
+    def put_many(self, namespace, values, ttl):
+        from pymongo import UpdateOne
+
+        if not values:
+            return
+        now = self._now()
+        expires_at = now + timedelta(seconds=ttl)
+        self.stats['writes'] += 1
+        self.collection.bulk_write([
+            UpdateOne(
+                {"_id": self._id(namespace, key)},
+                {"$set": {"namespace": namespace, "key": key, "value": value, "expires_at": expires_at},
+                 "$inc": {"version": 1}},
+                upsert=True
+            )
+            for key, value in values.items()
+        ], ordered=False)
+
+    def delete(self, namespace, key, expected_version=None):
+        return self.take(namespace, key, expected_version) is not None
+
+    def delete_many(self, namespace, keys):
+        ids = [self._id(namespace, key) for key in keys]
+        if not ids:
+            return 0
+        self.stats['deletes'] += 1
+        return self.collection.delete_many({"_id": {"$in": ids}}).deleted_count
+
+    def take(self, namespace, key, expected_version=None):
+        query = {"_id": self._id(namespace, key), **self._live_filter(self._now())}
+        if expected_version is not None:
+            query["version"] = expected_version
+        self.stats['deletes'] += 1
+        document = self.collection.find_one_and_delete(query)
+        return StateEntry(document["value"], document["version"]) if document else None
+
+    def items(self, namespace):
+        self.stats['reads'] += 1
+        documents = self.collection.find({"namespace": namespace, **self._live_filter(self._now())})
+        return {doc["key"]: StateEntry(doc["value"], doc["version"]) for doc in documents}
+
+
+class StateNamespace:
+    """One kind of state (e.g. 'user_state') with its TTL, bound to a store"""
+
+    def __init__(self, store: StateStore, name: str, ttl: float):
+        self.store = store
+        self.name = name
+        self.ttl = ttl
+
+    def get_entry(self, key) -> Optional[StateEntry]:
+        return self.store.get_many(self.name, [key]).get(key)
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return entry.value if entry is not None else default
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, StateEntry]:
+        return self.store.get_many(self.name, keys)
+
+    def put(self, key, value, expected_version: int = None, ttl: float = None) -> int:
+        return self.store.put(self.name, key, value, ttl or self.ttl, expected_version)
+
+    def put_many(self, values: Dict[Hashable, Any], ttl: float = None):
+        self.store.put_many(self.name, values, ttl or self.ttl)
+
+    def delete(self, key, expected_version: int = None) -> bool:
+        return self.store.delete(self.name, key, expected_version)
+
+    def delete_many(self, keys: Iterable[Hashable]) -> int:
+        return self.store.delete_many(self.name, keys)
+
+    def take(self, key, expected_version: int = None) -> Optional[Any]:
+        """The value, removed atomically - None if it was already gone"""
+        entry = self.store.take(self.name, key, expected_version)
+        return entry.value if entry is not None else None
+
+    def items(self) -> Dict[Hashable, StateEntry]:
+        return self.store.items(self.name)
+
+    def __contains__(self, key) -> bool:
+        return self.get_entry(key) is not None
+
+
+def create_state_store(backend: str = None) -> StateStore:
+    backend = (backend or Config.STATE_STORE_BACKEND).lower()
+    if backend == "mongo":
+        return MongoStateStore()
+    if backend != "memory":
+        print(f"⚠️ Unknown STATE_STORE_BACKEND '{backend}', using memory")
+    return MemoryStateStore()
+
+# Global state store instance
+state_store = create_state_store()
+
+
+def _collect_state_metrics():
+    """State store operations and conflicts for /metrics"""
+    stats = state_store.stats
+    families = [
+        ("mathbot_state_store_operations_total", "counter", "Conversation state store operations by kind",
+         [({"operation": name}, stats[name]) for name in ('reads', 'writes', 'deletes')]),
+        ("mathbot_state_store_conflicts_total", "counter", "Writes rejected by the optimistic version check",
+         [({}, stats['conflicts'])]),
+    ]
+    if isinstance(state_store, MemoryStateStore):
+        families.append(("mathbot_state_store_entries", "gauge", "Entries held by the in-memory state store",
+                         [({}, state_store.size())]))
+    return families
+
+metrics.register_collector(_collect_state_metrics)
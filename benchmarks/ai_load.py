@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Load/latency benchmark for AIAssistant.get_ai_response_with_fallback
+Drives N concurrent simulated users against benchmarks/mock_ai_server.py
+(started in-process unless --server-url is given) and reports throughput
+and p50/p95/p99 latency.
+
+Usage:
+    python benchmarks/ai_load.py --users 50 --requests-per-user 10 --latency lognormal:0.6:0.35 --rate-limit-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Fail fast on the Mongo connection made at import time - the benchmark never needs it
+os.environ.setdefault("MONGODB_URI", "mongodb://127.0.0.1:27017/?serverSelectionTimeoutMS=200")
+
+from benchmarks.corpus import AI_QUESTIONS
+from benchmarks.mock_ai_server import CANNED_REPLY, add_profile_arguments, build_server
+from benchmarks.stats import summarize_latencies, format_summary
+from app.services.rate_limiter import AdmissionController
+import app.services.ai_assistant as ai_module
+
+SAMPLE_QUESTIONS = AI_QUESTIONS
+
+
+def configure_assistant(args, base_url: str):
+    """Point the global assistant at the mock server and apply benchmark limits"""
+    assistant = ai_module.ai_assistant
+    assistant.deepseek_api_key = "mock-deepseek-key"
+    assistant.gemini_api_key = "mock-gemini-key"
+    assistant.deepseek_api_url = f"{base_url}/v1/chat/completions"
+    assistant.gemini_api_url = f"{base_url}/v1/models/gemini-2.5-flash:generateContent"
+
+    assistant.admission = AdmissionController(
+        provider_limits={"gemini": args.max_concurrent_gemini, "deepseek": args.max_concurrent_deepseek},
+        user_rate_per_minute=args.user_rate,
+        user_burst=args.user_burst,
+        queue_timeout=args.queue_timeout,
+    )
+
+    # Only the AI path is measured: answer the per-request preference lookup locally
+    ai_module.db_manager.get_user_preference = lambda user_id, key, default=None: args.model
+    return assistant
+
+
+async def simulated_user(assistant, user_id: int, args, results: list):
+    """One user sending requests back to back (plus optional think time)"""
+    history = []
+    for _ in range(args.requests_per_user):
+        question = random.choice(SAMPLE_QUESTIONS)
+        if not assistant.admission.allow_user(user_id):
+            results.append(('shed_user_rate', 0.0))
+            continue
+
+        messages = assistant.context_builder.build(assistant.system_prompt, history, question)
+        started = time.perf_counter()
+        response = await assistant.get_ai_response_with_fallback(messages, user_id)
+        elapsed = time.perf_counter() - started
+
+        outcome = 'ok' if response == CANNED_REPLY else 'fallback'
+        results.append((outcome, elapsed))
+
+        history.extend([{"role": "user", "content": question}, {"role": "assistant", "content": response}])
+        if args.think_time:
+            await asyncio.sleep(random.uniform(0, args.think_time))
+
+
+async def run_benchmark(args) -> dict:
+    server = None
+    base_url = args.server_url
+    if not base_url:
+        server = build_server(args)
+        await server.start('127.0.0.1', args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    assistant = configure_assistant(args, base_url)
+    results = []
+
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        simulated_user(assistant, 100000 + index, args, results) for index in range(args.users)
+    ])
+    wall_time = time.perf_counter() - started
+
+    mock_stats = None
+    if server:
+        mock_stats = {name: dict(profile.counters) for name, profile in server.profiles.items()}
+        await server.stop()
+
+    outcomes = Counter(outcome for outcome, _ in results)
+    answered = [elapsed for outcome, elapsed in results if outcome != 'shed_user_rate']
+    return {
+        'users': args.users,
+        'requests': len(results),
+        'wall_time_s': wall_time,
+        'throughput_rps': len(answered) / wall_time if wall_time else 0.0,
+        'outcomes': dict(outcomes),
+        'latency_all': summarize_latencies(answered),
+        'latency_ok': summarize_latencies([e for o, e in results if o == 'ok']),
+        'latency_fallback': summarize_latencies([e for o, e in results if o == 'fallback']),
+        'admission': assistant.admission.get_stats(),
+        'mock_server': mock_stats,
+    }
+
+
+def print_report(report: dict):
+    print("🤖 AI path benchmark")
+    print("=" * 60)
+    print(f"Users: {report['users']}   Requests: {report['requests']}   Wall time: {report['wall_time_s']:.2f}s")
+    print(f"Throughput: {report['throughput_rps']:.2f} req/s")
+    print(f"Outcomes: {report['outcomes']}")
+    print(format_summary("latency (all answered)", report['latency_all']))
+    print(format_summary("latency (provider reply)", report['latency_ok']))
+    print(format_summary("latency (canned fallback)", report['latency_fallback']))
+    print(f"Admission: {report['admission']}")
+    if report['mock_server']:
+        print(f"Mock server: {report['mock_server']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the AI response path against a mock provider')
+    parser.add_argument('--users', type=int, default=20, help='Concurrent simulated users')
+    parser.add_argument('--requests-per-user', type=int, default=5)
+    parser.add_argument('--think-time', type=float, default=0.0, help='Max random pause between requests (s)')
+    parser.add_argument('--model', default='auto', choices=['auto', 'gemini', 'deepseek'])
+    parser.add_argument('--server-url', help='Use an already running mock server instead of starting one')
+    parser.add_argument('--port', type=int, default=8765, help='Port for the in-process mock server')
+    parser.add_argument('--max-concurrent-gemini', type=int, default=8)
+    parser.add_argument('--max-concurrent-deepseek', type=int, default=8)
+    parser.add_argument('--user-rate', type=float, default=600.0, help='Token bucket refill per user per minute')
+    parser.add_argument('--user-burst', type=int, default=100)
+    parser.add_argument('--queue-timeout', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Also write the report to this JSON file')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = asyncio.run(run_benchmark(args))
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
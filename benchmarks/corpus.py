@@ -0,0 +1,85 @@
+"""
+Curated inputs for the offline benchmarks
+Expressions and functions of the kinds users actually send, grouped by category
+so a regression can be traced to one family of inputs.
+"""
+
+# Inputs of MathSolver.solve_expression
+EXPRESSION_CORPUS = {
+    'arithmetic': [
+        "2 + 3 * 4",
+        "(5 + 3) * 2 - 7 / 4",
+        "2^10 - 1",
+        "17 % 5 + 3!",
+        "3.14 * 2.5^2",
+        "1/3 + 1/6",
+    ],
+    'functions': [
+        "sqrt(16) + log(100)",
+        "sin(pi/6) + cos(pi/3)",
+        "exp(2) - ln(7)",
+        "abs(-12.5) * sqrt(2)",
+        "tan(pi/4) + sin(30)",
+    ],
+    'equations': [
+        "2x + 3 = 7",
+        "x^2 - 5x + 6 = 0",
+        "3(x - 2) = 2x + 5",
+        "x^3 - 6x^2 + 11x - 6 = 0",
+        "2^x = 32",
+        "sin(x) = 1/2",
+    ],
+    'polynomials': [
+        "x^2 + 2*x + 1",
+        "(x + 1)^3 - x^3",
+        "(2*x - 3)*(x + 4)",
+    ],
+    'rationals': [
+        "(x^2 - 1)/(x - 1)",
+        "1/(x + 1) + 1/(x - 1)",
+        "(x^2 + 1)/(x^2 - 4) = 2",
+    ],
+    'trig_log': [
+        "sin(x)^2 + cos(x)^2",
+        "log(x^2) = 4",
+        "ln(x) + ln(2) = 3",
+    ],
+}
+
+# Inputs of FunctionAnalyzer (every step), plot_function and generate_function_pdf
+FUNCTION_CORPUS = {
+    'polynomials': [
+        "f(x) = x^2 - 4x + 3",
+        "f(x) = x^3 - 3x + 2",
+        "y = x^4 - 2x^2",
+    ],
+    'rationals': [
+        "f(x) = 1/x",
+        "f(x) = (x^2 - 1)/(x + 2)",
+        "f(x) = (2x + 1)/(x^2 - 4)",
+    ],
+    'trig': [
+        "f(x) = sin(x)",
+        "f(x) = x*cos(x)",
+    ],
+    'logs_exp': [
+        "f(x) = ln(x)",
+        "f(x) = x*exp(-x)",
+        "f(x) = sqrt(x^2 + 1)",
+    ],
+}
+
+# Free-text questions answered by the AI assistant
+AI_QUESTIONS = [
+    "How do derivatives work?",
+    "What's the best way to study math?",
+    "Tell me about your creator",
+    "Can you explain limits at infinity?",
+    "Why is the derivative of sin(x) equal to cos(x)?",
+    "Help me understand functions",
+]
+
+
+def flatten(corpus: dict):
+    """(category, input) pairs in corpus order"""
+    return [(category, item) for category, items in corpus.items() for item in items]
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the math paths
+Times MathSolver.solve_expression, every FunctionAnalyzer step (each node of
+ANALYSIS_GRAPH, run in-process with its dependencies precomputed), plot_function
+and PDFGenerator.generate_function_pdf separately over the curated corpus in
+benchmarks/corpus.py. Reports throughput, p50/p95/p99 latency and peak RSS, and
+compares against a stored baseline to flag regressions (exit code 1).
+
+Baselines are machine specific - refresh benchmarks/baselines/math_bench.json with
+--save-baseline on the machine the comparison runs on.
+
+Usage:
+    python benchmarks/math_bench.py --iterations 5
+    python benchmarks/math_bench.py --only solve,plot --save-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Fail fast on any Mongo connection - the benchmark never needs it
+os.environ.setdefault("MONGODB_URI", "mongodb://127.0.0.1:27017/?serverSelectionTimeoutMS=200")
+
+import sympy as sp
+
+from benchmarks.corpus import EXPRESSION_CORPUS, FUNCTION_CORPUS, flatten
+from benchmarks.stats import summarize_latencies, format_summary
+from app.services.math_solver import math_solver
+from app.services.function_analyzer import function_analyzer, ANALYSIS_GRAPH, _run_node_in_worker
+from app.services.pdf_generator import pdf_generator
+
+BENCHMARKS = ('solve', 'analysis', 'plot', 'pdf')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'math_bench.json')
+
+# Benchmarks with fewer timed runs are compared on p50 only
+MIN_SAMPLES_FOR_P95 = 20
+
+FAILED = object()  # Recorder.measure result of a call that raised
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Recorder:
+    """Collects latencies per benchmark name and the peak RSS reached while they ran"""
+
+    def __init__(self, iterations: int, warmup: int, cold: bool):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.cold = cold
+        self.latencies = {}
+        self.failures = {}
+        self.rss = {}
+
+    def measure(self, name: str, function, *args):
+        """Run function(*args) warmup + iterations times, recording the timed runs under name (FAILED if it raised)"""
+        result = None
+        for run in range(self.warmup + self.iterations):
+            if self.cold:
+                # Every message is new to the bot: start without SymPy's or the solver's caches
+                sp.core.cache.clear_cache()
+                math_solver._parse_cache.clear()
+            started = time.perf_counter()
+            try:
+                result = function(*args)
+            except Exception as e:
+                self.failures.setdefault(name, []).append(f"{type(e).__name__}: {e}")
+                return FAILED
+            elapsed = time.perf_counter() - started
+            if run >= self.warmup:
+                self.latencies.setdefault(name, []).append(elapsed)
+        return result
+
+    def mark_rss(self, *names: str):
+        peak = peak_rss_mb()
+        for name in names:
+            self.rss[name] = peak
+
+    def report(self) -> dict:
+        results = {}
+        for name, latencies in self.latencies.items():
+            summary = summarize_latencies(latencies)
+            total = sum(latencies)
+            summary['throughput_ops'] = len(latencies) / total if total else 0.0
+            summary['peak_rss_mb'] = self.rss.get(name.split('/')[0], peak_rss_mb())
+            summary['failures'] = len(self.failures.get(name, []))
+            results[name] = summary
+        return results
+
+
+def bench_solver(recorder: Recorder):
+    for category, expression in flatten(EXPRESSION_CORPUS):
+        outcome = recorder.measure(f"solve/{category}", math_solver.solve_expression, expression)
+        success, result, _ = (False, recorder.failures.get(f"solve/{category}", ["?"])[-1], None) if outcome is FAILED else outcome
+        if not success:
+            print(f"⚠️ solve {expression!r} failed: {result}")
+    recorder.latencies['solve'] = [
+        latency for name, latencies in recorder.latencies.items() if name.startswith('solve/') for latency in latencies
+    ]
+    recorder.mark_rss('solve')
+
+
+def run_step(node: str, func_str: str, func: sp.Expr, inputs: dict):
+    """One analysis node with the same time budget as in the bot's worker pool"""
+    return function_analyzer.pool.submit(
+        _run_node_in_worker, node, func_str, func, inputs, function_analyzer.step_timeout
+    ).result()
+
+
+def bench_analysis(recorder: Recorder):
+    for _, func_str in flatten(FUNCTION_CORPUS):
+        func = function_analyzer.parse_function(func_str)
+        results = {}
+        # ANALYSIS_GRAPH lists dependencies before the nodes that use them
+        for node, dependencies in ANALYSIS_GRAPH.items():
+            if any(dependency not in results for dependency in dependencies):
+                continue  # an input timed out or failed
+            inputs = {dependency: results[dependency] for dependency in dependencies}
+            result = recorder.measure(f"analysis/{node}", run_step, node, func_str, func, inputs)
+            if result is FAILED:  # SymbolicTimeout included
+                print(f"⚠️ {node} failed for {func_str!r}: {recorder.failures[f'analysis/{node}'][-1]}")
+                continue
+            results[node] = result
+    recorder.mark_rss('analysis')
+
+
+def bench_plot(recorder: Recorder) -> dict:
+    graphs = {}
+    for _, func_str in flatten(FUNCTION_CORPUS):
+        graph = recorder.measure('plot', function_analyzer.plot_function, func_str)
+        graphs[func_str] = None if graph is FAILED else graph
+    recorder.mark_rss('plot')
+    return graphs
+
+
+def bench_pdf(recorder: Recorder, graphs: dict):
+    for _, func_str in flatten(FUNCTION_CORPUS):
+        analysis = function_analyzer.analyze_function(func_str)
+        graph = graphs.get(func_str) or function_analyzer.plot_function(func_str)
+
+        def generate():
+            filename = pdf_generator.generate_function_pdf(analysis=analysis, graph_base64=graph, user_id=0)
+            pdf_generator.cleanup_file(filename)
+            return filename
+
+        if recorder.measure('pdf', generate) in (FAILED, None):
+            print(f"⚠️ PDF generation failed for {func_str!r}")
+    recorder.mark_rss('pdf')
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float, noise_floor_ms: float,
+                          rss_tolerance: float) -> list:
+    """Benchmarks whose p50/p95 or peak RSS got worse than the baseline allows"""
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        # With few samples p95 is just the slowest run - only the median is stable enough
+        keys = ('p50_ms', 'p95_ms') if current['count'] >= MIN_SAMPLES_FOR_P95 else ('p50_ms',)
+        for key in keys:
+            allowed = max(previous[key] * (1 + tolerance), previous[key] + noise_floor_ms)
+            if current[key] > allowed:
+                regressions.append(f"{name} {key}: {previous[key]:.2f} -> {current[key]:.2f} ms")
+        if current['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + rss_tolerance):
+            regressions.append(f"{name} peak RSS: {previous['peak_rss_mb']:.0f} -> {current['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def print_report(report: dict):
+    print("📈 Math path benchmark")
+    print("=" * 60)
+    print(f"Iterations: {report['iterations']} (+{report['warmup']} warm-up)   "
+          f"Caches: {'cold' if report['cold'] else 'warm'}   Python {report['python']}")
+    for name, summary in report['results'].items():
+        failures = f" failures={summary['failures']}" if summary['failures'] else ""
+        print(f"{format_summary(name, summary)} {summary['throughput_ops']:9.1f} ops/s "
+              f"rss={summary['peak_rss_mb']:.0f}MB{failures}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the solver, analyzer, plot and PDF paths offline')
+    parser.add_argument('--iterations', type=int, default=3, help='Timed runs per corpus item')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per corpus item')
+    parser.add_argument('--warm', action='store_true', help="Keep SymPy's and the solver's caches between runs")
+    parser.add_argument('--only', help=f"Comma-separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Write this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed latency growth (0.25 = 25%%)')
+    parser.add_argument('--noise-floor-ms', type=float, default=5.0, help='Latency growth always tolerated')
+    parser.add_argument('--rss-tolerance', type=float, default=0.15, help='Allowed peak RSS growth')
+    parser.add_argument('--json', help='Also write the report to this JSON file')
+    args = parser.parse_args()
+
+    selected = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    recorder = Recorder(args.iterations, args.warmup, cold=not args.warm)
+    started = time.perf_counter()
+    graphs = {}
+    if 'solve' in selected:
+        bench_solver(recorder)
+    if 'analysis' in selected:
+        bench_analysis(recorder)
+    if 'plot' in selected or 'pdf' in selected:
+        graphs = bench_plot(recorder)
+    if 'pdf' in selected:
+        bench_pdf(recorder, graphs)
+    if 'plot' not in selected:
+        recorder.latencies.pop('plot', None)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sympy': sp.__version__,
+        'machine': platform.machine(),
+        'iterations': args.iterations,
+        'warmup': args.warmup,
+        'cold': not args.warm,
+        'wall_time_s': time.perf_counter() - started,
+        'results': recorder.report(),
+    }
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report written to {args.json}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📌 Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"ℹ️ No baseline at {args.baseline} - run with --save-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('cold') != report['cold'] or baseline.get('iterations') != report['iterations']:
+        print("ℹ️ Baseline was recorded with different settings - comparison may be skewed")
+    regressions = compare_with_baseline(report['results'], baseline, args.tolerance, args.noise_floor_ms,
+                                        args.rss_tolerance)
+    print("-" * 60)
+    if regressions:
+        print(f"❌ {len(regressions)} regressions against the baseline from {baseline.get('timestamp')}:")
+        for regression in regressions:
+            print(f"   {regression}")
+        sys.exit(1)
+    print(f"✅ No regressions against the baseline from {baseline.get('timestamp')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the DeepSeek and Google Gemini APIs
+Speaks both request/response shapes (including streaming) with configurable
+latency, error rates and 429s, so the AI path can be benchmarked offline.
+
+Usage:
+    python benchmarks/mock_ai_server.py --port 8765 --latency lognormal:0.8:0.4 --error-rate 0.02 --rate-limit-rate 0.05
+
+Then point the bot at it:
+    DEEPSEEK_API_URL=http://127.0.0.1:8765/v1/chat/completions
+    GOOGLE_GEMINI_API_URL=http://127.0.0.1:8765/v1/models/gemini-2.5-flash:generateContent
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from typing import Dict, Optional
+
+from aiohttp import web
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CANNED_REPLY = (
+    "Great question! 🧮 Derivatives measure how fast a function changes. "
+    "For f(x) = x^2 the derivative is f'(x) = 2x, so the slope at x = 3 is 6. "
+    "Use the 📈 Solve Function button for a full analysis with a PDF report!"
+)
+
+
+class LatencyModel:
+    """Latency distribution parsed from 'kind:arg1:arg2' (seconds)
+
+    fixed:0.5            always 0.5s
+    uniform:0.2:1.5      uniform between 0.2s and 1.5s
+    normal:0.8:0.2       gaussian, clipped at 0
+    lognormal:0.8:0.4    median 0.8s, sigma 0.4 (long tail, closest to real LLM APIs)
+    exponential:0.5      mean 0.5s
+    """
+
+    def __init__(self, spec: str):
+        parts = spec.split(':')
+        self.kind = parts[0]
+        self.args = [float(p) for p in parts[1:]]
+        if self.kind not in ('fixed', 'uniform', 'normal', 'lognormal', 'exponential'):
+            raise ValueError(f"Unknown latency distribution: {self.kind}")
+        self.spec = spec
+
+    def sample(self) -> float:
+        if self.kind == 'fixed':
+            return self.args[0]
+        if self.kind == 'uniform':
+            return random.uniform(self.args[0], self.args[1])
+        if self.kind == 'normal':
+            return max(0.0, random.gauss(self.args[0], self.args[1]))
+        if self.kind == 'lognormal':
+            return random.lognormvariate(math.log(self.args[0]), self.args[1])
+        return random.expovariate(1.0 / self.args[0])
+
+
+class ProviderProfile:
+    """Behaviour of one mocked provider"""
+
+    def __init__(self, latency: str = 'fixed:0.2', error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, max_concurrent: int = 0,
+                 stream_chunk_delay: float = 0.02):
+        self.latency = LatencyModel(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.max_concurrent = max_concurrent  # 0 = unlimited; above this we answer 429
+        self.stream_chunk_delay = stream_chunk_delay
+        self.in_flight = 0
+        self.counters = {'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0}
+
+    def decide_failure(self) -> Optional[int]:
+        """Return an HTTP status to fail with, or None to succeed"""
+        if self.max_concurrent and self.in_flight > self.max_concurrent:
+            return 429
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+
+class MockAIServer:
+    """aiohttp application serving both provider APIs"""
+
+    def __init__(self, deepseek: ProviderProfile, gemini: ProviderProfile, reply: str = CANNED_REPLY):
+        self.profiles = {'deepseek': deepseek, 'gemini': gemini}
+        self.reply = reply
+        self.app = web.Application()
+        self.app.router.add_post('/v1/chat/completions', self.deepseek_chat)
+        self.app.router.add_post('/v1/models/{model_action}', self.gemini_generate)
+        self.app.router.add_post('/v1beta/models/{model_action}', self.gemini_generate)
+        self.app.router.add_get('/stats', self.stats)
+        self.runner = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765):
+        """Start serving in the current event loop"""
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    def _chunks(self, text: str, size: int = 24):
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    async def _admit(self, provider: str):
+        """Apply latency and failure injection, returns an error response or None"""
+        profile = self.profiles[provider]
+        profile.counters['requests'] += 1
+        profile.in_flight += 1
+        try:
+            await asyncio.sleep(profile.latency.sample())
+            status = profile.decide_failure()
+        except BaseException:
+            profile.in_flight -= 1
+            raise
+
+        if status == 429:
+            profile.counters['rate_limited'] += 1
+            profile.in_flight -= 1
+            return web.json_response(
+                {"error": {"code": 429, "message": "Rate limit reached (mock)", "status": "RESOURCE_EXHAUSTED"}},
+                status=429, headers={'Retry-After': '1'}
+            )
+        if status:
+            profile.counters['errors'] += 1
+            profile.in_flight -= 1
+            return web.json_response(
+                {"error": {"code": status, "message": "Internal error (mock)", "status": "INTERNAL"}},
+                status=status
+            )
+        return None
+
+    def _finish(self, provider: str):
+        profile = self.profiles[provider]
+        profile.counters['ok'] += 1
+        profile.in_flight -= 1
+
+    async def deepseek_chat(self, request: web.Request) -> web.StreamResponse:
+        """OpenAI-compatible chat completions (DeepSeek)"""
+        body = await request.json()
+        error = await self._admit('deepseek')
+        if error is not None:
+            return error
+
+        created = int(time.time())
+        model = body.get('model', 'deepseek-chat')
+
+        if not body.get('stream'):
+            self._finish('deepseek')
+            return web.json_response({
+                "id": f"mock-{created}",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.reply},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(self.reply) // 4, "total_tokens": 0}
+            })
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        try:
+            for chunk in self._chunks(self.reply):
+                event = {
+                    "id": f"mock-{created}", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]
+                }
+                await response.write(f"data: {json.dumps(event)}\n\n".encode())
+                await asyncio.sleep(self.profiles['deepseek'].stream_chunk_delay)
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        finally:
+            self._finish('deepseek')
+        return response
+
+    async def gemini_generate(self, request: web.Request) -> web.StreamResponse:
+        """Gemini generateContent / streamGenerateContent"""
+        action = request.match_info['model_action']
+        await request.json()
+        if not request.query.get('key'):
+            return web.json_response({"error": {"code": 403, "message": "API key missing (mock)"}}, status=403)
+
+        error = await self._admit('gemini')
+        if error is not None:
+            return error
+
+        def candidate(text: str, finished: bool) -> Dict:
+            entry = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+            if finished:
+                entry["finishReason"] = "STOP"
+            return {"candidates": [entry]}
+
+        if not action.endswith(':streamGenerateContent'):
+            self._finish('gemini')
+            return web.json_response(candidate(self.reply, True))
+
+        use_sse = request.query.get('alt') == 'sse'
+        response = web.StreamResponse(
+            headers={'Content-Type': 'text/event-stream' if use_sse else 'application/json'}
+        )
+        await response.prepare(request)
+        try:
+            chunks = self._chunks(self.reply)
+            if not use_sse:
+                await response.write(b"[")
+            for index, chunk in enumerate(chunks):
+                payload = json.dumps(candidate(chunk, index == len(chunks) - 1))
+                if use_sse:
+                    await response.write(f"data: {payload}\r\n\r\n".encode())
+                else:
+                    await response.write(((',' if index else '') + payload).encode())
+                await asyncio.sleep(self.profiles['gemini'].stream_chunk_delay)
+            if not use_sse:
+                await response.write(b"]")
+            await response.write_eof()
+        finally:
+            self._finish('gemini')
+        return response
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            name: {**profile.counters, 'in_flight': profile.in_flight, 'latency': profile.latency.spec}
+            for name, profile in self.profiles.items()
+        })
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """CLI options shared by the server and the benchmark harness"""
+    parser.add_argument('--latency', default='lognormal:0.6:0.35',
+                        help='Latency distribution for both providers (see LatencyModel)')
+    parser.add_argument('--gemini-latency', help='Override latency for Gemini only')
+    parser.add_argument('--deepseek-latency', help='Override latency for DeepSeek only')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--provider-max-concurrent', type=int, default=0,
+                        help='Answer 429 above this many in-flight requests per provider (0 = unlimited)')
+
+
+def build_server(args) -> MockAIServer:
+    def profile(latency: Optional[str]) -> ProviderProfile:
+        return ProviderProfile(
+            latency=latency or args.latency,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            max_concurrent=args.provider_max_concurrent,
+        )
+    return MockAIServer(deepseek=profile(args.deepseek_latency), gemini=profile(args.gemini_latency))
+
+
+async def serve_forever(args):
+    server = build_server(args)
+    await server.start(args.host, args.port)
+    print(f"🧪 Mock AI server listening on http://{args.host}:{args.port}")
+    print(f"   DeepSeek: http://{args.host}:{args.port}/v1/chat/completions")
+    print(f"   Gemini:   http://{args.host}:{args.port}/v1/models/gemini-2.5-flash:generateContent")
+    print(f"   Stats:    http://{args.host}:{args.port}/stats")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock DeepSeek/Gemini API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, help='Random seed for reproducible runs')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    try:
+        asyncio.run(serve_forever(args))
+    except KeyboardInterrupt:
+        print("\n🛑 Mock AI server stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Telegram Bot API
+Answers the calls the bot makes (sendMessage, sendDocument, editMessageText,
+getFile, sendChatAction, plus getMe/setWebhook/answerCallbackQuery and file
+downloads) with well-formed results, configurable latency and Telegram-style
+429 flood control, so the whole bot can be load-tested offline.
+
+Every call is recorded per chat; benchmarks/webhook_load.py uses that to measure
+when the bot finished answering an update.
+
+Usage:
+    python benchmarks/mock_telegram_server.py --port 8081 --tg-latency lognormal:0.05:0.5 --chat-rate 1 --chat-burst 3
+
+Then point the bot at it:
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8081
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+from aiohttp import web
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.rate_limiter import TokenBucket
+from benchmarks.mock_ai_server import LatencyModel
+
+MOCK_BOT = {
+    "id": 7000000001,
+    "is_bot": True,
+    "first_name": "MathBot (mock)",
+    "username": "mock_mathbot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+# Image served for every getFile download (photo updates go through OCR)
+PHOTO_TEXT = "2 + 3 * 4"
+
+
+def render_photo(text: str = PHOTO_TEXT) -> bytes:
+    """A PNG with a line of printed math, like a photographed exercise"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (480, 120), "white")
+    ImageDraw.Draw(image).text((30, 45), text, fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class MockTelegramServer:
+    """aiohttp application serving /bot<token>/<method> and /file/bot<token>/<path>"""
+
+    # Methods that count towards Telegram's per-chat and global flood limits
+    MESSAGE_METHODS = {"sendMessage", "sendDocument", "sendPhoto", "editMessageText"}
+
+    def __init__(self, latency: str = 'fixed:0.03', rate_limit_rate: float = 0.0, chat_rate: float = 0.0,
+                 chat_burst: float = 3, global_rate: float = 0.0, retry_after: int = 1, upload_latency: str = None):
+        self.latency = LatencyModel(latency)
+        self.upload_latency = LatencyModel(upload_latency) if upload_latency else self.latency
+        self.rate_limit_rate = rate_limit_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.retry_after = retry_after
+        # Flood control: the bot's own per-user token buckets, keyed by chat (one key for the global limit)
+        self.global_bucket = TokenBucket(global_rate * 60, max(global_rate, 1)) if global_rate else None
+        self.chat_buckets = TokenBucket(chat_rate * 60, max(chat_burst, 1)) if chat_rate else None
+
+        self.counters = defaultdict(lambda: {'requests': 0, 'ok': 0, 'rate_limited': 0})
+        self.chat_calls = defaultdict(list)  # chat_id -> [(monotonic time, method), ...]
+        self.uploaded_bytes = 0
+        self.photo = render_photo()
+        self._message_id = 0
+        self._file_id = 0
+
+        self.app = web.Application(client_max_size=50 * 1024 * 1024)
+        self.app.router.add_route('*', '/bot{token}/{method}', self.bot_method)
+        self.app.router.add_get('/file/bot{token}/{path:.*}', self.download_file)
+        self.app.router.add_get('/stats', self.stats)
+        self.runner = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8081):
+        """Start serving in the current event loop"""
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    def reset(self):
+        self.counters.clear()
+        self.chat_calls.clear()
+        self.uploaded_bytes = 0
+
+    def _flood_wait(self, method: str, chat_id: Optional[int]) -> float:
+        """Seconds the caller has to wait (429) or 0"""
+        if random.random() < self.rate_limit_rate:
+            return float(self.retry_after)
+        if method not in self.MESSAGE_METHODS:
+            return 0.0
+        if self.global_bucket is not None and not self.global_bucket.consume(0):
+            return self.global_bucket.retry_after(0)
+        if self.chat_buckets is not None and chat_id is not None and not self.chat_buckets.consume(chat_id):
+            return self.chat_buckets.retry_after(chat_id)
+        return 0.0
+
+    def _message(self, chat_id, **fields) -> Dict:
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {key: MOCK_BOT[key] for key in ("id", "is_bot", "first_name", "username")},
+            **fields,
+        }
+
+    def _result(self, method: str, params: Dict, upload_size: int):
+        chat_id = _int(params.get("chat_id"))
+        if method == "getMe":
+            return MOCK_BOT
+        if method == "sendMessage":
+            return self._message(chat_id, text=params.get("text", ""))
+        if method == "editMessageText":
+            if params.get("inline_message_id"):
+                return True
+            return self._message(chat_id, text=params.get("text", ""), message_id=_int(params.get("message_id")),
+                                 edit_date=int(time.time()))
+        if method in ("sendDocument", "sendPhoto"):
+            self._file_id += 1
+            document = {"file_id": f"mock-doc-{self._file_id}", "file_unique_id": f"doc{self._file_id}",
+                        "file_name": params.get("filename") or "document.pdf", "file_size": upload_size}
+            return self._message(chat_id, document=document, caption=params.get("caption"))
+        if method == "getFile":
+            file_id = params.get("file_id", "mock-photo")
+            return {"file_id": file_id, "file_unique_id": file_id[-16:], "file_size": len(self.photo),
+                    "file_path": f"photos/{file_id}.png"}
+        # sendChatAction, answerCallbackQuery, setWebhook, deleteWebhook, ...
+        return True
+
+    async def bot_method(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params, upload_size = await _read_params(request)
+        chat_id = _int(params.get("chat_id"))
+        counters = self.counters[method]
+        counters['requests'] += 1
+
+        await asyncio.sleep((self.upload_latency if upload_size else self.latency).sample())
+
+        wait = self._flood_wait(method, chat_id)
+        if wait:
+            counters['rate_limited'] += 1
+            retry_after = max(1, int(wait + 0.999))
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }, status=429)
+
+        counters['ok'] += 1
+        self.uploaded_bytes += upload_size
+        if chat_id is not None:
+            self.chat_calls[chat_id].append((time.monotonic(), method))
+        return web.json_response({"ok": True, "result": self._result(method, params, upload_size)})
+
+    async def download_file(self, request: web.Request) -> web.Response:
+        counters = self.counters['downloadFile']
+        counters['requests'] += 1
+        await asyncio.sleep(self.latency.sample())
+        counters['ok'] += 1
+        return web.Response(body=self.photo, content_type='image/png')
+
+    def get_stats(self) -> Dict:
+        return {
+            'methods': {method: dict(counters) for method, counters in sorted(self.counters.items())},
+            'chats': len(self.chat_calls),
+            'uploaded_bytes': self.uploaded_bytes,
+            'latency': self.latency.spec,
+        }
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.get_stats())
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _read_params(request: web.Request):
+    """Bot API parameters from the query string, JSON, urlencoded or multipart body; plus uploaded bytes"""
+    params = dict(request.query)
+    upload_size = 0
+    if request.content_type == 'application/json':
+        params.update(await request.json())
+    elif request.can_read_body:
+        form = await request.post()
+        for key, value in form.items():
+            if isinstance(value, web.FileField):
+                upload_size += len(value.file.read())
+                params.setdefault("filename", value.filename)
+            else:
+                params[key] = value
+    return params, upload_size
+
+
+def add_telegram_arguments(parser: argparse.ArgumentParser):
+    """CLI options shared by the server and the load generator"""
+    parser.add_argument('--tg-latency', default='lognormal:0.04:0.5',
+                        help='Latency distribution of Bot API calls (see LatencyModel in mock_ai_server.py)')
+    parser.add_argument('--tg-upload-latency', help='Latency of sendDocument/sendPhoto (default: --tg-latency)')
+    parser.add_argument('--tg-rate-limit-rate', type=float, default=0.0, help='Fraction of calls answered with 429')
+    parser.add_argument('--chat-rate', type=float, default=0.0,
+                        help='Messages per second per chat before 429 (Telegram: about 1; 0 = unlimited)')
+    parser.add_argument('--chat-burst', type=float, default=3, help='Messages a chat may burst above --chat-rate')
+    parser.add_argument('--global-rate', type=float, default=0.0,
+                        help='Messages per second across all chats before 429 (Telegram: about 30; 0 = unlimited)')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after of randomly injected 429s')
+
+
+def build_server(args) -> MockTelegramServer:
+    return MockTelegramServer(
+        latency=args.tg_latency,
+        upload_latency=args.tg_upload_latency,
+        rate_limit_rate=args.tg_rate_limit_rate,
+        chat_rate=args.chat_rate,
+        chat_burst=args.chat_burst,
+        global_rate=args.global_rate,
+        retry_after=args.retry_after,
+    )
+
+
+async def serve_forever(args):
+    server = build_server(args)
+    await server.start(args.host, args.port)
+    print(f"🧪 Mock Telegram Bot API listening on http://{args.host}:{args.port}")
+    print(f"   Bot:   TELEGRAM_API_BASE_URL=http://{args.host}:{args.port}")
+    print(f"   Stats: http://{args.host}:{args.port}/stats")
+    try:
+        while True:
+            await asyncio.sleep(60)
+            print(f"📊 {json.dumps(server.get_stats()['methods'])}")
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock Telegram Bot API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--seed', type=int, help='Random seed for reproducible runs')
+    add_telegram_arguments(parser)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    try:
+        asyncio.run(serve_forever(args))
+    except KeyboardInterrupt:
+        print("\n🛑 Mock Telegram server stopped")
+
+
+if __name__ == "__main__":
+    main()
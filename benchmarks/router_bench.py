@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for message classification
+Compares the compiled MessageRouter with the previous chain of per-call
+re.search checks (kept here as the reference) and verifies both pick the
+same route for every sample message.
+
+Usage:
+    python benchmarks/router_bench.py --iterations 20000
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.message_router import MessageRouter
+
+SAMPLE_MESSAGES = [
+    "2 + 3 * 4",
+    "x^2 + 2*x + 1",
+    "f(x) = x^3 - 3x + 2",
+    "y = 2x + 1",
+    "sin(30) + cos(45)",
+    "sqrt(16) + log(10)",
+    "2x + 3 = 7",
+    "5!",
+    "07:30",
+    "12:30",
+    "Hello there!",
+    "What is the derivative of sin(x)?",
+    "Can you explain how limits work at infinity in simple words please",
+    "thanks a lot",
+    "3.14 * 2",
+    "(5 + 3) * 2",
+    "I need help studying for my calculus exam tomorrow morning",
+    "pi * 2",
+    "ok",
+    "e + 1",
+]
+
+
+def legacy_is_math_expression(text: str) -> bool:
+    """Reference copy of the old BotHandlers.is_math_expression"""
+    if len(text.strip()) < 2:
+        return False
+    if '=' in text:
+        parts = text.split('=')
+        if len(parts) == 2:
+            left, right = parts[0].strip(), parts[1].strip()
+            if (any(c.isdigit() or c in 'xyz+-*/^()' for c in left) and
+                    any(c.isdigit() or c in 'xyz+-*/^()' for c in right)):
+                return True
+    question_words = ['what', 'how', 'why', 'when', 'where', 'who', 'can', 'could', 'would', 'should', 'help', 'tell', 'explain']
+    if any(word in text.lower() for word in question_words):
+        return False
+    words = text.split()
+    if len(words) > 10:
+        return False
+    strong_math_patterns = [
+        r'\d+\s*[\+\-\*/\^]\s*\d+',
+        r'(sin|cos|tan|log|ln|sqrt|exp|abs)\s*\(',
+        r'\d+!',
+        r'\d+\^\d+',
+        r'pi\s*[\+\-\*/]|e\s*[\+\-\*/]',
+        r'[a-z]\s*[\+\-\*/\^]\s*\d+',
+        r'\d+\s*\*?\s*[a-z]',
+    ]
+    if any(re.search(pattern, text.lower()) for pattern in strong_math_patterns):
+        return True
+    weak_math_patterns = [r'[\+\-\*/\^]', r'\d+\.\d+', r'\(\d+\)', r'(pi|e)\b', r'[a-z]']
+    weak_matches = sum(1 for pattern in weak_math_patterns if re.search(pattern, text.lower()))
+    return weak_matches >= 2 and len(words) <= 5
+
+
+def legacy_is_function_expression(text: str) -> bool:
+    """Reference copy of the old BotHandlers.is_function_expression"""
+    strong_function_patterns = [r'f\(x\)\s*=', r'y\s*=', r'g\(x\)\s*=', r'h\(x\)\s*=']
+    if any(re.search(pattern, text.lower()) for pattern in strong_function_patterns):
+        return True
+    if 'x' in text.lower():
+        polynomial_patterns = [r'x\^?\d+', r'x\s*[\+\-]', r'[\+\-]\s*x', r'\d+\s*\*?\s*x', r'x\s*\*\s*x']
+        trig_with_x_patterns = [
+            r'sin\s*\(\s*x', r'cos\s*\(\s*x', r'tan\s*\(\s*x', r'log\s*\(\s*x',
+            r'ln\s*\(\s*x', r'sqrt\s*\(\s*x', r'exp\s*\(\s*x',
+        ]
+        if any(re.search(pattern, text.lower()) for pattern in polynomial_patterns):
+            if not re.match(r'^\s*\d+\.?\d*\s*$', text):
+                return True
+        if any(re.search(pattern, text.lower()) for pattern in trig_with_x_patterns):
+            return True
+    return False
+
+
+def legacy_is_alarm_time(text: str) -> bool:
+    return bool(re.match(r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$', text.strip()))
+
+
+def legacy_route(text: str) -> str:
+    """The old handle_message if/elif chain"""
+    if legacy_is_function_expression(text):
+        return 'function'
+    if legacy_is_alarm_time(text):
+        return 'alarm'
+    if legacy_is_math_expression(text):
+        return 'math'
+    return 'ai'
+
+
+def time_per_message(classify, messages, iterations: int) -> float:
+    """Mean microseconds per classified message"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for message in messages:
+            classify(message)
+    elapsed = time.perf_counter() - started
+    return elapsed / (iterations * len(messages)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark message routing')
+    parser.add_argument('--iterations', type=int, default=5000, help='Passes over the sample messages')
+    args = parser.parse_args()
+
+    router = MessageRouter()
+
+    mismatches = [
+        (message, legacy_route(message), router.classify(message).route)
+        for message in SAMPLE_MESSAGES
+        if legacy_route(message) != router.classify(message).route
+    ]
+
+    print("🧭 Message router benchmark")
+    print("=" * 60)
+    for message in SAMPLE_MESSAGES:
+        decision = router.classify(message)
+        print(f"{message[:40]:<42} -> {decision.route:<8} ({decision.confidence:.2f})")
+
+    legacy_us = time_per_message(legacy_route, SAMPLE_MESSAGES, args.iterations)
+    router_us = time_per_message(router.classify, SAMPLE_MESSAGES, args.iterations)
+
+    print("-" * 60)
+    print(f"Legacy checks:   {legacy_us:8.2f} µs/message")
+    print(f"MessageRouter:   {router_us:8.2f} µs/message")
+    print(f"Speedup:         {legacy_us / router_us:8.2f}x")
+
+    if mismatches:
+        print(f"❌ {len(mismatches)} routing differences:")
+        for message, old, new in mismatches:
+            print(f"   {message!r}: legacy={old} router={new}")
+        sys.exit(1)
+    print("✅ Routes identical to the legacy checks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Small statistics helpers shared by the benchmark tools
+"""
+
+from typing import Dict, List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of values (pct in 0..100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    """count/mean/p50/p95/p99/max of latencies given in seconds (reported in ms)"""
+    if not latencies:
+        return {'count': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    return {
+        'count': len(latencies),
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': max(latencies) * 1000,
+    }
+
+
+def format_summary(name: str, summary: Dict[str, float]) -> str:
+    """One aligned report line"""
+    return (
+        f"{name:<28} n={summary['count']:<6} mean={summary['mean_ms']:9.2f}ms "
+        f"p50={summary['p50_ms']:9.2f}ms p95={summary['p95_ms']:9.2f}ms "
+        f"p99={summary['p99_ms']:9.2f}ms max={summary['max_ms']:9.2f}ms"
+    )
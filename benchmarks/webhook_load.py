@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+End-to-end webhook load generator
+Replays synthetic or recorded Telegram updates into the bot's /webhook at a target
+rate while benchmarks/mock_telegram_server.py stands in for api.telegram.org (and
+benchmarks/mock_ai_server.py for the AI providers). Reports sustained updates per
+second, per-route webhook latency, end-to-end latency (update sent -> the bot's
+last Bot API call for it) and error rates.
+
+The bot either runs as a subprocess started here (--spawn-bot) or is already running
+with TELEGRAM_API_BASE_URL pointing at the mock server (--bot-url). It needs MongoDB
+(MONGODB_URI, default a local mongod).
+
+Usage:
+    python benchmarks/webhook_load.py --spawn-bot --rate 20 --duration 60
+    python benchmarks/webhook_load.py --bot-url http://127.0.0.1:8000 --rate 50 --duration 120 --chat-rate 1
+    python benchmarks/webhook_load.py --spawn-bot --replay recorded_updates.jsonl --rate 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import aiohttp
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import EXPRESSION_CORPUS, FUNCTION_CORPUS, AI_QUESTIONS
+from benchmarks.mock_ai_server import MockAIServer, ProviderProfile
+from benchmarks.mock_telegram_server import add_telegram_arguments, build_server
+from benchmarks.stats import summarize_latencies, format_summary
+from app.services.message_router import MessageRouter
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_ID_BASE = 900000000  # synthetic users, far from real Telegram ids used in development
+
+# Default share of each synthetic route
+DEFAULT_MIX = "math:40,function:10,ai:15,start:10,alarm:5,photo:10,callback:10"
+
+MATH_INPUTS = EXPRESSION_CORPUS['arithmetic'] + EXPRESSION_CORPUS['functions'] + EXPRESSION_CORPUS['equations']
+FUNCTION_INPUTS = [item for items in FUNCTION_CORPUS.values() for item in items]
+ALARM_INPUTS = ["07:30", "06:45", "21:00"]
+CALLBACK_DATA = ["ai_model_auto", "ai_model_gemini", "ai_model_deepseek", "back_to_menu"]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(','):
+        route, weight = part.split(':')
+        if route not in SYNTHETIC_ROUTES:
+            raise ValueError(f"Unknown route {route!r} (choose from {', '.join(SYNTHETIC_ROUTES)})")
+        mix[route] = float(weight)
+    return mix
+
+
+def _user(user_id: int) -> Dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"Load{user_id % 100000}", "language_code": "en"}
+
+
+def _message(user_id: int, message_id: int, **fields) -> Dict:
+    return {
+        "message_id": message_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": f"Load{user_id % 100000}"},
+        "from": _user(user_id),
+        **fields,
+    }
+
+
+def _text_message(user_id: int, seq: int, text: str) -> Dict:
+    message = _message(user_id, seq, text=text)
+    if text.startswith('/'):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"message": message}
+
+
+def _photo_message(user_id: int, seq: int) -> Dict:
+    # A distinct file per update, so OCR result caching doesn't hide the download and OCR work
+    sizes = [(90, 23), (480, 120)]
+    photo = [
+        {"file_id": f"mock-photo-{seq}-{width}", "file_unique_id": f"ph{seq}x{width}",
+         "width": width, "height": height, "file_size": width * height // 4}
+        for width, height in sizes
+    ]
+    return {"message": _message(user_id, seq, photo=photo)}
+
+
+def _callback_query(user_id: int, seq: int) -> Dict:
+    return {"callback_query": {
+        "id": str(seq),
+        "from": _user(user_id),
+        "chat_instance": f"load-{user_id}",
+        "data": random.choice(CALLBACK_DATA),
+        "message": _message(user_id, seq, text="🤖 Choose your AI model"),
+    }}
+
+
+SYNTHETIC_ROUTES = {
+    'start': lambda user_id, seq: _text_message(user_id, seq, "/start"),
+    'math': lambda user_id, seq: _text_message(user_id, seq, random.choice(MATH_INPUTS)),
+    'function': lambda user_id, seq: _text_message(user_id, seq, random.choice(FUNCTION_INPUTS)),
+    'ai': lambda user_id, seq: _text_message(user_id, seq, random.choice(AI_QUESTIONS)),
+    'alarm': lambda user_id, seq: _text_message(user_id, seq, random.choice(ALARM_INPUTS)),
+    'photo': _photo_message,
+    'callback': _callback_query,
+}
+
+
+class UpdateSource:
+    """Yields update payloads: synthetic by route mix, or replayed from a JSON lines recording"""
+
+    def __init__(self, mix: Dict[str, float], users: int, replay: Optional[str] = None):
+        self.routes = list(mix)
+        self.weights = [mix[route] for route in self.routes]
+        self.users = users
+        self.recorded = self._load(replay) if replay else None
+        self.router = MessageRouter()
+
+    def _load(self, path: str) -> List[Dict]:
+        with open(path) as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+        if not updates:
+            raise ValueError(f"No updates in {path}")
+        return updates
+
+    def next(self, seq: int) -> Dict:
+        if self.recorded is not None:
+            update = dict(self.recorded[seq % len(self.recorded)])
+        else:
+            user_id = USER_ID_BASE + (seq % self.users if self.users else seq)
+            route = random.choices(self.routes, self.weights)[0]
+            update = SYNTHETIC_ROUTES[route](user_id, seq)
+        update["update_id"] = seq  # unique and increasing, like Telegram's
+        return update
+
+    def route_of(self, update: Dict) -> str:
+        """The bot's route for an update (same classification the bot makes)"""
+        if "callback_query" in update:
+            return "callback"
+        message = update.get("message") or update.get("edited_message") or {}
+        if message.get("photo"):
+            return "photo"
+        text = message.get("text")
+        if not text:
+            return "other"
+        if text.startswith('/'):
+            return "command"
+        return self.router.classify(text).route
+
+    @staticmethod
+    def chat_of(update: Dict) -> Optional[int]:
+        if "callback_query" in update:
+            update = update["callback_query"]
+        chat = (update.get("message") or update.get("edited_message") or {}).get("chat") or {}
+        return chat.get("id")
+
+
+class LoadResult:
+    def __init__(self):
+        self.sent = []  # (seq, route, chat_id, sent_at)
+        self.acks = {}  # seq -> (status or error name, seconds)
+        self.late = 0  # sends that started behind schedule (in-flight cap reached)
+
+
+async def send_update(session: aiohttp.ClientSession, url: str, headers: Dict, update: Dict, seq: int,
+                      result: LoadResult, timeout: float):
+    started = time.perf_counter()
+    try:
+        async with session.post(url, json=update, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            await response.read()
+            outcome = response.status
+    except asyncio.TimeoutError:
+        outcome = 'timeout'
+    except aiohttp.ClientError as e:
+        outcome = type(e).__name__
+    result.acks[seq] = (outcome, time.perf_counter() - started)
+
+
+async def generate_load(args, source: UpdateSource, result: LoadResult):
+    """Open-loop arrivals at args.rate for args.duration seconds (at most args.max_in_flight outstanding)"""
+    url = f"{args.bot_url.rstrip('/')}/webhook"
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret} if args.secret else {}
+    slots = asyncio.Semaphore(args.max_in_flight)
+    tasks = []
+
+    async def send(update: Dict, seq: int):
+        try:
+            await send_update(session, url, headers, update, seq, result, args.request_timeout)
+        finally:
+            slots.release()
+
+    connector = aiohttp.TCPConnector(limit=args.max_in_flight)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.monotonic()
+        total = int(args.rate * args.duration)
+        for seq in range(1, total + 1):
+            if args.arrivals == 'poisson':
+                await asyncio.sleep(random.expovariate(args.rate) if seq > 1 else 0.0)
+            else:
+                await asyncio.sleep(max(0.0, started + (seq - 1) / args.rate - time.monotonic()))
+            if slots.locked():
+                result.late += 1
+            await slots.acquire()
+
+            update = source.next(seq)
+            result.sent.append((seq, source.route_of(update), source.chat_of(update), time.monotonic()))
+            tasks.append(asyncio.create_task(send(update, seq)))
+        await asyncio.gather(*tasks)
+        return time.monotonic() - started
+
+
+async def wait_until_quiet(telegram, quiet_period: float, max_wait: float):
+    """Wait for background work (analysis PDFs, AI replies) to stop calling the Bot API"""
+    deadline = time.monotonic() + max_wait
+    while time.monotonic() < deadline:
+        last_call = max((calls[-1][0] for calls in telegram.chat_calls.values() if calls), default=0.0)
+        if time.monotonic() - last_call >= quiet_period:
+            return
+        await asyncio.sleep(0.25)
+
+
+def completion_times(result: LoadResult, chat_calls: Dict[int, list]) -> Dict[int, Optional[float]]:
+    """
+    Seconds from sending each update to the bot's last Bot API call for it
+
+    A call belongs to the latest update sent to the same chat before it; None when the
+    bot never called the API for an update.
+    """
+    by_chat = defaultdict(list)
+    for seq, _, chat_id, sent_at in result.sent:
+        by_chat[chat_id].append((sent_at, seq))
+
+    completed = {seq: None for seq, _, _, _ in result.sent}
+    for chat_id, sends in by_chat.items():
+        calls = chat_calls.get(chat_id, [])
+        index = 0
+        for call_at, _ in calls:
+            while index + 1 < len(sends) and sends[index + 1][0] <= call_at:
+                index += 1
+            sent_at, seq = sends[index]
+            if call_at >= sent_at:
+                completed[seq] = call_at - sent_at
+    return completed
+
+
+def build_report(args, result: LoadResult, send_time: float, wall_time: float, telegram) -> Dict:
+    completed = completion_times(result, telegram.chat_calls)
+    routes = defaultdict(lambda: {'ack': [], 'e2e': [], 'outcomes': Counter()})
+    for seq, route, _, _ in result.sent:
+        outcome, seconds = result.acks.get(seq, ('missing', 0.0))
+        entry = routes[route]
+        entry['ack'].append(seconds)
+        if outcome != 200:
+            entry['outcomes'][str(outcome)] += 1
+        elif completed[seq] is None:
+            entry['outcomes']['no_reply'] += 1
+        else:
+            entry['outcomes']['ok'] += 1
+            entry['e2e'].append(completed[seq])
+
+    acked = sum(1 for outcome, _ in result.acks.values() if outcome == 200)
+    answered = sum(entry['outcomes']['ok'] for entry in routes.values())
+    return {
+        'target_rate': args.rate,
+        'duration_s': args.duration,
+        'sent': len(result.sent),
+        'late_sends': result.late,
+        'send_time_s': send_time,
+        'wall_time_s': wall_time,
+        'acked_per_s': acked / send_time if send_time else 0.0,
+        'answered_per_s': answered / wall_time if wall_time else 0.0,
+        'error_rate': 1 - answered / len(result.sent) if result.sent else 0.0,
+        'routes': {
+            route: {
+                'count': len(entry['ack']),
+                'outcomes': dict(entry['outcomes']),
+                'error_rate': 1 - entry['outcomes']['ok'] / len(entry['ack']),
+                'webhook_latency': summarize_latencies(entry['ack']),
+                'end_to_end_latency': summarize_latencies(entry['e2e']),
+            }
+            for route, entry in sorted(routes.items())
+        },
+        'telegram': telegram.get_stats(),
+    }
+
+
+def print_report(report: Dict):
+    print("📨 Webhook load test")
+    print("=" * 60)
+    print(f"Target: {report['target_rate']:g} updates/s for {report['duration_s']:g}s   "
+          f"Sent: {report['sent']} ({report['late_sends']} behind schedule)")
+    print(f"Sustained: {report['acked_per_s']:.2f} acked/s, {report['answered_per_s']:.2f} answered/s   "
+          f"Error rate: {report['error_rate']:.1%}")
+    for route, entry in report['routes'].items():
+        print(f"-- {route}: n={entry['count']} errors={entry['error_rate']:.1%} {entry['outcomes']}")
+        print(format_summary("   webhook ack", entry['webhook_latency']))
+        print(format_summary("   end to end", entry['end_to_end_latency']))
+    methods = report['telegram']['methods']
+    print(f"Bot API calls: { {method: counters['requests'] for method, counters in methods.items()} }")
+    limited = {method: counters['rate_limited'] for method, counters in methods.items() if counters['rate_limited']}
+    if limited:
+        print(f"Bot API 429s: {limited}")
+
+
+def spawn_bot(args, telegram_url: str, ai_url: Optional[str]) -> subprocess.Popen:
+    """Start main.py against the mock servers"""
+    env = dict(os.environ)
+    env.update({
+        "TELEGRAM_BOT_TOKEN": "123456:MOCK-load-test-token",
+        "TELEGRAM_API_BASE_URL": telegram_url,
+        "ENVIRONMENT": "loadtest",  # not production: no setWebhook; not development: no reloader
+        "HOST": "127.0.0.1",
+        "PORT": str(args.bot_port),
+        "LOG_LEVEL": args.bot_log_level,
+    })
+    env.setdefault("MONGODB_URI", "mongodb://127.0.0.1:27017/mathbot_loadtest")
+    env.pop("WEBHOOK_URL", None)
+    env.pop("WEBHOOK_SECRET", None)
+    if ai_url:
+        env.update({
+            "DEEPSEEK_API_KEY": "mock-deepseek-key",
+            "GOOGLE_GEMINI_API_KEY": "mock-gemini-key",
+            "DEEPSEEK_API_URL": f"{ai_url}/v1/chat/completions",
+            "GOOGLE_GEMINI_API_URL": f"{ai_url}/v1/models/gemini-2.5-flash:generateContent",
+        })
+    os.makedirs(os.path.dirname(os.path.abspath(args.bot_log)), exist_ok=True)
+    log = open(args.bot_log, 'w')
+    print(f"🚀 Starting the bot on port {args.bot_port} (log: {args.bot_log})")
+    return subprocess.Popen([sys.executable, os.path.join(PROJECT_ROOT, 'main.py')], env=env, cwd=PROJECT_ROOT,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_until_ready(url: str, timeout: float, bot: Optional[subprocess.Popen]) -> bool:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if bot is not None and bot.poll() is not None:
+                return False
+            try:
+                async with session.get(f"{url.rstrip('/')}/ready", timeout=aiohttp.ClientTimeout(total=2)) as response:
+                    if response.status == 200:
+                        return True
+                    detail = (await response.json()).get('detail')
+                    if isinstance(detail, dict) and detail.get('error'):
+                        print(f"❌ Bot failed to start: {detail['error']}")
+                        return False
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                pass
+            await asyncio.sleep(0.5)
+    return False
+
+
+async def run_load_test(args) -> Optional[Dict]:
+    telegram = build_server(args)
+    await telegram.start('127.0.0.1', args.telegram_port)
+    telegram_url = f"http://127.0.0.1:{args.telegram_port}"
+
+    ai_server = None
+    ai_url = None
+    if args.spawn_bot or args.mock_ai:
+        profile = lambda: ProviderProfile(latency=args.ai_latency)
+        ai_server = MockAIServer(deepseek=profile(), gemini=profile())
+        await ai_server.start('127.0.0.1', args.ai_port)
+        ai_url = f"http://127.0.0.1:{args.ai_port}"
+
+    bot = None
+    try:
+        if args.spawn_bot:
+            bot = spawn_bot(args, telegram_url, ai_url)
+            args.bot_url = f"http://127.0.0.1:{args.bot_port}"
+        else:
+            print(f"🎯 Using the bot at {args.bot_url} - it must run with TELEGRAM_API_BASE_URL={telegram_url}")
+        if not await wait_until_ready(args.bot_url, args.ready_timeout, bot):
+            print(f"❌ Bot at {args.bot_url} did not become ready (see {args.bot_log if bot else 'its log'})")
+            return None
+        telegram.reset()  # only count calls made for the load
+
+        source = UpdateSource(parse_mix(args.mix), args.users, args.replay)
+        result = LoadResult()
+        started = time.monotonic()
+        send_time = await generate_load(args, source, result)
+        await wait_until_quiet(telegram, args.quiet_period, args.drain_timeout)
+        wall_time = time.monotonic() - started
+        return build_report(args, result, send_time, wall_time, telegram)
+    finally:
+        if bot is not None:
+            bot.terminate()
+            try:
+                bot.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+        if ai_server:
+            await ai_server.stop()
+        await telegram.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay Telegram updates into /webhook against a mock Bot API')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--spawn-bot', action='store_true', help='Start main.py against the mock servers')
+    target.add_argument('--bot-url', default='http://127.0.0.1:8000', help='Already running bot')
+    parser.add_argument('--rate', type=float, default=10.0, help='Target updates per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds of load')
+    parser.add_argument('--arrivals', choices=['uniform', 'poisson'], default='uniform')
+    parser.add_argument('--max-in-flight', type=int, default=200, help='Outstanding webhook requests at most')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Synthetic route weights ({', '.join(SYNTHETIC_ROUTES)})")
+    parser.add_argument('--users', type=int, default=0, help='Reuse this many synthetic users (0 = one per update)')
+    parser.add_argument('--replay', help='JSON lines file of recorded updates (update_id is rewritten)')
+    parser.add_argument('--secret', help='X-Telegram-Bot-Api-Secret-Token to send (the bot\'s WEBHOOK_SECRET)')
+    parser.add_argument('--request-timeout', type=float, default=60.0)
+    parser.add_argument('--quiet-period', type=float, default=3.0,
+                        help='After the last send, stop once the bot made no Bot API call for this long')
+    parser.add_argument('--drain-timeout', type=float, default=60.0, help='Longest wait for background work')
+    parser.add_argument('--telegram-port', type=int, default=8081, help='Port of the in-process mock Bot API')
+    parser.add_argument('--mock-ai', action='store_true', help='Also serve mock AI providers (always on with --spawn-bot)')
+    parser.add_argument('--ai-port', type=int, default=8765)
+    parser.add_argument('--ai-latency', default='lognormal:0.6:0.35', help='Mock AI provider latency')
+    parser.add_argument('--bot-port', type=int, default=8090, help='Port of the spawned bot')
+    parser.add_argument('--bot-log', default=os.path.join('temp', 'webhook_load_bot.log'), help='Output of the spawned bot')
+    parser.add_argument('--bot-log-level', default='WARNING')
+    parser.add_argument('--ready-timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Also write the report to this JSON file')
+    add_telegram_arguments(parser)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = asyncio.run(run_load_test(args))
+    if report is None:
+        sys.exit(1)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
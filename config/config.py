@@ -12,32 +12,119 @@ class Config:
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
     WEBHOOK_URL = os.getenv("WEBHOOK_URL")
     WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # For webhook security
+    WEBHOOK_READY_TIMEOUT = float(os.getenv("WEBHOOK_READY_TIMEOUT", 20))  # seconds an update waits for warm-up
+    # Bot API server - point at benchmarks/mock_telegram_server.py for offline load tests
+    TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org").rstrip("/")
 
     # AI Configuration
     DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-    DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+    DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/chat/completions")
 
     # Google Gemini AI Configuration
     GOOGLE_GEMINI_API_KEY = os.getenv("GOOGLE_GEMINI_API_KEY")
     # Using latest Gemini 2.5 Flash model (June 2025 - supports 1M tokens)
-    GOOGLE_GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent"
+    # Both URLs can be overridden to point at benchmarks/mock_ai_server.py
+    GOOGLE_GEMINI_API_URL = os.getenv(
+        "GOOGLE_GEMINI_API_URL",
+        "https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent"
+    )
 
     # AI Model Selection (gemini, deepseek, or auto)
     AI_MODEL = os.getenv("AI_MODEL", "auto")  # auto will try gemini first, then deepseek
 
+    # AI admission control (concurrency per provider, rate per user)
+    AI_MAX_CONCURRENT_GEMINI = int(os.getenv("AI_MAX_CONCURRENT_GEMINI", 8))
+    AI_MAX_CONCURRENT_DEEPSEEK = int(os.getenv("AI_MAX_CONCURRENT_DEEPSEEK", 8))
+    AI_USER_RATE_PER_MINUTE = float(os.getenv("AI_USER_RATE_PER_MINUTE", 6))
+    AI_USER_BURST = int(os.getenv("AI_USER_BURST", 3))
+    AI_QUEUE_TIMEOUT = float(os.getenv("AI_QUEUE_TIMEOUT", 10))  # seconds to wait for a free slot
+
+    # AI conversation context (estimated tokens of history sent with each request)
+    AI_HISTORY_TOKEN_BUDGET = int(os.getenv("AI_HISTORY_TOKEN_BUDGET", 1200))
+    AI_HISTORY_MAX_MESSAGES = int(os.getenv("AI_HISTORY_MAX_MESSAGES", 20))
+
     # Google Cloud Vision API Configuration
     GOOGLE_CLOUD_CREDENTIALS_PATH = os.getenv("GOOGLE_CLOUD_CREDENTIALS_PATH")
     GOOGLE_CLOUD_CREDENTIALS_JSON = os.getenv("GOOGLE_CLOUD_CREDENTIALS_JSON")
 
+    # OCR engine: "auto" (Google Cloud Vision, else local Tesseract), "google" or "tesseract"
+    OCR_BACKEND = os.getenv("OCR_BACKEND", "auto")
+    OCR_TESSERACT_WORKERS = int(os.getenv("OCR_TESSERACT_WORKERS", 2))
+    OCR_TESSERACT_CONFIG = os.getenv("OCR_TESSERACT_CONFIG", "--oem 1 --psm 6")
+
+    # OCR request batching (Vision accepts at most 16 images per batch_annotate_images call)
+    OCR_BATCH_MAX_SIZE = min(int(os.getenv("OCR_BATCH_MAX_SIZE", 8)), 16)
+    OCR_BATCH_LINGER_MS = int(os.getenv("OCR_BATCH_LINGER_MS", 50))
+    OCR_EXECUTOR_WORKERS = int(os.getenv("OCR_EXECUTOR_WORKERS", 4))
+
+    # OCR image preprocessing (downscale, grayscale, contrast, crop)
+    OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "true").lower() == "true"
+    OCR_TARGET_MAX_SIDE = int(os.getenv("OCR_TARGET_MAX_SIDE", 1600))
+    OCR_AUTO_CROP = os.getenv("OCR_AUTO_CROP", "true").lower() == "true"
+    OCR_BINARIZE = os.getenv("OCR_BINARIZE", "false").lower() == "true"
+
+    # OCR photo download (smallest Telegram photo size that still reaches OCR_TARGET_MAX_SIDE)
+    OCR_MAX_DOWNLOAD_BYTES = int(os.getenv("OCR_MAX_DOWNLOAD_BYTES", 8 * 1024 * 1024))
+    OCR_DOWNLOAD_CHUNK_BYTES = int(os.getenv("OCR_DOWNLOAD_CHUNK_BYTES", 64 * 1024))
+    OCR_DOWNLOAD_TIMEOUT = int(os.getenv("OCR_DOWNLOAD_TIMEOUT", 30))
+
+    # OCR result cache (in-memory LRU + capped MongoDB collection)
+    OCR_CACHE_COLLECTION = "ocr_cache"
+    OCR_CACHE_MEMORY_ENTRIES = int(os.getenv("OCR_CACHE_MEMORY_ENTRIES", 1000))
+    OCR_CACHE_MAX_DOCUMENTS = int(os.getenv("OCR_CACHE_MAX_DOCUMENTS", 20000))
+    OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+    # Math solving (multi-line messages are solved as one batch)
+    MATH_WORKERS = int(os.getenv("MATH_WORKERS", 2))  # processes for symbolic work in batches
+    MATH_PARSE_CACHE_SIZE = int(os.getenv("MATH_PARSE_CACHE_SIZE", 512))
+    MATH_BATCH_MAX_ITEMS = int(os.getenv("MATH_BATCH_MAX_ITEMS", 30))
+    MATH_BATCH_PDF_THRESHOLD = int(os.getenv("MATH_BATCH_PDF_THRESHOLD", 10))  # more items -> one PDF
+
+    # Equation solving: symbolic first, numeric root finding when that runs out of time
+    MATH_SYMBOLIC_TIMEOUT = float(os.getenv("MATH_SYMBOLIC_TIMEOUT", 3.0))  # seconds
+    MATH_NUMERIC_INTERVAL_MIN = float(os.getenv("MATH_NUMERIC_INTERVAL_MIN", -100))
+    MATH_NUMERIC_INTERVAL_MAX = float(os.getenv("MATH_NUMERIC_INTERVAL_MAX", 100))
+    MATH_NUMERIC_SCAN_POINTS = int(os.getenv("MATH_NUMERIC_SCAN_POINTS", 20001))
+    MATH_NUMERIC_MAX_ROOTS = int(os.getenv("MATH_NUMERIC_MAX_ROOTS", 10))
+
+    # Function analysis (first steps stream into one progress message, the rest into the PDF)
+    FUNCTION_STREAM_STEPS = int(os.getenv("FUNCTION_STREAM_STEPS", 4))
+    FUNCTION_PROGRESS_EDIT_INTERVAL = float(os.getenv("FUNCTION_PROGRESS_EDIT_INTERVAL", 1.0))  # seconds between edits
+    FUNCTION_WORKERS = int(os.getenv("FUNCTION_WORKERS", 2))  # processes running independent analysis steps
+    FUNCTION_STEP_TIMEOUT = float(os.getenv("FUNCTION_STEP_TIMEOUT", 10.0))  # seconds per step
+
     # MongoDB Configuration
     MONGODB_URI = os.getenv("MONGODB_URI")
     DATABASE_NAME = "telegram_math_bot"
     USERS_COLLECTION = "users"
 
+    # Conversation state (alarm setup steps, alarms awaiting a reply); "mongo" shares it between replicas
+    STATE_STORE_BACKEND = os.getenv("STATE_STORE_BACKEND", "memory").lower()  # memory or mongo
+    STATE_COLLECTION = "conversation_state"
+    USER_STATE_TTL = int(os.getenv("USER_STATE_TTL", 3600))  # seconds an unfinished alarm setup is kept
+
     # Server Configuration
     PORT = int(os.getenv("PORT", 8000))
     HOST = os.getenv("HOST", "0.0.0.0")
     ENVIRONMENT = os.getenv("ENVIRONMENT", "development")  # production or development
+    WEB_WORKERS = int(os.getenv("WEB_WORKERS", 1))  # uvicorn worker processes (ignored in development)
+
+    # Webhook update deduplication (Telegram redelivers updates that weren't answered in time)
+    UPDATE_DEDUP_ENABLED = os.getenv("UPDATE_DEDUP_ENABLED", "true").lower() == "true"
+    UPDATE_DEDUP_WINDOW = int(os.getenv("UPDATE_DEDUP_WINDOW", 3600))  # seconds an update_id is remembered
+    UPDATE_DEDUP_MAX_SIZE = int(os.getenv("UPDATE_DEDUP_MAX_SIZE", 50000))  # update_ids kept in memory
+    UPDATE_DEDUP_SHARED = os.getenv(
+        "UPDATE_DEDUP_SHARED", "true" if STATE_STORE_BACKEND == "mongo" else "false"
+    ).lower() == "true"  # also claim through the state store, catching retries that reach another worker
+
+    # Tracing (spans per update; slow traces kept in memory, optionally appended to a JSON lines file)
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_SLOW_THRESHOLD_MS = float(os.getenv("TRACE_SLOW_THRESHOLD_MS", 2000))
+    TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 100))
+    TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")  # e.g. temp/slow_traces.jsonl
+    TRACE_DEBUG_ENDPOINT = os.getenv(
+        "TRACE_DEBUG_ENDPOINT", "false" if ENVIRONMENT == "production" else "true"
+    ).lower() == "true"  # /debug/traces
 
     # DigitalOcean App Platform specific
     APP_URL = os.getenv("APP_URL")  # DigitalOcean app URL
@@ -53,12 +140,25 @@ class Config:
     MAX_ALARMS_PER_USER = 10
     ALARM_RESPONSE_TIMEOUT = 3600  # 1 hour in seconds
 
+    # Alarm dispatch with several workers/replicas: only holders of a MongoDB lease schedule alarms
+    ALARM_LEADER_ELECTION = os.getenv(
+        "ALARM_LEADER_ELECTION", "true" if WEB_WORKERS > 1 else "false"
+    ).lower() == "true"
+    ALARM_SHARDS = int(os.getenv("ALARM_SHARDS", 1))  # 1 = a single leader; N = one lease per user_id hash shard
+    ALARM_LEASE_TTL = int(os.getenv("ALARM_LEASE_TTL", 30))  # seconds before a silent holder is replaced
+    ALARM_LEASE_HEARTBEAT = int(os.getenv("ALARM_LEASE_HEARTBEAT", 10))  # seconds between lease renewals
+    ALARM_RESYNC_INTERVAL = int(os.getenv("ALARM_RESYNC_INTERVAL", 60))  # reload alarms set on other workers
+    LEASE_COLLECTION = "leases"
+
     # File paths
     TEMP_DIR = "temp"
 
     # Logging Configuration
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
+    # Startup profiling (python main.py --profile-startup [--profile-output PATH])
+    STARTUP_PROFILE_TIMEOUT = float(os.getenv("STARTUP_PROFILE_TIMEOUT", 120))  # seconds to wait for readiness
+
     @classmethod
     def validate(cls):
         """Validate that all required environment variables are set"""
@@ -76,6 +176,14 @@ class Config:
         if cls.ENVIRONMENT == "production":
             required_vars.append("WEBHOOK_URL")
 
+        # Workers don't share memory: alarm setup steps would land on a worker that never saw the previous one
+        if cls.WEB_WORKERS > 1 and cls.STATE_STORE_BACKEND != "mongo":
+            raise ValueError("WEB_WORKERS > 1 requires STATE_STORE_BACKEND=mongo")
+        if cls.ALARM_LEASE_HEARTBEAT * 2 > cls.ALARM_LEASE_TTL:
+            raise ValueError("ALARM_LEASE_TTL must be at least twice ALARM_LEASE_HEARTBEAT")
+        if cls.WEB_WORKERS > 1 and not cls.ALARM_LEADER_ELECTION:
+            logger.warning("⚠️ WEB_WORKERS > 1 without ALARM_LEADER_ELECTION - every worker will send every alarm")
+
         missing_vars = []
         for var in required_vars:
             if "or" in var:  # Handle AI key requirement
@@ -6,17 +6,25 @@ Optimized for DigitalOcean App Platform deployment
 
 import os
 import sys
-import logging
-import uvicorn
+import threading
 
 # Add the project root to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+# --profile-startup: time every import from here on (see app/core/startup_profiler.py)
+from app.core.startup_profiler import startup_profiler, profile_requested, profile_output_path
+if profile_requested():
+    startup_profiler.start()
+
+import logging
+import uvicorn
+
 from config import Config
 from app.core.app import create_app
 
 # Create the app instance for uvicorn reload functionality
 app = create_app()
+startup_profiler.mark("app_created")
 
 # Configure logging
 logging.basicConfig(
@@ -25,6 +33,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def run_profiled_server():
+    """Serve the app until it answers its first ready request, then write the startup profile and exit"""
+    output_path = profile_output_path()
+    server = uvicorn.Server(uvicorn.Config(
+        app,
+        host=Config.HOST,
+        port=Config.PORT,
+        log_level=Config.LOG_LEVEL.lower(),
+        access_log=False  # the readiness probe would flood it
+    ))
+    probe_host = "127.0.0.1" if Config.HOST in ("0.0.0.0", "::", "") else Config.HOST
+
+    def profile_until_ready():
+        ready_url = f"http://{probe_host}:{Config.PORT}/ready"
+        if not startup_profiler.wait_until_ready(ready_url, Config.STARTUP_PROFILE_TIMEOUT):
+            logger.warning(f"App was not ready within {Config.STARTUP_PROFILE_TIMEOUT:g}s - writing a partial profile")
+        print(startup_profiler.write_report(output_path))
+        logger.info(f"Startup profile written to {output_path}")
+        server.should_exit = True
+
+    threading.Thread(target=profile_until_ready, daemon=True).start()
+    server.run()
+
 def main():
     """Main entry point"""
     try:
@@ -32,6 +63,11 @@ def main():
         Config.validate()
         logger.info("Configuration validated successfully")
 
+        if profile_requested():
+            logger.info("Profiling startup (--profile-startup)")
+            run_profiled_server()
+            return
+
         # Use the global app instance
 
         # Run the application
@@ -47,6 +83,16 @@ def main():
                 reload=True,
                 log_level=Config.LOG_LEVEL.lower()
             )
+        elif Config.WEB_WORKERS > 1:
+            # One process per worker, each handling webhooks; alarms are dispatched by lease holders only
+            logger.info(f"Workers: {Config.WEB_WORKERS} (alarm leader election: {Config.ALARM_LEADER_ELECTION})")
+            uvicorn.run(
+                "main:app",  # Import string - every worker imports its own app
+                host=Config.HOST,
+                port=Config.PORT,
+                workers=Config.WEB_WORKERS,
+                log_level=Config.LOG_LEVEL.lower()
+            )
         else:
             # Production mode without reload
             uvicorn.run(
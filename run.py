@@ -6,6 +6,12 @@ Simple startup script for MathBot
 import os
 import sys
 import asyncio
+
+# --profile-startup: time every import from here on (see app/core/startup_profiler.py)
+from app.core.startup_profiler import startup_profiler, profile_requested, profile_output_path
+if profile_requested():
+    startup_profiler.start()
+
 from config import Config
 
 def check_environment():
@@ -126,6 +132,7 @@ async def start_polling_mode():
         # Start alarm scheduler
         alarm_manager_instance.start_scheduler()
         alarm_manager_instance.schedule_all_user_alarms()
+        alarm_manager_instance.restore_pending_alarms()
 
         # Schedule automatic file cleanup
         from app.services.pdf_generator import pdf_generator
@@ -168,6 +175,7 @@ async def start_polling_mode():
         print("📱 You can now interact with the bot on Telegram")
         print("🔍 Debug mode: Enabled")
         print("🛑 Press Ctrl+C to stop the bot")
+        startup_profiler.mark("ready")
 
         # Keep the bot running
         import signal
@@ -184,8 +192,13 @@ async def start_polling_mode():
         # Keep running until interrupted
         
         try:
-            while True:
-                await asyncio.sleep(1)
+            if startup_profiler.active:
+                # --profile-startup: polling has started, which is as ready as polling mode gets
+                print(startup_profiler.write_report(profile_output_path()))
+                print(f"📊 Startup profile written to {profile_output_path()}")
+            else:
+                while True:
+                    await asyncio.sleep(1)
         except KeyboardInterrupt:
             print("🛑 Bot stopped by user")
         finally:
@@ -214,6 +227,11 @@ def start_webhook_mode():
         print(f"📡 Port: {Config.PORT}")
         print("=" * 50)
 
+        if startup_profiler.active:
+            from main import run_profiled_server
+            run_profiled_server()
+            return
+
         import uvicorn
         from main import app
 
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test alarm dispatch leadership: one leader, failover, and shards spread over instances
+"""
+
+import os
+import sys
+import time
+from collections import Counter
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.alarm_leadership import AlarmLeadership, MemoryLeaseStore, shard_of
+
+class RecordingAlarmManager:
+    """Just the part of AlarmManager that AlarmLeadership drives"""
+
+    def __init__(self):
+        self.shards = 1
+        self.owned_shards = set()
+
+    def set_owned_shards(self, shards):
+        self.owned_shards = set(shards)
+
+class FailingLeaseStore(MemoryLeaseStore):
+    """A lease store whose database became unreachable"""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+
+    def acquire(self, lease_id, holder, ttl):
+        if self.down:
+            raise ConnectionError("lease store unreachable")
+        return super().acquire(lease_id, holder, ttl)
+
+def instance(store, name, shards=1, ttl=60):
+    manager = RecordingAlarmManager()
+    return AlarmLeadership(manager, store=store, shards=shards, ttl=ttl, heartbeat=1, instance_id=name), manager
+
+def test_exactly_one_leader():
+    store = MemoryLeaseStore()
+    a, manager_a = instance(store, "a")
+    b, manager_b = instance(store, "b")
+    a.heartbeat()
+    b.heartbeat()
+
+    assert manager_a.owned_shards == {0}
+    assert manager_b.owned_shards == set()
+
+def test_handover_on_release():
+    store = MemoryLeaseStore()
+    a, _ = instance(store, "a")
+    b, manager_b = instance(store, "b")
+    a.heartbeat()
+    b.heartbeat()
+    a.release_all()
+    b.heartbeat()
+
+    assert manager_b.owned_shards == {0}
+
+def test_failover_after_lease_expiry():
+    """A crashed leader's live lease is respected, then taken over once it expires"""
+    store = MemoryLeaseStore()
+    a, _ = instance(store, "a", ttl=0.1)
+    b, manager_b = instance(store, "b", ttl=0.1)
+    a.heartbeat()
+    b.heartbeat()
+    assert manager_b.owned_shards == set()
+
+    time.sleep(0.15)  # a stops renewing
+    b.heartbeat()
+    assert manager_b.owned_shards == {0}
+
+def test_shards_rebalance_when_instance_joins():
+    store = MemoryLeaseStore()
+    a, manager_a = instance(store, "a", shards=4)
+    b, manager_b = instance(store, "b", shards=4)
+    a.heartbeat()
+    assert manager_a.owned_shards == {0, 1, 2, 3}
+
+    b.heartbeat()
+    a.heartbeat()  # sees two instances, releases its surplus
+    b.heartbeat()
+    assert len(manager_a.owned_shards) == 2 and len(manager_b.owned_shards) == 2
+    assert not manager_a.owned_shards & manager_b.owned_shards
+
+def test_leader_cut_off_from_store():
+    """Leases are kept through a short outage, dispatch stops once the lease may have expired"""
+    store = FailingLeaseStore()
+    a, manager_a = instance(store, "a", ttl=0.1)
+    a.heartbeat()
+    store.down = True
+    a.heartbeat()
+    assert manager_a.owned_shards == {0}
+
+    time.sleep(0.15)
+    a.heartbeat()
+    assert manager_a.owned_shards == set()
+
+def test_user_shards_stable_and_spread():
+    """Users are spread over shards the same way in every process"""
+    spread = Counter(shard_of(user_id, 4) for user_id in range(100000, 104000))
+
+    assert shard_of(123456789, 4) == shard_of(123456789, 4)
+    assert shard_of(123456789, 1) == 0
+    assert set(spread) == {0, 1, 2, 3} and min(spread.values()) > 800
+
+if __name__ == "__main__":
+    for test in (test_exactly_one_leader, test_handover_on_release, test_failover_after_lease_expiry,
+                 test_shards_rebalance_when_instance_joins, test_leader_cut_off_from_store,
+                 test_user_shards_stable_and_spread):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test the parallel analysis graph: failed shared results, worker slots and step deadlines
+"""
+
+import asyncio
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.function_analyzer import FunctionAnalyzer, StepTimeout
+from app.services.numeric_solver import call_with_time_budget
+
+class BusyPool(ThreadPoolExecutor):
+    """A worker that stays busy for a while whatever it is given"""
+
+    def __init__(self, busy_for: float):
+        super().__init__(max_workers=1)
+        self.busy_for = busy_for
+
+    def submit(self, function, *args):
+        return super().submit(time.sleep, self.busy_for)
+
+async def run_checks():
+    # sp.solve has no algorithm for cos(x) = x: only the steps that need the zeros lose them
+    analyzer = FunctionAnalyzer()
+    steps = {key: text async for key, _, text in analyzer.iter_analysis("cos(x) - x")}
+    slots = analyzer._slots[1]
+    all_slots_back = slots._value == analyzer.workers
+
+    # A worker still running after its deadline keeps its slot until it is done
+    busy = FunctionAnalyzer()
+    busy.workers = 1
+    busy.step_timeout = 0.1
+    busy._pool = BusyPool(busy_for=3)
+    loop = asyncio.get_running_loop()
+    try:
+        await busy._run_node_with_deadline("zeros", "x", None, {})
+        timed_out = False
+    except StepTimeout:
+        timed_out = True
+    held_after_deadline = busy._worker_slots(loop)._value == 0
+    await asyncio.sleep(1.2)
+    released_when_done = busy._worker_slots(loop)._value == 1
+    busy._pool.shutdown()
+
+    return [
+        ("y-intercept kept when the zeros fail", "• Y-intercept: (0, 1)\n• X-intercepts: Could not determine"
+         in steps["step9_intercepts"]),
+        ("critical points unaffected", "x = -pi/2" in steps["step5_critical_points"]),
+        ("steps without the zeros unaffected", "could not" not in steps["step4_limits"]),
+        ("worker slots returned", all_slots_back),
+        ("deadline reported", timed_out),
+        ("slot held while the worker is busy", held_after_deadline),
+        ("slot released when the worker is done", released_when_done),
+    ]
+
+def test_analysis_graph():
+    """Dependent steps degrade instead of failing; the worker cap holds across timeouts"""
+    print("🕸️ Testing Analysis Graph")
+    print("=" * 50)
+
+    checks = asyncio.run(run_checks())
+    # The bot's process never takes over SIGALRM (its main thread runs the event loop)
+    checks.append(("no SIGALRM handler in the bot process",
+                   call_with_time_budget(5, lambda: signal.getsignal(signal.SIGALRM) is signal.SIG_DFL)
+                   and signal.getsignal(signal.SIGALRM) is signal.SIG_DFL))
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+
+    assert all(passed for _, passed in checks), "Analysis graph misbehaved"
+
+if __name__ == "__main__":
+    test_analysis_graph()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Test the function analysis progress message: it always fits in one Telegram message
+"""
+
+import os
+import sys
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.handlers.bot_handlers import bot_handlers, TELEGRAM_MESSAGE_LIMIT, PROGRESS_STEP_CHARS
+
+STATUS = "⏳ 11 of 11 steps done..."
+
+def long_progress() -> str:
+    steps = [(number, f"Step {number}", "x" * 3000) for number in range(1, 12)]
+    return bot_handlers._format_analysis_progress("x" * 5000, steps, STATUS)
+
+def test_short_progress_unchanged():
+    short = bot_handlers._format_analysis_progress("x^2", [(1, "Domain", "All real numbers")], STATUS)
+    assert short == "📈 Analyzing f(x) = x^2\n\n1. Domain\nAll real numbers\n\n" + STATUS
+
+def test_long_progress_within_limit():
+    assert bot_handlers._telegram_length(long_progress()) <= TELEGRAM_MESSAGE_LIMIT
+
+def test_long_steps_shortened():
+    step_lines = [line for line in long_progress().splitlines() if line.startswith("x")]
+    assert all(len(line) <= PROGRESS_STEP_CHARS for line in step_lines)
+    assert step_lines[0].endswith("…")
+
+def test_later_steps_as_titles_only():
+    assert "11. Step 11 (in the PDF)" in long_progress()
+
+def test_status_kept():
+    assert long_progress().endswith(STATUS)
+
+if __name__ == "__main__":
+    for test in (test_short_progress_unchanged, test_long_progress_within_limit, test_long_steps_shortened,
+                 test_later_steps_as_titles_only, test_status_kept):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test the token-budgeted AI context: estimates, trimming and the summary of dropped turns
+"""
+
+import os
+import sys
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.context_builder import ContextBuilder, estimate_tokens, estimate_message_tokens
+
+def conversation(turns: int):
+    """Alternating user questions and assistant answers, oldest first"""
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"Question {turn}: how do I differentiate x^{turn} step by step?"})
+        history.append({"role": "assistant", "content": f"Answer {turn}: " + "use the power rule. " * 10})
+    return history
+
+def budgeted_builder() -> ContextBuilder:
+    return ContextBuilder(history_token_budget=150, max_history_messages=20, max_summary_items=3)
+
+def test_token_estimates():
+    """Characters / 4, never below the word count"""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a" * 40) == 10
+    assert estimate_tokens("a b c d e f") == 6
+
+def test_history_fits_budget():
+    """The newest turns are kept up to the budget, starting with a user turn"""
+    history = conversation(8)
+    recent, older = budgeted_builder().fit_history(history)
+
+    assert 0 < sum(estimate_message_tokens(message) for message in recent) <= 150
+    assert recent[-1] == history[-1]
+    assert recent[0]["role"] == "user"
+    assert older + recent == history
+
+def test_summary_of_dropped_turns():
+    """The summary lists the last dropped questions, without the answers"""
+    builder = budgeted_builder()
+    _, older = builder.fit_history(conversation(8))
+    summary = builder.summarize(older)
+
+    assert summary.count("\n- ") == 3 and "Question" in summary
+    assert "power rule" not in summary
+    assert builder.summarize([]) == ""
+
+def test_build_wraps_history():
+    """System prompt first, then the summary, then the kept turns and the new message"""
+    messages = budgeted_builder().build("You are MathBot.", conversation(8), "And x^9?")
+
+    assert messages[0]["content"] == "You are MathBot."
+    assert messages[1]["role"] == "system"
+    assert messages[-1] == {"role": "user", "content": "And x^9?"}
+
+def test_small_history_kept_whole():
+    everything, nothing_dropped = ContextBuilder(history_token_budget=10000).fit_history(conversation(2))
+
+    assert everything == conversation(2)
+    assert nothing_dropped == []
+
+def test_message_count_capped():
+    recent, older = ContextBuilder(history_token_budget=10000, max_history_messages=4).fit_history(conversation(4))
+
+    assert len(recent) == 4 and len(older) == 4
+
+def test_long_questions_shortened():
+    """Summary snippets are cut to summary_snippet_chars with whitespace collapsed"""
+    long_question = [{"role": "user", "content": "Explain   " + "integration by parts " * 20}]
+    snippet = ContextBuilder(history_token_budget=10, summary_snippet_chars=40).summarize(long_question)
+
+    assert snippet.endswith("…")
+    assert len(snippet.splitlines()[1]) <= 42
+    assert "   " not in snippet
+
+if __name__ == "__main__":
+    for test in (test_token_estimates, test_history_fits_budget, test_summary_of_dropped_turns,
+                 test_build_wraps_history, test_small_history_kept_whole, test_message_count_capped,
+                 test_long_questions_shortened):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test the shared expression normalizer used by the math solver and function analyzer
+"""
+
+import os
+import sys
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.expression_parser import expression_parser
+
+def test_normalizer():
+    """Test implicit multiplication, factorials, unicode symbols and headers"""
+    print("🔤 Testing Expression Normalizer")
+    print("=" * 50)
+
+    test_cases = [
+        ("2x + 3", False, "2*x+3"),
+        ("sin(30) + 2sin(x)", False, "sin(30)+2*sin(x)"),
+        ("(x+1)(x-1)", False, "(x+1)*(x-1)"),
+        ("x(x+1)", False, "x*(x+1)"),
+        ("2^3 + 3x2", False, "2**3+3*x**2"),
+        ("x² − 4", False, "x**2-4"),
+        ("√9 × π", False, "sqrt(9)*pi"),
+        ("5! + 3", False, "5!+3"),
+        ("f(x) = x^2 + 2x + 1", True, "x**2+2*x+1"),
+        ("Y = e^x", True, "e**x"),
+        ("1e5", False, "1e5"),
+        ("2e3+1", False, "2e3+1"),
+        ("1e-3 + 2.5E+2", False, "1e-3+2.5E+2"),
+        ("2e^x", False, "2*e**x"),
+        ("3e", False, "3*e"),
+    ]
+
+    all_passed = True
+    for text, header, expected in test_cases:
+        normalized = expression_parser.normalize(text, function_header=header)
+        passed = normalized == expected
+        all_passed = all_passed and passed
+        status = "✅" if passed else "❌"
+        print(f"{status} {text:<22} -> {normalized}")
+
+    print("-" * 50)
+    parsed = expression_parser.parse("sqrt(16) * cos(0) + 5!")
+    print(f"sqrt(16) * cos(0) + 5! = {parsed}")
+    all_passed = all_passed and parsed == 124
+
+    # Scientific notation is a number, never implicit multiplication with Euler's e
+    for text, expected in [("1e5", 100000), ("2e3+1", 2001), ("1e-3", 0.001), (".5e1", 5)]:
+        value = expression_parser.parse(text)
+        passed = abs(float(value) - expected) < 1e-12
+        all_passed = all_passed and passed
+        print(f"{'✅' if passed else '❌'} {text} = {value}")
+
+    # A function raised to a power before its argument is a parse error, not a crash
+    try:
+        expression_parser.parse("sin^2(x)")
+        parse_error = False
+    except ValueError:
+        parse_error = True
+    all_passed = all_passed and parse_error
+    print(f"{'✅' if parse_error else '❌'} sin^2(x) rejected with a parse error")
+
+    print("🎉 All cases passed!" if all_passed else "⚠️ Some cases failed")
+    assert all_passed
+
+if __name__ == "__main__":
+    test_normalizer()
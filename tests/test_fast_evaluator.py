@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Test that the numeric fast path formats results exactly like the SymPy path
+"""
+
+import os
+import sys
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.math_solver import MathSolver
+
+class _NoFastPath:
+    def evaluate(self, expression):
+        return None
+
+def test_fast_path_matches_sympy():
+    """Compare fast-path and SymPy results for common expressions"""
+    print("⚡ Testing Numeric Fast Path")
+    print("=" * 50)
+
+    fast_solver = MathSolver()
+    sympy_solver = MathSolver()
+    sympy_solver.fast_evaluator = _NoFastPath()
+
+    expressions = [
+        "2+3*4", "sqrt(16)", "sqrt(2)", "2^10", "1/3", "0.1+0.2", "5!",
+        "sin(pi)", "cos(pi/2)", "tan(pi/4) + log10(1000)", "exp(2) - ln(10) + abs(-5)",
+        "sqrt(-4)", "1/0", "2**100", "floor(2.7)+ceil(2.1)", "2(3+4)", "-3^2", "x+1",
+    ]
+
+    all_passed = True
+    for expression in expressions:
+        fast = fast_solver.solve_expression(expression)[:2]
+        slow = sympy_solver.solve_expression(expression)[:2]
+        passed = fast == slow
+        all_passed = all_passed and passed
+        status = "✅" if passed else "❌"
+        print(f"{status} {expression:<28} -> {fast[1]}")
+
+    print("-" * 50)
+    print(f"Fast path used {fast_solver.stats['fast_path']} times, SymPy {fast_solver.stats['sympy']} times")
+    print("🎉 Results identical!" if all_passed else "⚠️ Results differ")
+    assert all_passed
+
+if __name__ == "__main__":
+    test_fast_path_matches_sympy()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test multi-line math batches: splitting messages, batch solving and the shared parse cache
+"""
+
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.handlers.bot_handlers import bot_handlers, TELEGRAM_MESSAGE_LIMIT
+from app.services.math_solver import MathSolver
+
+PROBLEMS = ["2 + 3", "2x + 3 = 7", "2 + 3", "x^2 - 4 = 0", "sqrt(16)"]
+
+def in_process_solver() -> MathSolver:
+    solver = MathSolver()
+    solver.workers = 1  # in-process: the pool path is exercised by the bot, not needed here
+    return solver
+
+def test_numbering_stripped():
+    assert bot_handlers.split_math_problems("1. 2 + 3\n2) 4 * 5\na) 2x + 3 = 7") == ["2 + 3", "4 * 5", "2x + 3 = 7"]
+
+def test_function_lines_not_batched():
+    """Bare functions and definitions are left to function analysis"""
+    assert bot_handlers.split_math_problems("2 + 3\nx^2 + 1") == []
+    assert bot_handlers.split_math_problems("f(x) = x^2\n2 + 2") == []
+
+def test_single_line_or_conversation_not_batched():
+    assert bot_handlers.split_math_problems("2 + 3") == []
+    assert bot_handlers.split_math_problems("hello\n2 + 3") == []
+
+def test_results_in_input_order():
+    results = in_process_solver().solve_batch(PROBLEMS)
+
+    assert all(success for success, _, _ in results)
+    assert results[0][1] == "5" and "2" in results[1][1] and "4" in results[4][1]
+    assert results[0] == results[2]  # the repeated problem is answered the same
+
+def test_async_batch_matches():
+    solver = in_process_solver()
+    assert asyncio.run(solver.solve_batch_async(PROBLEMS)) == solver.solve_batch(PROBLEMS)
+
+def test_parse_cache_shared_by_threads():
+    """solve_expression runs on executor threads that share one small LRU"""
+    solver = MathSolver()
+    solver.parse_cache_size = 8
+    expressions = [f"x^{n % 20} + {n % 7}*x" for n in range(400)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        parsed = list(executor.map(solver.parse_expression, expressions))
+
+    assert len(parsed) == 400
+    assert solver.stats['parse_cache_hits'] + solver.stats['parse_cache_misses'] == 400
+    assert len(solver._parse_cache) <= 8
+    assert solver.parse_expression(expressions[0]) == parsed[0]
+
+def test_long_batch_reply_split():
+    """A batch reply over Telegram's limit is sent as several messages, split between problems"""
+    text = "🧮 Math Solutions (12 of 12 solved)\n\n" + "\n".join(
+        f"{number}. {'x + ' * 80}1 = 0  →  ✅ x = {number}" for number in range(1, 13)
+    )
+    chunks = bot_handlers._split_message(text)
+
+    assert bot_handlers._telegram_length(text) > TELEGRAM_MESSAGE_LIMIT
+    assert len(chunks) > 1
+    assert all(bot_handlers._telegram_length(chunk) <= TELEGRAM_MESSAGE_LIMIT for chunk in chunks)
+    assert "\n".join(chunks) == text
+    assert bot_handlers._split_message("2 + 2  →  4") == ["2 + 2  →  4"]
+
+if __name__ == "__main__":
+    for test in (test_numbering_stripped, test_function_lines_not_batched, test_single_line_or_conversation_not_batched,
+                 test_results_in_input_order, test_async_batch_matches, test_parse_cache_shared_by_threads,
+                 test_long_batch_reply_split):
+        test()
+        print(f"✅ {test.__name__}")
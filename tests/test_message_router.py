@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test message routing for free-text messages
+"""
+
+import os
+import sys
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.message_router import message_router
+
+def test_message_router():
+    """Test that messages are routed like the handler expects"""
+    print("🧭 Testing Message Router")
+    print("=" * 50)
+
+    test_cases = [
+        ("x^2 + 2*x + 1", "function"),
+        ("f(x) = x^2 + 2*x + 1", "function"),
+        ("y = 2x + 1", "function"),
+        ("sin(x) + cos(x)", "function"),
+        ("07:30", "alarm"),
+        ("23:59", "alarm"),
+        ("2 + 3 * 4", "math"),
+        ("sin(30) + cos(45)", "math"),
+        ("2y + 3 = 7", "math"),
+        ("5!", "math"),
+        ("x + y = 5; x - y = 1", "math"),
+        ("2x + 3y = 6 for y", "math"),
+        ("Hello world", "ai"),
+        ("What is the weather?", "ai"),
+        ("24:00", "ai"),
+    ]
+
+    all_passed = True
+    for text, expected in test_cases:
+        decision = message_router.classify(text)
+        passed = decision.route == expected
+        all_passed = all_passed and passed
+        status = "✅" if passed else "❌"
+        print(f"{status} {text:<25} -> {decision.route:<8} ({decision.reason}, {decision.confidence:.2f})")
+
+    print("-" * 50)
+    print("🎉 All routes correct!" if all_passed else "⚠️ Some routes are wrong")
+    assert all_passed
+
+if __name__ == "__main__":
+    test_message_router()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test the /metrics registry and its text exposition output
+"""
+
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.metrics import MetricsRegistry, observe_latency
+
+def latency_histogram(registry: MetricsRegistry):
+    return registry.histogram("test_seconds", "Test latency", ["route"], buckets=(0.1, 1.0))
+
+def test_histogram_buckets_cumulative():
+    registry = MetricsRegistry()
+    latency = latency_histogram(registry)
+    latency.observe(0.05, route="solve")
+    latency.observe(0.5, route="solve")
+    output = registry.render()
+
+    assert 'test_seconds_bucket{route="solve",le="0.1"} 1' in output
+    assert 'test_seconds_bucket{route="solve",le="1.0"} 2' in output
+    assert 'test_seconds_bucket{route="solve",le="+Inf"} 2' in output
+
+def test_context_manager_timing():
+    registry = MetricsRegistry()
+    latency = latency_histogram(registry)
+    with latency.time(route="timed"):
+        pass
+
+    assert 'test_seconds_count{route="timed"} 1' in registry.render()
+
+def test_async_decorator_counts_errors():
+    registry = MetricsRegistry()
+    errors = registry.counter("test_errors_total", "Test errors", ["route"])
+
+    @observe_latency(latency_histogram(registry), errors, route="async")
+    async def failing():
+        raise ValueError("boom")
+
+    try:
+        asyncio.run(failing())
+    except ValueError:
+        pass
+
+    assert 'test_errors_total{route="async"} 1' in registry.render()
+
+def test_collector_output():
+    registry = MetricsRegistry()
+    registry.register_collector(lambda: [("test_queue_depth", "gauge", "Queued items", [({"queue": "a"}, 3)])])
+
+    assert 'test_queue_depth{queue="a"} 3' in registry.render()
+
+def test_executor_drained():
+    registry = MetricsRegistry()
+    executor = registry.track_executor("test", ThreadPoolExecutor(max_workers=2), 2)
+    executor.submit(sum, [1, 2]).result()
+    executor.shutdown(wait=True)
+
+    assert 'mathbot_executor_pending_tasks{executor="test"} 0' in registry.render()
+
+if __name__ == "__main__":
+    for test in (test_histogram_buckets_cumulative, test_context_manager_timing, test_async_decorator_counts_errors,
+                 test_collector_output, test_executor_drained):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test the numeric fallback for equations sp.solve cannot handle
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sympy as sp
+
+from app.services.math_solver import MathSolver
+from app.services.numeric_solver import NumericRootFinder, SymbolicTimeout, call_with_time_budget
+
+def test_numeric_roots():
+    """Roots are refined to full precision; poles and jumps are not reported as roots"""
+    print("🔎 Testing Numeric Root Finding")
+    print("=" * 50)
+
+    x = sp.Symbol('x')
+    finder = NumericRootFinder(interval=(-10, 10), scan_points=2001, max_roots=10)
+
+    cases = [
+        (sp.cos(x) - x, [0.7390851332151607]),
+        (sp.exp(x) - 3 * x, [0.6190612867359452, 1.5121345516578424]),
+        (sp.sin(x) - 1, [-4.71238898038469, 1.5707963267948966, 7.853981633974483]),  # touching roots
+        (sp.tan(x) - x, [-7.725251836937707, -4.493409457909064, 0.0, 4.493409457909064, 7.725251836937707]),
+        (sp.floor(x) - sp.Rational(1, 2), []),
+        (x ** 2 + 1, []),
+    ]
+
+    all_passed = True
+    for expr, expected in cases:
+        roots, _ = finder.find_roots(expr, x)
+        passed = len(roots) == len(expected) and all(abs(r - e) < 1e-9 for r, e in zip(roots, expected))
+        all_passed = all_passed and passed
+        status = "✅" if passed else "❌"
+        print(f"{status} {str(expr) + ' = 0':<24} -> {[round(root, 10) for root in roots]}")
+
+    assert all_passed, "Numeric roots differ from the expected values"
+
+def test_lambertw_cross_check():
+    """LambertW answers are completed with the real roots of the other branch"""
+    print("🔀 Testing LambertW Cross-check")
+    print("=" * 50)
+
+    solver = MathSolver()
+    cases = [
+        ("e^x = 3x", "x = 0.6190612867, ≈ 1.512134552"),  # sp.solve returns the principal branch only
+        ("x*e^x = 1", "x = 0.5671432904"),  # one real root, nothing to add
+    ]
+
+    all_passed = True
+    for equation, expected in cases:
+        success, result, _ = solver.solve_equation(equation)
+        passed = success and result == expected
+        all_passed = all_passed and passed
+        status = "✅" if passed else "❌"
+        print(f"{status} {equation:<12} -> {result}")
+
+    assert all_passed, "LambertW solutions were not cross-checked"
+
+def test_budgeted_solve_from_thread():
+    """An executor thread of a busy process hands budgeted solves to the pool instead of forking"""
+    solver = MathSolver()
+    solver.workers = 2
+    busy = threading.Lock()
+    busy.acquire()  # another thread of the server holding a lock while the solve runs
+    sleeper = threading.Thread(target=busy.acquire, daemon=True)
+    sleeper.start()
+    list(solver.pool.map(time.sleep, [0.3] * solver.workers))  # start every pool worker up front
+    forks = []
+    os.register_at_fork(before=lambda: forks.append(threading.current_thread().name))
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            success, result, _ = executor.submit(solver.solve_equation, "x*sin(x) = 1").result(timeout=60)
+            forked_for_solve = list(forks)
+
+            started = time.perf_counter()
+            try:
+                executor.submit(call_with_time_budget, 0.2, time.sleep, 5, executor=solver.pool).result(timeout=10)
+                timed_out = False
+            except SymbolicTimeout:
+                timed_out = True
+            waited = time.perf_counter() - started
+            # The worker stopped at its own alarm and takes new work
+            worker_free = solver.pool.submit(abs, -1).result(timeout=2) == 1
+    finally:
+        busy.release()
+        solver.pool.shutdown()
+
+    assert success and "x" in result, result
+    assert forked_for_solve == [], f"the solve forked from {forked_for_solve}"
+    assert timed_out and waited < 3
+    assert worker_free
+
+if __name__ == "__main__":
+    test_numeric_roots()
+    test_lambertw_cross_check()
+    test_budgeted_solve_from_thread()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test OCR micro-batching: linger and max-size flushes, and per-image results fanned back out
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ocr_backends import OCRBackend
+from app.services.ocr_service import OCRService
+
+class RecordingBackend(OCRBackend):
+    """Echoes each image back as its text; b"blank" has no text, b"crash" fails the whole call"""
+
+    name = "recording"
+
+    def __init__(self):
+        super().__init__()
+        self.is_available = True
+        self.batches = []
+
+    def annotate_batch(self, images):
+        self.batches.append([bytes(image) for image in images])
+        if b"crash" in self.batches[-1]:
+            raise RuntimeError("backend unavailable")
+        return [
+            (False, "", "No text detected in the image.") if image == b"blank" else (True, bytes(image).decode(), "")
+            for image in images
+        ]
+
+def make_service(max_size: int, linger: float) -> OCRService:
+    service = OCRService()
+    service.backend = RecordingBackend()
+    service.is_enabled = True
+    service.batch_max_size = max_size
+    service.batch_linger = linger
+    return service
+
+async def run_checks():
+    # Fewer images than a batch: sent together once the linger expires
+    service = make_service(max_size=4, linger=0.05)
+    started = time.perf_counter()
+    lingered = await asyncio.gather(*(service.extract_text_from_image(image) for image in (b"2+2", b"blank", b"x=3")))
+    linger_elapsed = time.perf_counter() - started
+    linger_batches = service.backend.batches
+
+    # A full batch goes out at once, without waiting for the (long) linger
+    service = make_service(max_size=4, linger=10)
+    started = time.perf_counter()
+    full = await asyncio.gather(*(service.extract_text_from_image(f"{n}*2".encode()) for n in range(8)))
+    full_elapsed = time.perf_counter() - started
+    full_sizes = [len(batch) for batch in service.backend.batches]
+
+    # A failing backend call fails every image of that batch, and only those
+    service = make_service(max_size=2, linger=0.01)
+    failed = await asyncio.gather(*(service.extract_text_from_image(image) for image in (b"1+1", b"crash", b"3+3")))
+
+    return [
+        ("linger flush batches concurrent photos", linger_batches == [[b"2+2", b"blank", b"x=3"]]),
+        ("linger flush waits for the linger", 0.04 <= linger_elapsed < 1),
+        ("results fanned out per image", lingered == [(True, "2+2", ""), (False, "", "No text detected in the image."),
+                                                      (True, "x=3", "")]),
+        ("max-size flush without lingering", full_elapsed < 1 and full_sizes == [4, 4]),
+        ("results keep their order", [text for _, text, _ in full] == [f"{n}*2" for n in range(8)]),
+        ("batch error reaches its images", [success for success, _, _ in failed] == [False, False, True]
+         and "backend unavailable" in failed[0][2]),
+        ("batches counted", service.batch_stats['batches'] == 2 and service.batch_stats['largest_batch'] == 2),
+    ]
+
+def test_ocr_batching():
+    """Concurrent photos share backend calls without mixing up their results"""
+    print("📦 Testing OCR Micro-batching")
+    print("=" * 50)
+
+    checks = asyncio.run(run_checks())
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+
+    assert all(passed for _, passed in checks), "OCR batching misbehaved"
+
+if __name__ == "__main__":
+    test_ocr_batching()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test the OCR result cache keys: different worksheets never share a cached result
+"""
+
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Fail fast on any Mongo connection - the tests replace the database where they need one
+os.environ.setdefault("MONGODB_URI", "mongodb://127.0.0.1:27017/?serverSelectionTimeoutMS=200")
+
+from PIL import Image, ImageDraw
+from pymongo.errors import CollectionInvalid
+
+from app.models.database import db_manager
+from app.services.image_preprocessor import ImagePreprocessor
+from app.services.ocr_cache import OCRCache
+from app.services.ocr_service import OCRService
+
+def worksheet(lines, paper=(235, 230, 220)) -> bytes:
+    """A photographed-looking page of exercises with the same layout whatever the text"""
+    image = Image.new("RGB", (1200, 1600), paper)
+    draw = ImageDraw.Draw(image)
+    draw.text((100, 80), "Worksheet 3 - Algebra", fill="black")
+    for number, line in enumerate(lines, 1):
+        draw.text((120, 120 + number * 60), f"{number}) {line}", fill=(30, 30, 30))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+class LocalPhotoFile:
+    """A Telegram File whose bytes are already local (local Bot API server mode)"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.file_size = len(data)
+        self.file_path = "photos/local.jpg"
+
+    async def download_as_bytearray(self):
+        return bytearray(self.data)
+
+def memory_cache() -> OCRCache:
+    cache = OCRCache()
+    cache._collection_failed = True  # memory levels only - no MongoDB here
+    return cache
+
+EXERCISES = ["2x + 3 = 7", "x^2 - 5x + 6 = 0", "3(x - 2) = 2x + 5"]
+
+def image_hash(data: bytes) -> str:
+    return ImagePreprocessor().preprocess(data)[1]['image_hash']
+
+def test_different_text_same_layout():
+    assert image_hash(worksheet(EXERCISES)) != image_hash(worksheet(["5y - 1 = 9", "y^2 + 4y - 5 = 0", "4(y + 1) = 3y - 2"]))
+
+def test_one_digit_changed():
+    """Near-duplicates to a perceptual hash are different keys"""
+    assert image_hash(worksheet(EXERCISES)) != image_hash(worksheet(["2x + 3 = 8"] + EXERCISES[1:]))
+
+def test_different_lighting():
+    assert image_hash(worksheet(EXERCISES)) != image_hash(worksheet(EXERCISES, paper=(200, 195, 185)))
+
+def test_same_image_same_hash():
+    page = worksheet(EXERCISES)
+    assert image_hash(page) == image_hash(page)
+
+def test_level2_hit_for_new_upload():
+    """The same picture under a new file id is answered from level 2, but not stored under that id"""
+    page = worksheet(EXERCISES)
+    service = OCRService()
+    service.cache = memory_cache()
+    service.cache.store("2x + 3 = 7", "file-a", image_hash(page))
+
+    result = asyncio.run(service.process_telegram_photo(LocalPhotoFile(page), file_unique_id="file-b"))
+
+    assert result == (True, "2x + 3 = 7", "")
+    assert service.cache.get_by_file_id("file-b") is None
+
+def test_other_page_misses():
+    cache = memory_cache()
+    cache.store("2x + 3 = 7", "file-a", image_hash(worksheet(EXERCISES)))
+
+    assert cache.get_by_image_hash(image_hash(worksheet(["5y - 1 = 9"]))) is None
+
+def test_parallel_cache_use():
+    """Lookups and stores from the OCR thread pool never break the LRUs or lose counts"""
+    cache = memory_cache()
+    cache.memory_entries = 4  # constant eviction
+
+    def photo(n: int):
+        key = str(n % 16)
+        cache.store(f"text {key}", f"file-{key}", f"hash-{key}")
+        cache.get_by_file_id(f"file-{key}")
+        cache.get_by_image_hash(f"hash-{(n * 7) % 16}")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(photo, range(4000)))  # re-raises the first worker exception
+
+    stats = cache.get_stats()
+    assert stats['stores'] == 4000
+    assert stats['image_hash_hits'] + stats['misses'] == 4000
+    assert len(cache.by_file_id) <= 4 and len(cache.by_image_hash) <= 4
+
+class RacingDatabase:
+    """A fresh database where another request creates the OCR collection first"""
+
+    def __init__(self):
+        self.created = []
+        self.lock = threading.Lock()
+
+    def list_collection_names(self):
+        return []  # both callers saw it missing
+
+    def create_collection(self, name, **options):
+        with self.lock:
+            self.created.append(name)
+            if len(self.created) > 1:
+                raise CollectionInvalid(f"collection {name} already exists")
+
+    def __getitem__(self, name):
+        return RacingCollection()
+
+class RacingCollection:
+    def create_index(self, key):
+        return key
+
+def test_parallel_collection_setup():
+    """Two photos on a fresh database both get persistence, and the collection is set up once"""
+    database = RacingDatabase()
+    saved, db_manager.db = db_manager.db, database
+    try:
+        cache = OCRCache()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            collections = list(executor.map(lambda _: cache.collection, range(8)))
+        # A collection someone else created in between is not an error either
+        late = OCRCache()
+        late_collection = late.collection
+    finally:
+        db_manager.db = saved
+
+    assert all(collection is not None for collection in collections)
+    assert not cache._collection_failed
+    assert late_collection is not None and not late._collection_failed
+    assert len(database.created) == 2
+
+if __name__ == "__main__":
+    for test in (test_different_text_same_layout, test_one_digit_changed, test_different_lighting,
+                 test_same_image_same_hash, test_level2_hit_for_new_upload, test_other_page_misses,
+                 test_parallel_cache_use, test_parallel_collection_setup):
+        test()
+        print(f"✅ {test.__name__}")
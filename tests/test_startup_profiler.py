@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test the --profile-startup import and service timings
+"""
+
+import json
+import os
+import sys
+import tempfile
+from functools import lru_cache
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.startup_profiler import StartupProfiler
+
+@lru_cache(maxsize=None)
+def profiled_import():
+    """Profile one import (a module only imports once per process), returns (profile, has_text_report)"""
+    profiler = StartupProfiler()
+    profiler.start()
+    try:
+        import xml.dom.minidom  # not imported by the test runner itself
+        profiler.mark("imported")
+    finally:
+        profiler.stop()
+
+    with tempfile.TemporaryDirectory() as directory:
+        output_path = os.path.join(directory, "startup.json")
+        profiler.write_report(output_path)
+        with open(output_path) as f:
+            profile = json.load(f)
+        has_text_report = os.path.exists(os.path.join(directory, "startup.txt"))
+    return profile, has_text_report
+
+def test_import_recorded():
+    """Imports made after start() are timed, nested imports count towards their parent"""
+    minidom = profiled_import()[0]["imports"].get("xml.dom.minidom")
+    assert minidom is not None
+    assert minidom["self"] <= minidom["cumulative"]
+
+def test_milestone_recorded():
+    assert "imported" in profiled_import()[0]["milestones"]
+
+def test_package_rollup():
+    assert "xml" in profiled_import()[0]["packages"]
+
+def test_text_report_written():
+    assert profiled_import()[1]
+
+if __name__ == "__main__":
+    for test in (test_import_recorded, test_milestone_recorded, test_package_rollup, test_text_report_written):
+        test()
+        print(f"✅ {test.__name__}")
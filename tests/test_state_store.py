@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test the conversation state store: versions, atomic take, batching and TTL expiry
+"""
+
+import os
+import sys
+import time
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.state_store import MemoryStateStore, VersionConflict
+
+def raises_conflict(action) -> bool:
+    try:
+        action()
+    except VersionConflict:
+        return True
+    return False
+
+def user_states():
+    store = MemoryStateStore()
+    return store, store.namespace('user_state', ttl=60)
+
+def test_versions_start_at_1_and_increase():
+    _, states = user_states()
+    assert states.put(1, {'state': 'waiting_for_alarm_name'}) == 1
+    assert states.put(1, {'state': 'waiting_for_alarm_time'}) == 2
+
+def test_reads_return_copies():
+    _, states = user_states()
+    states.put(1, {'state': 'waiting_for_alarm_name', 'data': {}})
+    states.get_entry(1).value['data']['alarm_name'] = 'mutated copy'
+    assert states.get(1)['data'] == {}
+
+def test_stale_write_rejected():
+    """Two replicas read version 1; only the first write wins"""
+    store, states = user_states()
+    states.put(1, {'state': 'waiting_for_alarm_name', 'data': {}})
+    read_version = states.get_entry(1).version
+    states.put(1, {'state': 'waiting_for_alarm_time', 'data': {'alarm_name': 'Study'}}, expected_version=read_version)
+
+    assert raises_conflict(lambda: states.put(
+        1, {'state': 'waiting_for_alarm_time', 'data': {'alarm_name': 'Other'}}, expected_version=read_version
+    ))
+    assert states.get(1)['data']['alarm_name'] == 'Study'
+    assert store.stats['conflicts'] == 1
+
+def test_create_only_write_rejected_for_existing_entry():
+    _, states = user_states()
+    states.put(1, {})
+    assert raises_conflict(lambda: states.put(1, {}, expected_version=0))
+
+def test_claim_once():
+    """One take succeeds, the repeat finds nothing"""
+    _, states = user_states()
+    version = states.put(1, {'data': {'alarm_name': 'Study'}})
+
+    claimed = states.take(1, expected_version=version)
+    assert claimed is not None and claimed['data']['alarm_name'] == 'Study'
+    assert states.take(1) is None
+
+def test_batched_read_and_delete():
+    store = MemoryStateStore()
+    alarms = store.namespace('pending_alarm', ttl=60)
+    alarms.put_many({'7_07:30_10': {'user_id': 7}, '8_07:30_11': {'user_id': 8}})
+
+    assert set(alarms.get_many(['7_07:30_10', '8_07:30_11', 'missing'])) == {'7_07:30_10', '8_07:30_11'}
+    assert alarms.delete_many(['7_07:30_10']) == 1
+    assert set(alarms.items()) == {'8_07:30_11'}
+
+def test_namespaces_kept_apart():
+    store = MemoryStateStore()
+    states = store.namespace('user_state', ttl=60)
+    alarms = store.namespace('pending_alarm', ttl=60)
+    states.put(1, {})
+    alarms.put_many({'7_07:30_10': {'user_id': 7}})
+
+    assert states.get('7_07:30_10') is None
+    assert 1 not in alarms
+
+def test_expired_entries_invisible():
+    short_lived = MemoryStateStore().namespace('short', ttl=0.05)
+    short_lived.put('k', 'v')
+    time.sleep(0.08)
+
+    assert short_lived.get('k') is None
+    assert short_lived.items() == {}
+
+if __name__ == "__main__":
+    for test in (test_versions_start_at_1_and_increase, test_reads_return_copies, test_stale_write_rejected,
+                 test_create_only_write_rejected_for_existing_entry, test_claim_once, test_batched_read_and_delete,
+                 test_namespaces_kept_apart, test_expired_entries_invisible):
+        test()
+        print(f"✅ {test.__name__}")
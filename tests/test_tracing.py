@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test update tracing: nested spans, hand-off to background work and slow trace export
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from functools import lru_cache
+
+# Add the project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.tracing import Tracer
+
+@lru_cache(maxsize=None)
+def traced_updates():
+    """A slow update handing work to the background, then a fast one
+
+    Returns (tracer, open_before_background, exported traces)
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        export_path = os.path.join(directory, "traces.jsonl")
+        tracer = Tracer(enabled=True, slow_threshold_ms=20, buffer_size=2, export_path=export_path)
+
+        async def background():
+            with tracer.span("render.pdf"):
+                await asyncio.sleep(0.03)
+
+        async def handle_update(update_id):
+            with tracer.trace("update", update_id=update_id):
+                with tracer.span("classify") as span:
+                    span.set(route="function")
+                tracer.record("mongo.find", 0.002)
+                await asyncio.to_thread(lambda: tracer.record("mongo.update", 0.001))
+                return asyncio.create_task(tracer.handoff("analysis.background", background()))
+
+        async def run():
+            task = await handle_update(1)
+            open_before_background = tracer.stats["traces"] == 0
+            await task
+            with tracer.trace("update", update_id=2):
+                pass  # fast - not kept
+            return open_before_background
+
+        open_before_background = asyncio.run(run())
+        with open(export_path) as f:
+            exported = [json.loads(line) for line in f]
+    return tracer, open_before_background, exported
+
+def slow_trace():
+    """The kept trace and its spans by name"""
+    trace = traced_updates()[0].get_slow_traces()[0]
+    return trace, {span["name"]: span for span in trace["spans"]}
+
+def test_trace_open_for_background_work():
+    tracer, open_before_background, _ = traced_updates()
+    assert open_before_background
+    assert tracer.stats["traces"] == 2
+
+def test_only_slow_trace_kept():
+    slow = traced_updates()[0].get_slow_traces()
+    assert len(slow) == 1
+    assert slow[0]["attributes"]["update_id"] == 1
+
+def test_spans_nest_under_update():
+    _, spans = slow_trace()
+    assert spans["classify"]["parent"] == spans["update"]["id"]
+    assert spans["classify"]["attributes"] == {"route": "function"}
+
+def test_recorded_span_across_to_thread():
+    assert "mongo.update" in slow_trace()[1]
+
+def test_background_span_nests_render():
+    trace, spans = slow_trace()
+    assert spans["render.pdf"]["parent"] == spans["analysis.background"]["id"]
+    assert trace["duration_ms"] >= 30
+
+def test_slow_trace_exported():
+    trace, _ = slow_trace()
+    exported = traced_updates()[2]
+    assert len(exported) == 1
+    assert exported[0]["trace_id"] == trace["trace_id"]
+
+def test_chrome_events():
+    trace, _ = slow_trace()
+    chrome = traced_updates()[0].find(trace["trace_id"]).to_chrome_events()
+    assert len(chrome) == len(trace["spans"])
+    assert all(event["ph"] == "X" for event in chrome)
+
+def test_noop_outside_trace():
+    tracer = Tracer(enabled=True, slow_threshold_ms=20, buffer_size=2)
+    with tracer.span("orphan") as span:
+        span.set(ignored=True)
+    assert tracer.stats["traces"] == 0
+
+if __name__ == "__main__":
+    for test in (test_trace_open_for_background_work, test_only_slow_trace_kept, test_spans_nest_under_update,
+                 test_recorded_span_across_to_thread, test_background_span_nests_render, test_slow_trace_exported,
+                 test_chrome_events, test_noop_outside_trace):
+        test()
+        print(f"✅ {test.__name__}")